@@ -1,17 +1,140 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, abort, g, request, jsonify, render_template, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
 import os
-from datetime import datetime
+import json
+import sqlite3
+import threading
+import click
+import itertools
+import pandas as pd
+from datetime import datetime, timedelta
+import io
+import time
+import master_data
+import migrations
+import risk_scoring
+from risk_scoring import CATEGORY_CODES, CATEGORY_TOLERANCE, PROFILE_QUESTIONS, RISK_QUESTIONS
+from recommendation_engine import INVESTOR_COLUMNS, below_minimum_line, recommend_frame, recommendation_line
+from investor_ingest import (
+    ANSWER_FIELDS, FLOAT_FIELDS, INT_FIELDS, SUPPORTED_FORMATS, TEXT_FIELDS, chunked, detect_format, iter_records,
+    validate_field, validate_record
+)
+from reference_data import FundRecord, ReferenceDataCache, read_snapshot_file, write_snapshot_file
+from data_export import (
+    CONTENT_TYPES, EXPORT_FORMATS, Column, column_kind, detect_export_format, export_chunks, parquet_available
+)
+from response_cache import ResponseCache
+from fund_selection import SplitPolicy
+from nav_store import NavStore, ingest_amfi
+from valuation import Position, cash_flows, summarize, value_positions, xirr
+from rebalancing import Holding, ScanItem, rebalance, rebalance_items, scan
+from jobs import JobKind, WorkerPool, progress
+from metrics import MetricsRegistry, RequestTrace, current_trace
+from projection import DEFAULT_VOLATILITY, FALLBACK_VOLATILITY, horizon_years, project
 
 app = Flask(__name__)
 CORS(app)
 
 # Configure database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///mutual_funds.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///mutual_funds.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLite connection tuning: milliseconds a connection waits on a locked database
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+engine_options = {}
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # Pooled connections are handed between the server's worker threads
+    engine_options['connect_args'] = {
+        'timeout': app.config['SQLITE_BUSY_TIMEOUT'] / 1000,
+        'check_same_thread': False
+    }
+if ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']:
+    # Connections kept open per process; size to the server's threads per worker
+    engine_options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 10))
+    engine_options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    engine_options['pool_timeout'] = 30
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+# Seconds between checks of the reference data version in the database
+app.config['REFERENCE_DATA_CHECK_INTERVAL'] = float(os.environ.get('REFERENCE_DATA_CHECK_INTERVAL', 5))
+# Reference data snapshot saved after every reload and installed at startup ('' disables it)
+app.config['REFERENCE_SNAPSHOT_PATH'] = os.environ.get(
+    'REFERENCE_SNAPSHOT_PATH', os.path.join(app.instance_path, 'reference_snapshot.json'))
+# Investors loaded and scored together by the batch recommendation engine
+app.config['BATCH_CHUNK_SIZE'] = int(os.environ.get('BATCH_CHUNK_SIZE', 1000))
+# Rendered recommendation responses kept in memory, bounded by count, size and age
+app.config['RECOMMENDATION_CACHE_ENTRIES'] = int(os.environ.get('RECOMMENDATION_CACHE_ENTRIES', 10000))
+app.config['RECOMMENDATION_CACHE_MAX_BYTES'] = int(os.environ.get('RECOMMENDATION_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+app.config['RECOMMENDATION_CACHE_TTL'] = float(os.environ.get('RECOMMENDATION_CACHE_TTL', 300))
+# Monte Carlo portfolio projection: paths, annual volatility per fund risk level, market correlation
+app.config['PROJECTION_PATHS'] = 10000
+app.config['PROJECTION_PATHS_MAX'] = 100000
+app.config['PROJECTION_VOLATILITY'] = dict(DEFAULT_VOLATILITY)
+app.config['PROJECTION_CORRELATION'] = 0.3
+# Asset class amounts of at least FUND_SPLIT_MIN_AMOUNT are split across up to
+# FUND_SPLIT_MAX_FUNDS funds, none holding more than FUND_SPLIT_MAX_SHARE of the
+# amount, in multiples of FUND_SPLIT_STEP ('inf' keeps one fund per class)
+app.config['FUND_SPLIT_MIN_AMOUNT'] = float(os.environ.get('FUND_SPLIT_MIN_AMOUNT', 50000))
+app.config['FUND_SPLIT_MAX_FUNDS'] = int(os.environ.get('FUND_SPLIT_MAX_FUNDS', 3))
+app.config['FUND_SPLIT_MAX_SHARE'] = float(os.environ.get('FUND_SPLIT_MAX_SHARE', 0.5))
+app.config['FUND_SPLIT_STEP'] = float(os.environ.get('FUND_SPLIT_STEP', 500))
+# Portfolios whose asset class weights are off target by at least
+# REBALANCE_DRIFT_THRESHOLD percentage points are rebalanced; per-class differences
+# below REBALANCE_MIN_TRADE are left alone. REBALANCE_WORKERS processes run the scan.
+app.config['REBALANCE_DRIFT_THRESHOLD'] = float(os.environ.get('REBALANCE_DRIFT_THRESHOLD', 5))
+app.config['REBALANCE_MIN_TRADE'] = float(os.environ.get('REBALANCE_MIN_TRADE', 500))
+app.config['REBALANCE_WORKERS'] = int(os.environ.get('REBALANCE_WORKERS', 1))
+# NAV history store; funds linked to a scheme with NAV_RETURN_YEARS of history
+# use its CAGR and volatility instead of the static expected_return
+app.config['NAV_STORE_PATH'] = os.environ.get('NAV_STORE_PATH', os.path.join(app.instance_path, 'nav'))
+app.config['NAV_RETURN_YEARS'] = float(os.environ.get('NAV_RETURN_YEARS', 3))
+# Page size bounds for GET /api/investors
+app.config['INVESTOR_PAGE_SIZE'] = 50
+app.config['INVESTOR_PAGE_SIZE_MAX'] = 500
+# Most scenarios evaluated by one POST /api/scenarios
+app.config['SCENARIOS_MAX'] = int(os.environ.get('SCENARIOS_MAX', 10000))
+# Page size bounds for GET /api/portfolios/<investor_id>/history
+app.config['PORTFOLIO_HISTORY_PAGE_SIZE'] = 20
+app.config['PORTFOLIO_HISTORY_PAGE_SIZE_MAX'] = 100
+# Background jobs: worker threads serve.py starts in each server process (0, the
+# default, leaves jobs to `flask run-jobs`), seconds between polls of the job table,
+# seconds without a checkpoint after which another worker takes a running job
+# over, and where job output files go
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 0))
+app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+app.config['JOB_STALE_SECONDS'] = float(os.environ.get('JOB_STALE_SECONDS', 120))
+# Retryable job errors (e.g. a locked database) requeue the job from its checkpoint
+# after JOB_RETRY_DELAY seconds, doubling each time, up to JOB_MAX_RETRIES in a row
+app.config['JOB_MAX_RETRIES'] = int(os.environ.get('JOB_MAX_RETRIES', 5))
+app.config['JOB_RETRY_DELAY'] = float(os.environ.get('JOB_RETRY_DELAY', 5))
+app.config['JOB_OUTPUT_PATH'] = os.environ.get('JOB_OUTPUT_PATH', os.path.join(app.instance_path, 'jobs'))
+# Request/SQL metrics on /metrics; off removes the hooks entirely. The response
+# headers (X-Query-Count, Server-Timing) are opt-in on top.
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+app.config['METRICS_RESPONSE_HEADERS'] = os.environ.get('METRICS_RESPONSE_HEADERS', '0') == '1'
+app.config['SLOW_QUERY_SECONDS'] = float(os.environ.get('SLOW_QUERY_SECONDS', 0.1))
+# Executions of one statement within a request that are reported as an N+1 pattern
+app.config['N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
 db = SQLAlchemy(app)
 
+
+def apply_sqlite_pragmas(dbapi_connection):
+    """WAL journaling so readers don't block on a writer, and a busy timeout for writers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT']}")
+    cursor.close()
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
+
 # Models
 class FundMaster(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -21,6 +144,14 @@ class FundMaster(db.Model):
     expected_return = db.Column(db.Float, nullable=False)
     risk_level = db.Column(db.String(20))
     min_investment = db.Column(db.Float, nullable=False)
+    scheme_code = db.Column(db.String(20))  # AMFI scheme code of the fund's NAV history
+    retired_at = db.Column(db.DateTime)  # Set when the fund left the scheme master; never recommended
+
+    __table_args__ = (
+        db.Index('ix_fund_master_asset_class_min_investment', 'asset_class', 'min_investment'),
+        db.Index('ix_fund_master_fund_name', 'fund_name', unique=True),
+        db.Index('ix_fund_master_scheme_code', 'scheme_code'),
+    )
 
 class AssetAllocation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -28,6 +159,16 @@ class AssetAllocation(db.Model):
     asset_class = db.Column(db.String(50), nullable=False)
     percentage = db.Column(db.Float, nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_asset_allocation_risk_profile_asset_class', 'risk_profile', 'asset_class', unique=True),
+    )
+
+class ReferenceDataVersion(db.Model):
+    """Single-row table bumped on every FundMaster/AssetAllocation change"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class Investor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -85,31 +226,30 @@ class Investor(db.Model):
     profile_score = db.Column(db.Integer, nullable=False)  # Sum of profile responses (7-28)
     combined_score = db.Column(db.Integer, nullable=False)  # Combined risk + profile score
     risk_tolerance = db.Column(db.String(20), nullable=False)  # Conservative, Moderate, Aggressive
+    demographic_score = db.Column(db.Integer)  # Education + occupation + income + experience (0-7)
+    risk_category = db.Column(db.String(30))  # e.g. Moderate Investor
+    risk_category_code = db.Column(db.String(10))  # CON I, CAU I, MI, AI
+
+    # Incremented on every update; identifies the state cached responses were built from
+    row_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Relationships
     portfolios = db.relationship('Portfolio', backref='investor', lazy=True)
+
+    # Keyset listing filtered or sorted by the calculated risk profile
+    __table_args__ = (
+        db.Index('ix_investor_risk_category_id', 'risk_category', 'id'),
+        db.Index('ix_investor_risk_category_code_id', 'risk_category_code', 'id'),
+        db.Index('ix_investor_risk_tolerance_id', 'risk_tolerance', 'id'),
+    )
     
     def calculate_risk_score(self):
-        """Calculate risk score based on questionnaire responses (12-48 range)"""
-        score_map = {'A': 1, 'B': 2, 'C': 3, 'D': 4}
-        total_score = (
-            score_map[self.risk_q1] + score_map[self.risk_q2] + score_map[self.risk_q3] +
-            score_map[self.risk_q4] + score_map[self.risk_q5] + score_map[self.risk_q6] +
-            score_map[self.risk_q7] + score_map[self.risk_q8] + score_map[self.risk_q9] +
-            score_map[self.risk_q10] + score_map[self.risk_q11] + score_map[self.risk_q12]
-        )
-        # Convert to 120-480 scale (multiply by 10)
-        return total_score * 10
+        """Calculate risk score based on questionnaire responses (120-480 range)"""
+        return risk_scoring.risk_score([getattr(self, q) for q in RISK_QUESTIONS])
 
     def calculate_profile_score(self):
         """Calculate profile score based on the 7 additional profile questions."""
-        score_map = {'A': 1, 'B': 2, 'C': 3, 'D': 4}
-        total_score = (
-            score_map[self.profile_q1] + score_map[self.profile_q2] + score_map[self.profile_q3] +
-            score_map[self.profile_q4] + score_map[self.profile_q5] + score_map[self.profile_q6] +
-            score_map[self.profile_q7]
-        )
-        return total_score
+        return risk_scoring.profile_score([getattr(self, q) for q in PROFILE_QUESTIONS])
 
     def calculate_combined_score(self):
         """Calculate the combined score from the risk and profile scores."""
@@ -118,115 +258,50 @@ class Investor(db.Model):
     
     def calculate_demographic_score(self):
         """Calculate demographic score based on education, occupation, income, experience"""
-        score = 0
-        
-        # Education Level scoring
-        education_scores = {
-            'High School': 0,
-            'Some College but not graduate': 1,
-            'Graduate': 2,
-            'Post Graduate': 3
-        }
-        score += education_scores.get(self.education_level, 0)
-        
-        # Occupation Type scoring
-        occupation_scores = {
-            'Retired': 0,
-            'Salaried – Govt': 1,
-            'Salaried – Private sector': 2,
-            'Self Employed': 3,
-            'Business': 4
-        }
-        score += occupation_scores.get(self.occupation_type, 0)
-        
-        # Annual Income Range scoring
-        income_scores = {
-            'Upto Rs 5 lacs': 0,
-            'Between Rs 5 – 10 lacs': 1,
-            'Between Rs 10 20 lacs': 2,
-            'Between Rs 20 -50 lacs': 3,
-            'Above Rs 50 lacs': 4
-        }
-        score += income_scores.get(self.annual_income_range, 0)
-        
-        # Equity Experience scoring
-        experience_scores = {
-            'None': 0,
-            'Less than 3 years': 1,
-            'More than 3 years': 2
-        }
-        score += experience_scores.get(self.equity_experience, 0)
-        
-        return min(score, 7)  # Cap at 7 as per matrix
+        return risk_scoring.demographic_score(
+            self.education_level, self.occupation_type, self.annual_income_range, self.equity_experience
+        )
     
     def determine_risk_category(self):
         """Determine final risk category using risk score and demographic score matrix"""
-        risk_score = self.calculate_risk_score()
-        demo_score = self.calculate_demographic_score()
-        
-        # Risk categorization matrix
-        if risk_score <= 150:
-            if demo_score <= 5:
-                return 'Conservative Investor', 'CON I'
-            else:
-                return 'Cautious Investor', 'CAU I'
-        elif risk_score <= 200:
-            if demo_score <= 1:
-                return 'Conservative Investor', 'CON I'
-            elif demo_score <= 5:
-                return 'Cautious Investor', 'CAU I'
-            else:
-                return 'Moderate Investor', 'MI'
-        elif risk_score <= 300:
-            if demo_score <= 1:
-                return 'Cautious Investor', 'CAU I'
-            elif demo_score <= 5:
-                return 'Moderate Investor', 'MI'
-            else:
-                return 'Aggressive Investor', 'AI'
-        else:  # 301 & Above
-            if demo_score == 0:
-                return 'Cautious Investor', 'CAU I'
-            elif demo_score == 1:
-                return 'Moderate Investor', 'MI'
-            else:
-                return 'Aggressive Investor', 'AI'
+        return risk_scoring.risk_category(self.calculate_risk_score(), self.calculate_demographic_score())
     
     def determine_risk_tolerance(self):
         """Determine risk tolerance based on final risk category"""
         category, _ = self.determine_risk_category()
-        if 'Conservative' in category:
-            return 'Conservative'
-        elif 'Cautious' in category:
-            return 'Cautious'  # Keep cautious separate for asset allocation
-        elif 'Moderate' in category:
-            return 'Moderate'
-        else:
-            return 'Aggressive'
+        return risk_scoring.risk_tolerance(category)
     
-    def get_asset_allocation(self):
+    def refresh_risk_profile(self):
+        """Recalculate and store every calculated risk profile column"""
+        self.risk_score = self.calculate_risk_score()
+        self.profile_score = self.calculate_profile_score()
+        self.combined_score = self.calculate_combined_score()
+        self.demographic_score = self.calculate_demographic_score()
+        self.risk_category, self.risk_category_code = risk_scoring.risk_category(self.risk_score, self.demographic_score)
+        self.risk_tolerance = risk_scoring.risk_tolerance(self.risk_category)
+        self._risk_profile_stale = False
+
+    def risk_classification(self):
+        """(demographic score, category, category code), stored or calculated for rows not yet backfilled"""
+        if self.demographic_score is None or self.risk_category is None:
+            return (self.calculate_demographic_score(),) + self.determine_risk_category()
+        return self.demographic_score, self.risk_category, self.risk_category_code
+    
+    def get_asset_allocation(self, snapshot=None):
         """Get recommended asset allocation based on risk profile"""
-        risk_tolerance = self.determine_risk_tolerance()
-        
-        # Query asset allocation from database
-        allocation_rows = AssetAllocation.query.filter_by(risk_profile=risk_tolerance).all()
+        _, risk_category, _ = self.risk_classification()
+        risk_tolerance = risk_scoring.risk_tolerance(risk_category)
         
-        # Convert to dictionary format
-        allocation = {}
-        for row in allocation_rows:
-            allocation[row.asset_class] = row.percentage
-        
-        # Fallback to Conservative if no data found
-        if not allocation:
-            allocation_rows = AssetAllocation.query.filter_by(risk_profile='Conservative').all()
-            for row in allocation_rows:
-                allocation[row.asset_class] = row.percentage
-        
-        return allocation
+        # Read the allocation matrix from the reference data cache
+        # (falls back to Conservative if no data found for the profile)
+        if snapshot is None:
+            snapshot = reference_data.snapshot()
+        return snapshot.allocation_for(risk_tolerance)
     
-    def calculate_portfolio_amounts(self):
+    def calculate_portfolio_amounts(self, allocation=None):
         """Calculate actual investment amounts for each asset class"""
-        allocation = self.get_asset_allocation()
+        if allocation is None:
+            allocation = self.get_asset_allocation()
         investment_amount = self.investment_amount
         
         portfolio_amounts = {}
@@ -235,6 +310,31 @@ class Investor(db.Model):
         
         return portfolio_amounts
 
+# Investor columns the calculated risk profile depends on
+RISK_PROFILE_INPUTS = RISK_QUESTIONS + PROFILE_QUESTIONS + [
+    'education_level', 'occupation_type', 'annual_income_range', 'equity_experience'
+]
+
+def _mark_risk_profile_stale(target, value, oldvalue, initiator):
+    if value != oldvalue:
+        target._risk_profile_stale = True
+
+for _name in RISK_PROFILE_INPUTS:
+    event.listen(getattr(Investor, _name), 'set', _mark_risk_profile_stale)
+
+@event.listens_for(Session, 'before_flush')
+def _refresh_stale_risk_profiles(session, flush_context, instances):
+    # Only investors whose questionnaire or demographic answers changed are rescored
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Investor) and getattr(obj, '_risk_profile_stale', False):
+            obj.refresh_risk_profile()
+
+@event.listens_for(Session, 'before_flush')
+def _bump_investor_row_versions(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, Investor) and session.is_modified(obj, include_collections=False):
+            obj.row_version = (obj.row_version or 0) + 1
+
 class Portfolio(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     investor_id = db.Column(db.Integer, db.ForeignKey('investor.id'), nullable=False)
@@ -242,34 +342,332 @@ class Portfolio(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     funds = db.relationship('Fund', backref='portfolio', lazy=True)
 
+    __table_args__ = (
+        # Latest portfolio of an investor
+        db.Index('ix_portfolio_investor_id_created_at', 'investor_id', 'created_at'),
+    )
+
 class Fund(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolio.id'), nullable=False)
+    fund_master_id = db.Column(db.Integer, db.ForeignKey('fund_master.id'))  # None for funds not in FundMaster
     fund_name = db.Column(db.String(100), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     expected_return = db.Column(db.Float, nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_fund_portfolio_id', 'portfolio_id'),
+        db.Index('ix_fund_fund_master_id', 'fund_master_id'),
+    )
+
+class PortfolioDrift(db.Model):
+    """Last rebalancing scan of an investor's current portfolio"""
+    investor_id = db.Column(db.Integer, db.ForeignKey('investor.id'), primary_key=True)
+    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolio.id'), nullable=False)
+    # What the scan saw; a change in either means the investor is scanned again
+    investor_row_version = db.Column(db.Integer, nullable=False)
+    reference_data_version = db.Column(db.Integer, nullable=False)
+    total_value = db.Column(db.Float, nullable=False)
+    max_drift = db.Column(db.Float, nullable=False)
+    needs_rebalance = db.Column(db.Boolean, nullable=False)
+    result = db.Column(db.Text, nullable=False)  # JSON drift and trades
+    scanned_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_portfolio_drift_needs_rebalance_investor_id', 'needs_rebalance', 'investor_id'),
+    )
+
+class Job(db.Model):
+    """Background job over the investor book, checkpointed after every chunk"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    chunk_size = db.Column(db.Integer, nullable=False)
+    # The job covers investors with ids up to until_id (the highest when it was
+    # submitted); last_id is the checkpoint: every investor up to it is done
+    until_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    elapsed_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    result = db.Column(db.Text, nullable=False, default='{}')  # JSON counters and output of the job kind
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # Retryable errors since the last checkpoint, and when the job may be claimed again
+    retries = db.Column(db.Integer, nullable=False, default=0)
+    retry_at = db.Column(db.DateTime)
+    worker = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
+
+# Reference data cache
+REFERENCE_DATA_VERSION_QUERY = db.select(ReferenceDataVersion.version).where(ReferenceDataVersion.id == 1)
+FUND_RECORDS_QUERY = db.select(
+    FundMaster.id, FundMaster.fund_name, FundMaster.asset_class, FundMaster.category,
+    FundMaster.expected_return, FundMaster.risk_level, FundMaster.min_investment, FundMaster.scheme_code
+).where(FundMaster.retired_at.is_(None)).order_by(FundMaster.id)
+ALLOCATION_ROWS_QUERY = db.select(
+    AssetAllocation.risk_profile, AssetAllocation.asset_class, AssetAllocation.percentage
+).order_by(AssetAllocation.id)
+
+def read_reference_data_version():
+    """Read the current reference data version from the database"""
+    try:
+        version = db.session.execute(REFERENCE_DATA_VERSION_QUERY).scalar()
+    except OperationalError:
+        # Databases created before the version table existed
+        db.session.rollback()
+        return 0
+    return version or 0
+
+nav_store = NavStore(app.config['NAV_STORE_PATH'])
+
+def with_nav_returns(funds):
+    """Fund records with expected_return and volatility taken from NAV history where available"""
+    nav_store.reload()
+    years = app.config['NAV_RETURN_YEARS']
+    result = []
+    for fund in funds:
+        annual_return, annual_volatility = nav_store.return_and_volatility(fund.scheme_code, years)
+        if annual_return is not None and annual_volatility is not None:
+            fund = fund._replace(expected_return=round(annual_return, 2), volatility=round(annual_volatility / 100, 4))
+        result.append(fund)
+    return result
+
+def load_reference_data():
+    """Load the fund universe and allocation matrix as plain records"""
+    funds = with_nav_returns([FundRecord(*row) for row in db.session.execute(FUND_RECORDS_QUERY)])
+    allocation_rows = db.session.execute(ALLOCATION_ROWS_QUERY).all()
+    return funds, allocation_rows
+
+def reference_snapshot_key():
+    """What a saved snapshot depends on besides the reference data version"""
+    return {
+        'database': app.config['SQLALCHEMY_DATABASE_URI'],
+        'nav_store': os.path.abspath(app.config['NAV_STORE_PATH']),
+        'nav_return_years': app.config['NAV_RETURN_YEARS']
+    }
+
+def save_reference_snapshot(snapshot):
+    path = app.config['REFERENCE_SNAPSHOT_PATH']
+    if not path:
+        return
+    try:
+        write_snapshot_file(snapshot, path, reference_snapshot_key())
+    except OSError as e:
+        app.logger.warning('Could not save the reference data snapshot to %s: %s', path, e)
+
+reference_data = ReferenceDataCache(
+    load_reference_data,
+    read_reference_data_version,
+    check_interval=app.config['REFERENCE_DATA_CHECK_INTERVAL'],
+    on_store=save_reference_snapshot
+)
+
+def preload_reference_snapshot():
+    """Install the saved snapshot, if usable, so the first request only confirms its version"""
+    path = app.config['REFERENCE_SNAPSHOT_PATH']
+    snapshot = read_snapshot_file(path, reference_snapshot_key()) if path else None
+    if snapshot is not None:
+        reference_data.preload(snapshot)
+    return snapshot
+
+preload_reference_snapshot()
+
+def fund_split_policy():
+    """SplitPolicy from the FUND_SPLIT_* settings"""
+    return SplitPolicy(app.config['FUND_SPLIT_MIN_AMOUNT'], app.config['FUND_SPLIT_MAX_FUNDS'],
+                       app.config['FUND_SPLIT_MAX_SHARE'], app.config['FUND_SPLIT_STEP'])
+
+recommendation_cache = ResponseCache(
+    max_entries=app.config['RECOMMENDATION_CACHE_ENTRIES'],
+    max_bytes=app.config['RECOMMENDATION_CACHE_MAX_BYTES'],
+    ttl=app.config['RECOMMENDATION_CACHE_TTL']
+)
+
+# Request and SQL metrics
+metrics = MetricsRegistry(
+    slow_query_seconds=app.config['SLOW_QUERY_SECONDS'],
+    n_plus_one_threshold=app.config['N_PLUS_ONE_THRESHOLD']
+)
+
+def _cache_metrics():
+    cache = recommendation_cache.stats()
+    reference = reference_data.stats()
+    return [
+        ('recommendation_cache_hits_total', 'counter', 'Recommendation cache hits.', cache['hits']),
+        ('recommendation_cache_misses_total', 'counter', 'Recommendation cache misses.', cache['misses']),
+        ('recommendation_cache_entries', 'gauge', 'Cached recommendation responses.', cache['entries']),
+        ('recommendation_cache_bytes', 'gauge', 'Size of cached recommendation responses.', cache['bytes']),
+        ('reference_data_cache_hits_total', 'counter', 'Reference data snapshot hits.', reference['hits']),
+        ('reference_data_cache_misses_total', 'counter', 'Reference data snapshot reloads.', reference['misses'])
+    ]
+
+metrics.add_collector(_cache_metrics)
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._metrics_started
+    if metrics.observe_query(statement, duration):
+        app.logger.warning('Slow query (%.1f ms): %s', duration * 1000, statement)
+
+def _start_request_trace():
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_trace_token = current_trace.set(RequestTrace(route, time.perf_counter()))
+
+def _finish_request_trace(response):
+    trace = current_trace.get()
+    if trace is None:
+        return response
+    duration = time.perf_counter() - trace.started
+    for statement, count in metrics.observe_request(request.method, response.status_code, trace, duration):
+        app.logger.warning('Possible N+1 query in %s %s: %d executions of %s',
+                           request.method, trace.route, count, statement)
+    if app.config['METRICS_RESPONSE_HEADERS']:
+        response.headers['X-Query-Count'] = str(trace.query_count)
+        response.headers['Server-Timing'] = (
+            f'db;desc="{trace.query_count} queries";dur={trace.query_time * 1000:.2f}, '
+            f'app;dur={duration * 1000:.2f}'
+        )
+    g.metrics_recorded = True
+    return response
+
+def _end_request_trace(exc):
+    trace = current_trace.get()
+    if trace is not None and exc is not None and not g.get('metrics_recorded'):
+        # Unhandled errors never reach after_request
+        metrics.observe_request(request.method, 500, trace, time.perf_counter() - trace.started)
+    token = g.pop('metrics_trace_token', None)
+    if token is not None:
+        current_trace.reset(token)
+
+if app.config['METRICS_ENABLED']:
+    event.listen(Engine, 'before_cursor_execute', _start_query_timer)
+    event.listen(Engine, 'after_cursor_execute', _stop_query_timer)
+    app.before_request(_start_request_trace)
+    app.after_request(_finish_request_trace)
+    app.teardown_request(_end_request_trace)
+
+def bump_reference_data_version(session):
+    """Increment the stored reference data version within the session's transaction"""
+    with session.no_autoflush:
+        row = session.get(ReferenceDataVersion, 1)
+        if row is None:
+            session.add(ReferenceDataVersion(id=1, version=1, updated_at=datetime.utcnow()))
+        else:
+            row.version += 1
+            row.updated_at = datetime.utcnow()
+    session.info['reference_data_changed'] = True
+
+@event.listens_for(Session, 'before_flush')
+def _track_reference_data_writes(session, flush_context, instances):
+    # Bump the version once per transaction that touches the reference tables
+    if session.info.get('reference_data_changed'):
+        return
+    changed = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(isinstance(obj, (FundMaster, AssetAllocation)) for obj in changed):
+        bump_reference_data_version(session)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_reference_data(session):
+    if session.info.pop('reference_data_changed', False):
+        reference_data.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_reference_data_flag(session):
+    session.info.pop('reference_data_changed', None)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def int_arg(args, name, default):
+    # Like request.args.get(name, default, type=int): malformed values fall back to the default
+    try:
+        return int(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def investor_page_query(args):
+    """(query, limit, sort) for a page of the investor list; ValueError for bad arguments"""
+    after_id = int_arg(args, 'after_id', 0)
+    after_category = args.get('after_category')
+    sort = args.get('sort', 'id')
+    limit = int_arg(args, 'limit', app.config['INVESTOR_PAGE_SIZE'])
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    if sort not in ('id', 'risk_category'):
+        raise ValueError("sort must be 'id' or 'risk_category'")
+    limit = min(limit, app.config['INVESTOR_PAGE_SIZE_MAX'])
+
+    # Keyset page of just the columns the list view needs; one extra row tells us if there is more
+    query = db.select(
+        Investor.id, Investor.name, Investor.email, Investor.age, Investor.risk_tolerance,
+        Investor.risk_category, Investor.risk_category_code
+    )
+    for column in ('risk_category', 'risk_category_code', 'risk_tolerance'):
+        value = args.get(column)
+        if value:
+            query = query.where(getattr(Investor, column) == value)
+    if sort == 'risk_category':
+        query = query.where(Investor.risk_category.is_not(None)).order_by(Investor.risk_category, Investor.id)
+        if after_category is not None:
+            query = query.where(db.tuple_(Investor.risk_category, Investor.id) > (after_category, after_id))
+    else:
+        query = query.where(Investor.id > after_id).order_by(Investor.id)
+    return query.limit(limit + 1), limit, sort
+
+def investor_page(rows, limit, sort, computed):
+    """Page payload from the query rows; ``computed`` maps IDs without a stored category to one"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    investor_list = []
+    for row in rows:
+        risk_category, risk_category_code = computed.get(row.id, (row.risk_category, row.risk_category_code))
+        investor_list.append({
+            'id': row.id,
+            'name': row.name,
+            'email': row.email,
+            'age': row.age,
+            'risk_tolerance': row.risk_tolerance,
+            'risk_category': risk_category,
+            'risk_category_code': risk_category_code
+        })
+    page = {
+        'investors': investor_list,
+        'next_after_id': rows[-1].id if has_more else None,
+        'has_more': has_more
+    }
+    if sort == 'risk_category':
+        page['next_after_category'] = rows[-1].risk_category if has_more else None
+    return page
+
 @app.route('/api/investors', methods=['GET'])
 def get_investors():
     try:
-        investors = Investor.query.all()
-        investor_list = []
-        for investor in investors:
-            risk_category, risk_category_code = investor.determine_risk_category()
-            investor_list.append({
-                'id': investor.id,
-                'name': investor.name,
-                'email': investor.email,
-                'age': investor.age,
-                'risk_tolerance': investor.risk_tolerance,
-                'risk_category': risk_category,
-                'risk_category_code': risk_category_code
-            })
-        return jsonify(investor_list)
+        try:
+            query, limit, sort = investor_page_query(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        rows = db.session.execute(query).all()
+
+        # Rows saved before the category was stored are categorised on the fly
+        missing_ids = [row.id for row in rows[:limit] if row.risk_category is None]
+        computed = {}
+        if missing_ids:
+            for investor in Investor.query.filter(Investor.id.in_(missing_ids)):
+                computed[investor.id] = investor.determine_risk_category()
+
+        return jsonify(investor_page(rows, limit, sort, computed))
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve investors: {str(e)}'}), 500
 
@@ -334,17 +732,9 @@ def create_investor():
             profile_q6=data['profile_q6'],
             profile_q7=data['profile_q7'],
             
-            # Calculated fields (will be updated below)
-            risk_score=0,
-            risk_tolerance='Conservative'
         )
         
-        # Calculate risk profile
-        new_investor.risk_score = new_investor.calculate_risk_score()
-        new_investor.profile_score = new_investor.calculate_profile_score()
-        new_investor.combined_score = new_investor.calculate_combined_score()
-        new_investor.risk_tolerance = new_investor.determine_risk_tolerance()
-        
+        # Calculated risk profile columns are filled in when the session flushes
         db.session.add(new_investor)
         db.session.commit()
         return jsonify({'message': 'Investor created successfully'}), 201
@@ -352,109 +742,509 @@ def create_investor():
         db.session.rollback()
         return jsonify({'error': f'Failed to create investor: {str(e)}'}), 500
 
+# Bulk investor onboarding
+def score_investor_rows(rows):
+    """Fill the calculated risk profile columns of investor row dicts.
+
+    Rows with an invalid questionnaire answer are left out of the result.
+    """
+    frame = pd.DataFrame.from_records(rows)
+    risk, profile, valid = risk_scoring.score_answers(risk_scoring.answer_codes(frame))
+    demo = risk_scoring.frame_demographic_scores(frame)
+    categories = risk_scoring.risk_categories(risk, demo)
+    scored = []
+    for i, row in enumerate(rows):
+        if not valid[i]:
+            continue
+        category = categories[i]
+        row['risk_score'] = int(risk[i])
+        row['profile_score'] = int(profile[i])
+        row['combined_score'] = int(risk[i]) + int(profile[i])
+        row['demographic_score'] = int(demo[i])
+        row['risk_category'] = category
+        row['risk_category_code'] = CATEGORY_CODES[category]
+        row['risk_tolerance'] = CATEGORY_TOLERANCE[category]
+        scored.append(row)
+    return scored
+
+def ingest_investors(stream, fmt, chunk_size=None):
+    """Validate and bulk insert investors from a CSV/NDJSON text stream.
+
+    Emails are checked against the database with one query per chunk and each
+    chunk is inserted with a single executemany in its own transaction.
+    Returns a report with per-row errors and throughput.
+    """
+    chunk_size = chunk_size or app.config['BATCH_CHUNK_SIZE']
+    started = time.perf_counter()
+    received = inserted = 0
+    errors = []
+    seen_emails = set()
+
+    for chunk in chunked(iter_records(stream, fmt), chunk_size):
+        received += len(chunk)
+        candidates = []
+        for row_number, record, error in chunk:
+            if error:
+                errors.append({'row': row_number, 'email': None, 'errors': [error]})
+                continue
+            clean, row_errors = validate_record(record)
+            email = clean.get('email')
+            if email and email in seen_emails:
+                row_errors.append('Duplicate email in file')
+            if row_errors:
+                errors.append({'row': row_number, 'email': email, 'errors': row_errors})
+                continue
+            seen_emails.add(email)
+            candidates.append((row_number, clean))
+
+        if not candidates:
+            continue
+
+        existing = set(db.session.execute(
+            db.select(Investor.email).where(Investor.email.in_([clean['email'] for _, clean in candidates]))
+        ).scalars())
+        rows = []
+        for row_number, clean in candidates:
+            if clean['email'] in existing:
+                errors.append({'row': row_number, 'email': clean['email'],
+                               'errors': ['An investor with this email already exists']})
+            else:
+                rows.append(clean)
+        if not rows:
+            continue
+
+        try:
+            db.session.execute(db.insert(Investor), score_investor_rows(rows))
+            db.session.commit()
+            inserted += len(rows)
+        except Exception as e:
+            db.session.rollback()
+            for row_number, clean in candidates:
+                if clean['email'] not in existing:
+                    errors.append({'row': row_number, 'email': clean['email'],
+                                   'errors': [f'Chunk insert failed: {str(e)}']})
+
+    elapsed = time.perf_counter() - started
+    errors.sort(key=lambda e: e['row'])
+    return {
+        'received': received,
+        'inserted': inserted,
+        'failed': len(errors),
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(received / elapsed, 1) if elapsed > 0 else None,
+        'errors': errors
+    }
+
+@app.route('/api/investors/bulk', methods=['POST'])
+def bulk_create_investors():
+    upload = request.files.get('file')
+    if upload is not None:
+        fmt = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+        binary_stream = upload.stream
+    else:
+        fmt = request.args.get('format') or detect_format(content_type=request.content_type)
+        binary_stream = request.stream
+    if fmt not in SUPPORTED_FORMATS:
+        return jsonify({'error': f"Unsupported format, expected one of {', '.join(SUPPORTED_FORMATS)}"}), 400
+
+    try:
+        stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+        report = ingest_investors(stream, fmt, request.args.get('chunk_size', type=int))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to import investors: {str(e)}'}), 500
+    status = 201 if report['inserted'] else 400
+    return jsonify(report), status
+
+@app.cli.command('import-investors')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(SUPPORTED_FORMATS), default=None, help='Defaults to the file extension')
+@click.option('--chunk-size', type=int, default=None, help='Rows validated and inserted per transaction')
+def import_investors_command(path, fmt, chunk_size):
+    """Bulk onboard investors from a CSV or NDJSON file at PATH."""
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the file format from its name, pass --format')
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        report = ingest_investors(stream, fmt, chunk_size)
+    for error in report['errors']:
+        click.echo(f"Row {error['row']} ({error['email']}): {'; '.join(error['errors'])}", err=True)
+    click.echo(f"Imported {report['inserted']} of {report['received']} rows in "
+               f"{report['elapsed_seconds']}s ({report['rows_per_second']} rows/sec).")
+
 @app.route('/api/portfolio/<int:investor_id>', methods=['POST'])
 def create_portfolio(investor_id):
     investor = Investor.query.get_or_404(investor_id)
-    data = request.get_json()
+    try:
+        rows = new_portfolio_rows(investor, request.get_json(), reference_data.snapshot())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    portfolio_id, = insert_portfolios([rows])
+    db.session.commit()
+    
+    return jsonify({'message': 'Portfolio created successfully', 'portfolio_id': portfolio_id}), 201
+
+def portfolio_rows(investor, recommendations, snapshot):
+    """(Portfolio values, Fund values) for a portfolio holding one fund per recommendation.
 
+    Below-minimum lines have no fund and are left out.
+    """
+    created_at = datetime.utcnow()
+    portfolio = {
+        'investor_id': investor.id,
+        'name': f"{investor.name}'s Recommended Portfolio - {created_at.strftime('%Y-%m-%d')}",
+        'created_at': created_at
+    }
+    funds = [
+        {
+            'fund_master_id': snapshot.fund_id(rec['fund_name']),
+            'fund_name': rec['fund_name'],
+            'amount': rec['recommended_investment'],
+            'expected_return': rec['expected_return']
+        } for rec in recommendations if rec.get('fund_name')
+    ]
+    return portfolio, funds
+
+def new_portfolio_rows(investor, data, snapshot):
+    """portfolio_rows() for a POST /api/portfolio body; ValueError when there is nothing to save"""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
     recommendations = data.get('recommendations')
     if not recommendations:
-        return jsonify({'error': 'No recommendations provided'}), 400
-
-    # Create a new portfolio
-    portfolio_name = f"{investor.name}'s Recommended Portfolio - {datetime.utcnow().strftime('%Y-%m-%d')}"
-    new_portfolio = Portfolio(investor_id=investor.id, name=portfolio_name)
-    db.session.add(new_portfolio)
-    db.session.flush()  # Use flush to assign an ID to new_portfolio before commit
-
-    # Add funds to the portfolio
-    for rec in recommendations:
-        new_fund = Fund(
-            portfolio_id=new_portfolio.id,
-            fund_name=rec['fund_name'],
-            amount=rec['recommended_investment'],
-            expected_return=rec['expected_return']
-        )
-        db.session.add(new_fund)
+        raise ValueError('No recommendations provided')
+    if not isinstance(recommendations, list) or not all(isinstance(rec, dict) for rec in recommendations):
+        raise ValueError('recommendations must be a list of objects')
+    portfolio, funds = portfolio_rows(investor, recommendations, snapshot)
+    if not funds:
+        raise ValueError('No recommendation has a fund: every amount is below the minimum investment')
+    return portfolio, funds
 
-    db.session.commit()
-    
-    return jsonify({'message': 'Portfolio created successfully', 'portfolio_id': new_portfolio.id}), 201
+def portfolio_insert_statements():
+    """INSERT statements for portfolios (returning their ids in parameter order) and funds"""
+    return (db.insert(Portfolio).returning(Portfolio.id, sort_by_parameter_order=True), db.insert(Fund))
 
-@app.route('/api/portfolio/<int:investor_id>', methods=['GET'])
-def get_portfolio(investor_id):
-    # Find the most recent portfolio for the investor
-    portfolio = Portfolio.query.filter_by(investor_id=investor_id).order_by(Portfolio.created_at.desc()).first()
+def insert_portfolios(portfolios, session=None):
+    """Insert ``portfolio_rows`` results with one statement per table; returns the new portfolio ids.
 
-    if not portfolio:
-        return jsonify({'error': 'No portfolio found for this investor.'}), 404
+    ``session`` defaults to the app's; the ASGI app passes its own through
+    ``AsyncSession.run_sync``.
+    """
+    session = session or db.session
+    insert_portfolio, insert_fund = portfolio_insert_statements()
+    portfolio_ids = session.scalars(insert_portfolio, [portfolio for portfolio, _ in portfolios]).all()
+    funds = [dict(fund, portfolio_id=portfolio_id)
+             for (_, portfolio_funds), portfolio_id in zip(portfolios, portfolio_ids) for fund in portfolio_funds]
+    # An empty executemany would insert a row of defaults
+    if funds:
+        session.execute(insert_fund, funds)
+    return portfolio_ids
 
-    # Get the investor's name
-    investor = Investor.query.get_or_404(investor_id)
+def latest_portfolio_query(investor_id):
+    """Statement returning the investor's most recent portfolio, one row per fund"""
+    # Most recent portfolio for the investor
+    latest_portfolio_id = (
+        db.select(Portfolio.id)
+        .where(Portfolio.investor_id == investor_id)
+        .order_by(Portfolio.created_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    # Portfolio, investor name and funds with their asset class in one statement
+    return (
+        db.select(
+            Portfolio.id, Portfolio.name, Portfolio.created_at, Investor.name.label('investor_name'),
+            Fund.id.label('fund_id'), Fund.fund_name, Fund.amount, Fund.expected_return,
+            FundMaster.asset_class, FundMaster.scheme_code
+        )
+        .join(Investor, Investor.id == Portfolio.investor_id)
+        .outerjoin(Fund, Fund.portfolio_id == Portfolio.id)
+        .outerjoin(FundMaster, FundMaster.id == Fund.fund_master_id)
+        .where(Portfolio.id == latest_portfolio_id)
+        .order_by(Fund.id)
+    )
 
-    # Get the funds associated with this portfolio
-    funds = Fund.query.filter_by(portfolio_id=portfolio.id).all()
+def load_latest_portfolio(investor_id):
+    """Rows of the investor's most recent portfolio, one per fund (empty if none)"""
+    return db.session.execute(latest_portfolio_query(investor_id)).all()
 
-    portfolio_data = {
-        'investor_name': investor.name,
+def portfolio_payload(rows):
+    """Portfolio response from the rows of latest_portfolio_query"""
+    portfolio = rows[0]
+    return {
+        'investor_name': portfolio.investor_name,
         'portfolio_id': portfolio.id,
         'portfolio_name': portfolio.name,
         'created_at': portfolio.created_at.strftime('%Y-%m-%d %H:%M:%S'),
         'funds': [
             {
-                'fund_name': fund.fund_name,
-                'amount': fund.amount,
-                'expected_return': fund.expected_return,
-                # Attempt to get asset_class from FundMaster
-                'asset_class': FundMaster.query.filter_by(fund_name=fund.fund_name).first().asset_class or 'N/A'
-            } for fund in funds
+                'fund_name': row.fund_name,
+                'amount': row.amount,
+                'expected_return': row.expected_return,
+                'asset_class': row.asset_class or 'N/A'
+            } for row in rows if row.fund_id is not None
         ]
     }
 
-    return jsonify(portfolio_data), 201
+@app.route('/api/portfolio/<int:investor_id>', methods=['GET'])
+def get_portfolio(investor_id):
+    rows = load_latest_portfolio(investor_id)
+    if not rows:
+        return jsonify({'error': 'No portfolio found for this investor.'}), 404
 
-@app.route('/api/recommendations/<int:investor_id>', methods=['GET'])
-def get_recommendations(investor_id):
+    return jsonify(portfolio_payload(rows)), 201
+
+# Portfolio history
+def portfolio_versions(investor_id):
+    """Subquery of the investor's portfolios numbered 1, 2, ... in creation order"""
+    return db.select(
+        Portfolio.id, Portfolio.name, Portfolio.created_at,
+        db.func.row_number().over(order_by=(Portfolio.created_at, Portfolio.id)).label('version'),
+        db.func.count().over().label('portfolio_count')
+    ).where(Portfolio.investor_id == investor_id).subquery('versions')
+
+def portfolio_funds_query(portfolios):
+    """Funds of the portfolios in subquery ``portfolios``, with per-portfolio aggregates as window functions"""
+    per_portfolio = {'partition_by': portfolios.c.id}
+    total = db.func.sum(Fund.amount).over(**per_portfolio)
+    return (
+        db.select(
+            portfolios.c.id, portfolios.c.name, portfolios.c.created_at, portfolios.c.version,
+            portfolios.c.portfolio_count, Fund.id.label('fund_id'), Fund.fund_name, Fund.amount,
+            Fund.expected_return, FundMaster.asset_class,
+            db.func.count(Fund.id).over(**per_portfolio).label('fund_count'),
+            total.label('total_amount'),
+            (db.func.sum(Fund.amount * Fund.expected_return).over(**per_portfolio)
+             / db.func.nullif(total, 0)).label('weighted_expected_return')
+        )
+        .outerjoin(Fund, Fund.portfolio_id == portfolios.c.id)
+        .outerjoin(FundMaster, FundMaster.id == Fund.fund_master_id)
+        .order_by(portfolios.c.version.desc(), Fund.id)
+    )
+
+def portfolio_versions_payload(rows):
+    """Portfolios, newest first, from the rows of portfolio_funds_query"""
+    portfolios = {}
+    for row in rows:
+        portfolio = portfolios.get(row.id)
+        if portfolio is None:
+            portfolio = portfolios[row.id] = {
+                'portfolio_id': row.id,
+                'version': row.version,
+                'portfolio_name': row.name,
+                'created_at': row.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'fund_count': row.fund_count,
+                'total_amount': round(row.total_amount or 0, 2),
+                'weighted_expected_return': (round(row.weighted_expected_return, 2)
+                                             if row.weighted_expected_return is not None else None),
+                'funds': []
+            }
+        if row.fund_id is not None:
+            portfolio['funds'].append({
+                'fund_name': row.fund_name,
+                'amount': row.amount,
+                'expected_return': row.expected_return,
+                'asset_class': row.asset_class or 'N/A'
+            })
+    return list(portfolios.values())
+
+@app.route('/api/portfolios/<int:investor_id>/history', methods=['GET'])
+def get_portfolio_history(investor_id):
+    # Newest first, paged by version: pass next_before_version back as before_version
+    Investor.query.get_or_404(investor_id)
+    limit = min(int_arg(request.args, 'limit', app.config['PORTFOLIO_HISTORY_PAGE_SIZE']),
+                app.config['PORTFOLIO_HISTORY_PAGE_SIZE_MAX'])
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    before_version = int_arg(request.args, 'before_version', None)
+
+    versions = portfolio_versions(investor_id)
+    page = db.select(versions).order_by(versions.c.version.desc()).limit(limit + 1)
+    if before_version is not None:
+        page = page.where(versions.c.version < before_version)
+    rows = db.session.execute(portfolio_funds_query(page.subquery('page'))).all()
+    portfolios = portfolio_versions_payload(rows)
+
+    has_more = len(portfolios) > limit
+    portfolios = portfolios[:limit]
+    return jsonify({
+        'investor_id': investor_id,
+        # Unknown when the cursor is past the oldest portfolio
+        'portfolio_count': rows[0].portfolio_count if rows else (0 if before_version is None else None),
+        'portfolios': portfolios,
+        'next_before_version': portfolios[-1]['version'] if has_more else None,
+        'has_more': has_more
+    })
+
+def amount_changes(old_funds, new_funds, key):
+    """Amounts per ``key`` (fund_name or asset_class) before and after, in first-seen order"""
+    totals = {}
+    for side, funds in enumerate((old_funds, new_funds)):
+        for fund in funds:
+            amounts = totals.setdefault(fund[key], [0.0, 0.0])
+            amounts[side] += fund['amount']
+    changes = []
+    for name, (before, after) in totals.items():
+        change = round(after - before, 2)
+        if not before:
+            status = 'added'
+        elif not after:
+            status = 'removed'
+        else:
+            status = 'changed' if change else 'unchanged'
+        changes.append({key: name, 'before': round(before, 2), 'after': round(after, 2),
+                        'change': change, 'status': status})
+    return changes
+
+@app.route('/api/portfolios/<int:investor_id>/diff', methods=['GET'])
+def get_portfolio_diff(investor_id):
+    # Versions as numbered by the history endpoint; by default the latest against the one before,
+    # or against an empty portfolio ('from' is null) when there is only one
+    Investor.query.get_or_404(investor_id)
+    from_version = int_arg(request.args, 'from', None)
+    to_version = int_arg(request.args, 'to', None)
+
+    versions = portfolio_versions(investor_id)
+    to_condition = versions.c.version == (to_version if to_version is not None else versions.c.portfolio_count)
+    if from_version is not None:
+        from_condition = versions.c.version == from_version
+    elif to_version is not None:
+        from_condition = versions.c.version == to_version - 1
+    else:
+        from_condition = versions.c.version == versions.c.portfolio_count - 1
+    pair = db.select(versions).where(db.or_(from_condition, to_condition)).subquery('pair')
+    portfolios = portfolio_versions_payload(db.session.execute(portfolio_funds_query(pair)))
+
+    by_version = {portfolio['version']: portfolio for portfolio in portfolios}
+    if to_version is None:
+        if not portfolios:
+            return jsonify({'error': 'No portfolio found for this investor.'}), 404
+        to_version = portfolios[0]['version']
+    implied_from = from_version is None
+    if implied_from:
+        from_version = to_version - 1
+    for version in (from_version, to_version):
+        # The first version has nothing before it: it is diffed against an empty portfolio
+        if version not in by_version and not (implied_from and version == 0):
+            return jsonify({'error': f'Portfolio version {version} not found for this investor.'}), 404
+
+    old, new = by_version.get(from_version), by_version[to_version]
+    summary_fields = ('portfolio_id', 'version', 'portfolio_name', 'created_at', 'total_amount', 'weighted_expected_return')
+    weighted_change = None
+    if old is not None and old['weighted_expected_return'] is not None and new['weighted_expected_return'] is not None:
+        weighted_change = round(new['weighted_expected_return'] - old['weighted_expected_return'], 2)
+    previous = old
+    if old is None:
+        old = {'total_amount': 0.0, 'funds': []}
+    return jsonify({
+        'investor_id': investor_id,
+        'from': {field: previous[field] for field in summary_fields} if previous is not None else None,
+        'to': {field: new[field] for field in summary_fields},
+        'total_amount_change': round(new['total_amount'] - old['total_amount'], 2),
+        'weighted_expected_return_change': weighted_change,
+        'funds': amount_changes(old['funds'], new['funds'], 'fund_name'),
+        'asset_classes': amount_changes(old['funds'], new['funds'], 'asset_class')
+    })
+
+@app.route('/api/portfolio/<int:investor_id>/projection', methods=['GET'])
+def get_portfolio_projection(investor_id):
     investor = Investor.query.get_or_404(investor_id)
-    
+    snapshot = reference_data.snapshot()
+    years = request.args.get('years', horizon_years(investor.investment_horizon), type=int)
+    paths = request.args.get('paths', app.config['PROJECTION_PATHS'], type=int)
+    seed = request.args.get('seed', type=int)
+    if not 1 <= years <= 50:
+        return jsonify({'error': 'years must be between 1 and 50'}), 400
+    if not 100 <= paths <= app.config['PROJECTION_PATHS_MAX']:
+        return jsonify({'error': f"paths must be between 100 and {app.config['PROJECTION_PATHS_MAX']}"}), 400
+
+    result = project_investor(investor, load_latest_portfolio(investor_id), snapshot, years, paths, seed)
+    if result is None:
+        return jsonify({'error': 'Nothing to project for this investor.'}), 404
+    return jsonify(result)
+
+def project_investor(investor, rows, snapshot, years, paths, seed=None):
+    """Projection of the saved portfolio ``rows``, or of the current recommendation if there are none"""
+    rows = [row for row in rows if row.fund_id is not None]
+    if rows:
+        source = 'portfolio'
+        holdings = []
+        for row in rows:
+            # Funds with NAV history project with their current NAV-based return
+            fund = snapshot.funds_by_name.get(row.fund_name)
+            expected_return = fund.expected_return if fund and fund.volatility is not None else row.expected_return
+            holdings.append((row.fund_name, row.amount, expected_return))
+    else:
+        source = 'recommendation'
+        holdings = [(rec['fund_name'], rec['recommended_investment'], rec['expected_return'])
+                    for rec in build_recommendation_payload(investor, snapshot)['recommendations']
+                    if rec['fund_name']]
+    if not holdings:
+        return None
+
+    # Aggregate holdings per asset class: total amount, amount-weighted return and volatility
+    volatility_by_risk = app.config['PROJECTION_VOLATILITY']
+    classes = {}
+    for fund_name, amount, expected_return in holdings:
+        fund = snapshot.funds_by_name.get(fund_name)
+        asset_class = fund.asset_class if fund else 'other'
+        volatility = volatility_by_risk.get(fund.risk_level if fund else None, FALLBACK_VOLATILITY)
+        if fund and fund.volatility is not None:
+            volatility = fund.volatility
+        total = classes.setdefault(asset_class, [0.0, 0.0, 0.0])
+        total[0] += amount
+        total[1] += amount * expected_return
+        total[2] += amount * volatility
+    asset_classes = [a for a in classes if classes[a][0] > 0]
+    if not asset_classes:
+        return None
+    amounts = [classes[a][0] for a in asset_classes]
+    expected_returns = [classes[a][1] / classes[a][0] for a in asset_classes]
+    volatilities = [classes[a][2] / classes[a][0] for a in asset_classes]
+
+    result = project(amounts, expected_returns, volatilities, years, investor.required_return,
+                     paths=paths, correlation=app.config['PROJECTION_CORRELATION'], seed=seed)
+    result.update({
+        'investor_id': investor.id,
+        'source': source,
+        'horizon_years': years,
+        'required_return': investor.required_return,
+        'asset_classes': [
+            {'asset_class': a, 'amount': round(amt, 2), 'expected_return': round(r, 4), 'volatility': round(v, 4)}
+            for a, amt, r, v in zip(asset_classes, amounts, expected_returns, volatilities)
+        ]
+    })
+    return result
+
+def build_recommendation_payload(investor, snapshot):
+    """Recommendation payload for an investor against a reference data snapshot"""
     # Calculate financial health metrics
     net_worth = investor.existing_assets - investor.existing_liabilities
     monthly_surplus = investor.monthly_income - investor.monthly_expenses
     debt_to_income_ratio = (investor.existing_liabilities / investor.monthly_income) if investor.monthly_income > 0 else 0
     
+    # Stored risk classification
+    demographic_score, risk_category, risk_category_code = investor.risk_classification()
+
     # Get asset allocation based on risk profile
-    asset_allocation = investor.get_asset_allocation()
-    portfolio_amounts = investor.calculate_portfolio_amounts()
+    asset_allocation = investor.get_asset_allocation(snapshot)
+    portfolio_amounts = investor.calculate_portfolio_amounts(asset_allocation)
     
     # Generate recommendations for each asset class
     recommendations = []
-    portfolio_amounts = investor.calculate_portfolio_amounts()
+    policy = fund_split_policy()
 
     for asset_class, amount in portfolio_amounts.items():
-        if amount > 0:
-            # Query available funds from database for this asset class
-            available_funds = FundMaster.query.filter_by(asset_class=asset_class).all()
-            if not available_funds:
-                continue
-
-            # Find funds the investor can afford with the allocated amount
-            affordable_funds = [f for f in available_funds if f.min_investment <= amount]
-
-            best_fund = None
-            if affordable_funds:
-                # From affordable funds, pick the one with the highest return
-                best_fund = max(affordable_funds, key=lambda x: x.expected_return)
-            elif available_funds:
-                # If none are affordable, recommend the one with the lowest min investment as a fallback
-                best_fund = min(available_funds, key=lambda x: x.min_investment)
-
-            if best_fund:
-                recommendations.append({
-                    'asset_class': asset_class.replace('_', ' ').title(),
-                    'fund_name': best_fund.fund_name,
-                    'recommended_investment': round(amount, 2),
-                    'expected_return': best_fund.expected_return
-                })
+        index = snapshot.fund_index(asset_class)
+        if amount > 0 and len(index):
+            # Large amounts are split across several funds; otherwise the best affordable
+            # fund (highest expected return with min_investment <= amount). An amount
+            # below every fund's minimum is flagged instead of given a fund it can't buy.
+            holdings = index.allocate(amount, policy)
+            if not holdings:
+                recommendations.append(below_minimum_line(asset_class, amount, index))
+            for fund, fund_amount in holdings:
+                recommendations.append(recommendation_line(asset_class, fund, fund_amount))
 
     # Generate financial health assessment
     financial_health = "Good"
@@ -472,7 +1262,7 @@ def get_recommendations(investor_id):
         financial_health = "Poor"
         health_warnings.append("Monthly expenses exceed income. Focus on budgeting before investing.")
     
-    return jsonify({
+    return {
         'investor_profile': {
             'name': investor.name,
             'age': investor.age,
@@ -485,10 +1275,10 @@ def get_recommendations(investor_id):
         },
         'risk_assessment': {
             'risk_score': investor.risk_score,
-            'demographic_score': investor.calculate_demographic_score(),
-            'combined_score': investor.risk_score + investor.calculate_demographic_score(),
-            'risk_category': investor.determine_risk_category()[0],
-            'risk_category_code': investor.determine_risk_category()[1],
+            'demographic_score': demographic_score,
+            'combined_score': investor.risk_score + demographic_score,
+            'risk_category': risk_category,
+            'risk_category_code': risk_category_code,
             'risk_tolerance': investor.risk_tolerance
         },
         'asset_allocation': {
@@ -507,9 +1297,1247 @@ def get_recommendations(investor_id):
             'health_warnings': health_warnings
         },
         'recommendations': recommendations
+    }
+
+def render_recommendation(investor, snapshot):
+    """Serialized recommendation response body"""
+    return (app.json.dumps(build_recommendation_payload(investor, snapshot)) + '\n').encode()
+
+@app.route('/api/recommendations/<int:investor_id>', methods=['GET'])
+def get_recommendations(investor_id):
+    # The payload is a pure function of the investor row and the reference
+    # data, so (row_version, reference data version) identifies it
+    row_version = db.session.execute(
+        db.select(Investor.row_version).where(Investor.id == investor_id)
+    ).scalar()
+    if row_version is None:
+        abort(404)
+    snapshot = reference_data.snapshot()
+    version = (row_version, snapshot.version)
+    etag = f'{investor_id}-{row_version}-{snapshot.version}'
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        cached = recommendation_cache.get(investor_id, version)
+        if cached is not None:
+            body = cached.body
+        else:
+            investor = Investor.query.get_or_404(investor_id)
+            body = render_recommendation(investor, snapshot)
+            recommendation_cache.put(investor_id, version, etag, body)
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/recommendations/cache/stats', methods=['GET'])
+def get_recommendation_cache_stats():
+    return jsonify(recommendation_cache.stats())
+
+# Batch recommendations
+def investor_frame_chunk(after_id, chunk_size, risk_category=None, until_id=None):
+    """DataFrame of INVESTOR_COLUMNS for the next ``chunk_size`` investors by ID after ``after_id``"""
+    query = db.select(*[getattr(Investor, c) for c in INVESTOR_COLUMNS]).where(Investor.id > after_id)
+    if risk_category:
+        query = query.where(Investor.risk_category == risk_category)
+    if until_id is not None:
+        query = query.where(Investor.id <= until_id)
+    rows = db.session.execute(query.order_by(Investor.id).limit(chunk_size)).all()
+    # Don't hold a read transaction open while the chunk is scored
+    db.session.rollback()
+    return pd.DataFrame.from_records(rows, columns=INVESTOR_COLUMNS)
+
+def iter_investor_chunks(investor_ids=None, chunk_size=None, risk_category=None):
+    """Yield (requested IDs, DataFrame of INVESTOR_COLUMNS) one chunk at a time.
+
+    ``investor_ids=None`` walks the whole investor book by primary key,
+    optionally only one stored ``risk_category``; otherwise the given IDs are
+    loaded in chunks and the frame rows follow the requested order, with
+    missing IDs left out.
+    """
+    chunk_size = chunk_size or app.config['BATCH_CHUNK_SIZE']
+    columns = [getattr(Investor, c) for c in INVESTOR_COLUMNS]
+
+    if investor_ids is None:
+        last_id = 0
+        while True:
+            frame = investor_frame_chunk(last_id, chunk_size, risk_category)
+            if frame.empty:
+                return
+            last_id = int(frame['id'].iloc[-1])
+            yield None, frame
+        return
+
+    for start in range(0, len(investor_ids), chunk_size):
+        chunk_ids = investor_ids[start:start + chunk_size]
+        rows = db.session.execute(db.select(*columns).where(Investor.id.in_(chunk_ids))).all()
+        position = {investor_id: i for i, investor_id in enumerate(chunk_ids)}
+        rows.sort(key=lambda row: position[row.id])
+        db.session.rollback()
+        yield chunk_ids, pd.DataFrame.from_records(rows, columns=INVESTOR_COLUMNS)
+
+def batch_result(investor_id, payload, error):
+    if error:
+        return {'investor_id': investor_id, 'error': error}
+    return {'investor_id': investor_id, 'recommendation': payload}
+
+def generate_batch_recommendations(investor_ids=None, chunk_size=None, risk_category=None):
+    """Yield one result dict per investor, in investor ID or requested order"""
+    snapshot = reference_data.snapshot()
+    policy = fund_split_policy()
+    if investor_ids is not None:
+        investor_ids = list(dict.fromkeys(investor_ids))
+    for chunk_ids, frame in iter_investor_chunks(investor_ids, chunk_size, risk_category):
+        found = set()
+        for investor_id, payload, error in recommend_frame(frame, snapshot, policy):
+            found.add(investor_id)
+            yield batch_result(investor_id, payload, error)
+        for investor_id in chunk_ids or ():
+            if investor_id not in found:
+                yield {'investor_id': investor_id, 'error': 'Investor not found'}
+
+def parse_investor_ids(value):
+    """Parse the batch target: 'all' or a list of investor IDs"""
+    if value == 'all':
+        return None
+    if isinstance(value, str):
+        value = [v for v in value.split(',') if v.strip()]
+    if not isinstance(value, list) or not value:
+        raise ValueError("investor_ids must be 'all' or a non-empty list of IDs")
+    return [int(v) for v in value]
+
+@app.route('/api/recommendations/batch', methods=['POST'])
+def get_batch_recommendations():
+    data = request.get_json(silent=True) or {}
+    try:
+        investor_ids = parse_investor_ids(data.get('investor_ids', 'all'))
+        chunk_size = int(data.get('chunk_size') or app.config['BATCH_CHUNK_SIZE'])
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid batch request: {str(e)}'}), 400
+
+    def generate():
+        for result in generate_batch_recommendations(investor_ids, chunk_size, data.get('risk_category')):
+            yield json.dumps(result) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.cli.command('recommend-batch')
+@click.argument('investor_ids', default='all')
+@click.option('--output', '-o', type=click.File('w'), default='-', help='NDJSON output file (default: stdout)')
+@click.option('--chunk-size', type=int, default=None, help='Investors scored per chunk')
+def recommend_batch_command(investor_ids, output, chunk_size):
+    """Write recommendations for INVESTOR_IDS (comma-separated or 'all') as NDJSON."""
+    count = 0
+    for result in generate_batch_recommendations(parse_investor_ids(investor_ids), chunk_size):
+        output.write(json.dumps(result) + '\n')
+        count += 1
+    click.echo(f'Wrote recommendations for {count} investors.', err=True)
+
+# What-if scenarios
+SCENARIO_FIELDS = [field for field in TEXT_FIELDS + INT_FIELDS + FLOAT_FIELDS + ANSWER_FIELDS if field != 'email']
+SCENARIO_DEFAULTS = {'name': 'Scenario'}
+# Sections of a recommendation payload a scenario request can ask for
+SCENARIO_SECTIONS = ('investor_profile', 'risk_assessment', 'asset_allocation', 'financial_analysis', 'recommendations')
+
+def scenario_variations(data):
+    """Parameter overrides of a scenario request: the ``scenarios`` list, then every ``grid`` combination"""
+    variations = list(data.get('scenarios') or [])
+    grid = data.get('grid') or {}
+    if not isinstance(grid, dict) or not all(isinstance(v, list) and v for v in grid.values()):
+        raise ValueError('grid must map parameter names to non-empty lists of values')
+    count = len(variations)
+    if grid:
+        combinations = 1
+        for values in grid.values():
+            combinations *= len(values)
+        count += combinations
+    if count > app.config['SCENARIOS_MAX']:
+        raise ValueError(f"at most {app.config['SCENARIOS_MAX']} scenarios per request")
+    if grid:
+        variations += [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    if not variations:
+        raise ValueError('scenarios or grid is required')
+    for overrides in variations:
+        if not isinstance(overrides, dict):
+            raise ValueError('each scenario must be an object of parameter overrides')
+        unknown = sorted(set(overrides) - set(SCENARIO_FIELDS))
+        if unknown:
+            raise ValueError(f"unknown scenario parameters: {', '.join(unknown)}")
+    return variations
+
+def evaluate_scenarios(base, variations, snapshot, policy=None, sections=SCENARIO_SECTIONS):
+    """Recommendation payload (or errors) for ``base`` with each variation applied.
+
+    Pure: nothing is read from or written to the database. Each distinct
+    parameter value is validated once, and all valid scenarios are scored
+    and allocated together by the batch recommendation engine.
+    """
+    base = dict(SCENARIO_DEFAULTS, **base)
+    base_fields = {field: validate_field(field, base.get(field)) for field in SCENARIO_FIELDS}
+    validated = {}
+    results = []
+    rows = []
+    for i, overrides in enumerate(variations):
+        fields = dict(base_fields)
+        for field, value in overrides.items():
+            try:
+                key = (field, type(value), value)
+                fields[field] = validated.get(key) or validated.setdefault(key, validate_field(field, value))
+            except TypeError:  # Unhashable values are invalid anyway
+                fields[field] = validate_field(field, value)
+        results.append({'scenario': i, 'parameters': overrides})
+        errors = [error for _, error in fields.values() if error]
+        if errors:
+            results[i]['errors'] = errors
+        else:
+            rows.append(dict({field: value for field, (value, _) in fields.items()}, id=i))
+    if not rows:
+        return results
+
+    # Without stored risk_score/risk_tolerance columns the engine reports the computed ones
+    frame = pd.DataFrame.from_records(rows)
+    for i, payload, error in recommend_frame(frame, snapshot, policy):
+        if error:
+            results[i]['errors'] = [error]
+        else:
+            results[i]['recommendation'] = {section: payload[section] for section in sections}
+    return results
+
+@app.route('/api/scenarios', methods=['POST'])
+def evaluate_scenarios_endpoint():
+    # Base investor (a saved investor_id, or the fields in base) re-run with each variation
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    try:
+        variations = scenario_variations(data)
+        base = data.get('base') or {}
+        if not isinstance(base, dict):
+            raise ValueError('base must be an object of investor fields')
+        investor_id = data.get('investor_id')
+        if investor_id is not None:
+            investor_id = int(investor_id)
+        sections = data.get('include', list(SCENARIO_SECTIONS))
+        if not isinstance(sections, list) or not sections or not set(sections) <= set(SCENARIO_SECTIONS):
+            raise ValueError(f"include must be a list of {', '.join(SCENARIO_SECTIONS)}")
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid scenario request: {str(e)}'}), 400
+
+    if investor_id is not None:
+        investor = db.session.get(Investor, investor_id)
+        if investor is None:
+            return jsonify({'error': 'Investor not found'}), 404
+        base = dict({field: getattr(investor, field) for field in SCENARIO_FIELDS}, **base)
+
+    results = evaluate_scenarios(base, variations, reference_data.snapshot(), fund_split_policy(), sections)
+    return jsonify({
+        'investor_id': investor_id,
+        'count': len(results),
+        'scenarios': results
     })
 
+# Data export
+EXPORT_DATASETS = ('investors', 'portfolios', 'recommendations')
+PORTFOLIO_EXPORT_COLUMNS = [
+    Portfolio.id.label('portfolio_id'), Portfolio.investor_id, Portfolio.name.label('portfolio_name'),
+    Portfolio.created_at, Fund.id.label('fund_id'), Fund.fund_master_id, Fund.fund_name,
+    FundMaster.asset_class, Fund.amount, Fund.expected_return
+]
+RECOMMENDATION_EXPORT_COLUMNS = [
+    Column('investor_id', 'int'), Column('risk_category', 'str'), Column('risk_tolerance', 'str'),
+    Column('total_investment', 'float'), Column('asset_class', 'str'), Column('fund_name', 'str'),
+    Column('recommended_investment', 'float'), Column('expected_return', 'float'), Column('error', 'str')
+]
+
+def export_columns(columns):
+    """Export Columns for SQLAlchemy columns"""
+    return [Column(c.key, column_kind(c.type.python_type)) for c in columns]
+
+def iter_export_chunks(chunk_query, chunk_size):
+    """Yield lists of rows, reading each chunk in its own short transaction.
+
+    ``chunk_query(last_key, chunk_size)`` is the statement for the chunk after
+    ``last_key``; the first column of its rows is the key. Ending the read
+    transaction between chunks keeps a long export from pinning an SQLite
+    snapshot (which holds back WAL checkpoints) while it is written out.
+    """
+    last_key = 0
+    while True:
+        rows = db.session.execute(chunk_query(last_key, chunk_size)).all()
+        db.session.rollback()
+        if not rows:
+            return
+        last_key = rows[-1][0]
+        yield rows
+
+def investor_export(chunk_size, risk_category=None):
+    """(columns, chunks) of every Investor column"""
+    columns = list(Investor.__table__.columns)
+
+    def chunk_query(last_id, limit):
+        query = db.select(*columns).where(Investor.id > last_id)
+        if risk_category:
+            query = query.where(Investor.risk_category == risk_category)
+        return query.order_by(Investor.id).limit(limit)
+
+    return export_columns(columns), iter_export_chunks(chunk_query, chunk_size)
+
+def portfolio_export(chunk_size, risk_category=None):
+    """(columns, chunks) of portfolios, one row per fund with its asset class"""
+    def chunk_query(last_id, limit):
+        portfolio_ids = db.select(Portfolio.id).where(Portfolio.id > last_id)
+        if risk_category:
+            portfolio_ids = portfolio_ids.join(Investor, Investor.id == Portfolio.investor_id).where(
+                Investor.risk_category == risk_category)
+        portfolio_ids = portfolio_ids.order_by(Portfolio.id).limit(limit)
+        return (
+            db.select(*PORTFOLIO_EXPORT_COLUMNS)
+            .outerjoin(Fund, Fund.portfolio_id == Portfolio.id)
+            .outerjoin(FundMaster, FundMaster.id == Fund.fund_master_id)
+            .where(Portfolio.id.in_(portfolio_ids.scalar_subquery()))
+            .order_by(Portfolio.id, Fund.id)
+        )
+
+    return export_columns(PORTFOLIO_EXPORT_COLUMNS), iter_export_chunks(chunk_query, chunk_size)
+
+def recommendation_rows(result):
+    """Flat export rows for one batch recommendation result, one per recommended fund"""
+    if 'error' in result:
+        return [(result['investor_id'], None, None, None, None, None, None, None, result['error'])]
+    payload = result['recommendation']
+    head = (result['investor_id'], payload['risk_assessment']['risk_category'],
+            payload['risk_assessment']['risk_tolerance'], payload['asset_allocation']['total_investment'])
+    rows = [head + (rec['asset_class'], rec['fund_name'], rec['recommended_investment'],
+                    rec['expected_return'], None) for rec in payload['recommendations']]
+    return rows or [head + (None, None, None, None, None)]
+
+def recommendation_export(chunk_size, risk_category=None):
+    """(columns, chunks) of freshly computed recommendations, one row per recommended fund"""
+    results = generate_batch_recommendations(None, chunk_size, risk_category)
+    chunks = ([row for result in chunk for row in recommendation_rows(result)]
+              for chunk in chunked(results, chunk_size))
+    return RECOMMENDATION_EXPORT_COLUMNS, chunks
+
+def export_dataset(dataset, chunk_size=None, risk_category=None):
+    """(columns, chunks) for one of EXPORT_DATASETS"""
+    chunk_size = chunk_size or app.config['BATCH_CHUNK_SIZE']
+    export = {'investors': investor_export, 'portfolios': portfolio_export,
+              'recommendations': recommendation_export}[dataset]
+    return export(chunk_size, risk_category)
+
+@app.route('/api/export/<dataset>', methods=['GET'])
+def export_data(dataset):
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({'error': f"Unknown dataset, expected one of: {', '.join(EXPORT_DATASETS)}"}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({'error': 'Parquet export requires pyarrow'}), 501
+    chunk_size = request.args.get('chunk_size', type=int)
+    if chunk_size is not None and chunk_size < 1:
+        return jsonify({'error': 'chunk_size must be positive'}), 400
+
+    columns, chunks = export_dataset(dataset, chunk_size, request.args.get('risk_category'))
+    return Response(
+        stream_with_context(export_chunks(columns, chunks, fmt)),
+        mimetype=CONTENT_TYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename={dataset}.{fmt}'}
+    )
+
+@app.cli.command('export')
+@click.argument('dataset', type=click.Choice(EXPORT_DATASETS))
+@click.option('--output', '-o', type=click.Path(dir_okay=False, allow_dash=True), default='-',
+              help='Output file (default: stdout)')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default=None,
+              help='Defaults to the output file extension, else csv')
+@click.option('--chunk-size', type=int, default=None, help='Rows (investors for recommendations) read per chunk')
+@click.option('--risk-category', default=None, help='Only investors with this stored risk category')
+def export_command(dataset, output, fmt, chunk_size, risk_category):
+    """Stream DATASET (investors, portfolios or recommendations) to CSV, NDJSON or Parquet."""
+    fmt = fmt or detect_export_format(output) or 'csv'
+    if fmt == 'parquet' and not parquet_available():
+        raise click.UsageError('Parquet export requires pyarrow')
+    columns, chunks = export_dataset(dataset, chunk_size, risk_category)
+    start = time.perf_counter()
+    written = 0
+    with click.open_file(output, 'wb') as stream:
+        for piece in export_chunks(columns, chunks, fmt):
+            stream.write(piece)
+            written += len(piece)
+    click.echo(f'Exported {dataset} as {fmt} ({written} bytes) in {time.perf_counter() - start:.2f}s.', err=True)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/reference-data/stats', methods=['GET'])
+def get_reference_data_stats():
+    return jsonify(reference_data.stats())
+
+@app.cli.command('reference-snapshot')
+def reference_snapshot_command():
+    """Load the reference data from the database and save its snapshot file."""
+    path = app.config['REFERENCE_SNAPSHOT_PATH']
+    if not path:
+        raise click.UsageError('REFERENCE_SNAPSHOT_PATH is empty, snapshots are disabled')
+    reference_data.invalidate()
+    snapshot = reference_data.snapshot()
+    click.echo(f'Saved reference data version {snapshot.version} ({len(snapshot.funds)} funds) to {path}.')
+
+# Portfolio valuation
+def valuation_date(args):
+    """The as_of argument (YYYY-MM-DD), today by default; ValueError for a malformed date"""
+    value = args.get('as_of')
+    if not value:
+        return datetime.utcnow().date()
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def value_portfolios(rows, as_of, include_funds=True):
+    """Valuation of each portfolio in ``rows``, one row per fund, in row order.
+
+    Rows carry the portfolio id, name and created_at plus fund_id, fund_name,
+    amount and scheme_code. NAVs are resolved once per
+    scheme and the XIRRs of every fund and portfolio are solved together.
+    Portfolios created after ``as_of`` are left out. Returns
+    ``[(valuation, investment flows)]``, the flows for grouping further.
+    """
+    rows = [row for row in rows if row.fund_id is not None and row.created_at.date() <= as_of]
+    positions = [Position(row.fund_name, row.scheme_code, row.amount, row.created_at.date()) for row in rows]
+    valuations = value_positions(positions, nav_store.reload(), as_of)
+
+    groups = {}
+    for i, row in enumerate(rows):
+        groups.setdefault(row.id, []).append(i)
+    problems = [cash_flows([positions[i]], [valuations[i]], as_of) for i in range(len(rows))]
+    problems += [cash_flows([positions[i] for i in indexes], [valuations[i] for i in indexes], as_of)
+                 for indexes in groups.values()]
+    rates = xirr(problems)
+    for valuation, rate in zip(valuations, rates):
+        valuation['xirr'] = rate
+
+    portfolios = []
+    for (portfolio_id, indexes), rate in zip(groups.items(), rates[len(rows):]):
+        row = rows[indexes[0]]
+        portfolio = {
+            'portfolio_id': portfolio_id,
+            'portfolio_name': row.name,
+            'created_at': row.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        portfolio.update(summarize([valuations[i] for i in indexes]))
+        portfolio['xirr'] = rate
+        if include_funds:
+            portfolio['funds'] = [valuations[i] for i in indexes]
+        # Investment flows of the valued funds, without their value flow
+        portfolios.append((portfolio, [flow for i in indexes for flow in problems[i][:-1]]))
+    return portfolios
+
+@app.route('/api/portfolio/<int:investor_id>/valuation', methods=['GET'])
+def get_portfolio_valuation(investor_id):
+    try:
+        as_of = valuation_date(request.args)
+    except ValueError:
+        return jsonify({'error': 'as_of must be a date as YYYY-MM-DD'}), 400
+    rows = load_latest_portfolio(investor_id)
+    if not rows:
+        return jsonify({'error': 'No portfolio found for this investor.'}), 404
+    portfolios = value_portfolios(rows, as_of)
+    if not portfolios:
+        return jsonify({'error': 'Nothing to value for this investor.'}), 404
+
+    valuation = portfolios[0][0]
+    return jsonify(dict(valuation, investor_id=investor_id, investor_name=rows[0].investor_name, as_of=as_of.isoformat()))
+
+@app.route('/api/valuations', methods=['GET'])
+def get_valuations():
+    # Every portfolio of the given investors, or of a page of investors with portfolios
+    try:
+        as_of = valuation_date(request.args)
+        investor_ids = parse_investor_ids(request.args.get('investor_ids', 'all'))
+        after_id = int_arg(request.args, 'after_id', 0)
+        limit = min(int_arg(request.args, 'limit', app.config['INVESTOR_PAGE_SIZE']),
+                    app.config['INVESTOR_PAGE_SIZE_MAX'])
+        if investor_ids is not None:
+            investor_ids = list(dict.fromkeys(investor_ids))
+            if len(investor_ids) > app.config['INVESTOR_PAGE_SIZE_MAX']:
+                raise ValueError(f"at most {app.config['INVESTOR_PAGE_SIZE_MAX']} investor_ids per request")
+        elif limit < 1:
+            raise ValueError('limit must be positive')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid valuation request: {str(e)}'}), 400
+
+    has_more = False
+    if investor_ids is None:
+        investor_ids = db.session.scalars(
+            db.select(Portfolio.investor_id).distinct()
+            .where(Portfolio.investor_id > after_id)
+            .order_by(Portfolio.investor_id)
+            .limit(limit + 1)
+        ).all()
+        has_more = len(investor_ids) > limit
+        investor_ids = investor_ids[:limit]
+
+    rows = db.session.execute(
+        db.select(
+            Portfolio.investor_id, Portfolio.id, Portfolio.name, Portfolio.created_at,
+            Fund.id.label('fund_id'), Fund.fund_name, Fund.amount, FundMaster.scheme_code
+        )
+        .outerjoin(Fund, Fund.portfolio_id == Portfolio.id)
+        .outerjoin(FundMaster, FundMaster.id == Fund.fund_master_id)
+        .where(Portfolio.investor_id.in_(investor_ids))
+        .order_by(Portfolio.investor_id, Portfolio.id, Fund.id)
+    ).all()
+    portfolio_owner = {row.id: row.investor_id for row in rows}
+    by_investor = {investor_id: [] for investor_id in investor_ids}
+    investor_flows = {investor_id: [] for investor_id in investor_ids}
+    for portfolio, flows in value_portfolios(rows, as_of, include_funds=False):
+        investor_id = portfolio_owner[portfolio['portfolio_id']]
+        by_investor[investor_id].append(portfolio)
+        investor_flows[investor_id].extend(flows)
+
+    # Investor totals across portfolios, with every investor's XIRR solved together
+    problems = [
+        investor_flows[investor_id] + [(as_of, sum(portfolio['current_value'] or 0 for portfolio in portfolios))]
+        if investor_flows[investor_id] else []
+        for investor_id, portfolios in by_investor.items()
+    ]
+    investors = []
+    for (investor_id, portfolios), rate in zip(by_investor.items(), xirr(problems)):
+        totals = summarize(portfolios)
+        investors.append(dict(totals, investor_id=investor_id, xirr=rate, portfolios=portfolios))
+
+    return jsonify({
+        'as_of': as_of.isoformat(),
+        'investors': investors,
+        'next_after_id': investor_ids[-1] if has_more else None,
+        'has_more': has_more
+    })
+
+# Scheme master
+MASTER_DATA_BATCH_SIZE = 500
+
+def upsert_statement(model, key, columns):
+    """INSERT ... ON CONFLICT (key) DO UPDATE of ``columns``"""
+    statement = sqlite_insert(model)
+    return statement.on_conflict_do_update(
+        index_elements=key, set_={column: statement.excluded[column] for column in columns})
+
+def load_fund_master(funds, retire=True):
+    """Bring FundMaster in line with validated scheme master funds in one transaction.
+
+    The table is read and diffed in one query; only changed rows are
+    upserted, and the reference data version is bumped only if any were.
+    Returns the diff counts.
+    """
+    columns = [getattr(FundMaster, field) for field in master_data.FUND_FIELDS]
+    existing = {
+        row.fund_name: dict(row._mapping)
+        for row in db.session.execute(db.select(*columns, FundMaster.retired_at))
+    }
+    rows, counts = master_data.diff_funds(existing, funds, retire)
+    statement = upsert_statement(FundMaster, ['fund_name'], master_data.FUND_FIELDS[1:] + ['retired_at'])
+    for batch in chunked(rows, MASTER_DATA_BATCH_SIZE):
+        db.session.execute(statement, batch)
+    if rows:
+        bump_reference_data_version(db.session)
+    db.session.commit()
+    return counts
+
+def load_asset_allocation(allocations):
+    """Upsert allocation rows keyed by (risk_profile, asset_class); returns how many changed"""
+    existing = {
+        (row.risk_profile, row.asset_class): row.percentage
+        for row in db.session.execute(
+            db.select(AssetAllocation.risk_profile, AssetAllocation.asset_class, AssetAllocation.percentage))
+    }
+    rows = [row for row in allocations
+            if existing.get((row['risk_profile'], row['asset_class'])) != row['percentage']]
+    if rows:
+        db.session.execute(upsert_statement(AssetAllocation, ['risk_profile', 'asset_class'], ['percentage']), rows)
+        bump_reference_data_version(db.session)
+    db.session.commit()
+    return len(rows)
+
+@app.cli.command('load-fund-master')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(master_data.SUPPORTED_FORMATS), default=None,
+              help='Defaults to the file extension')
+@click.option('--keep-missing', is_flag=True, help='Do not retire funds missing from the file')
+def load_fund_master_command(path, fmt, keep_missing):
+    """Insert, update and retire FundMaster rows from the scheme master file at PATH."""
+    fmt = fmt or master_data.detect_format(path)
+    if fmt is None:
+        raise click.UsageError('Cannot tell the file format from its name, pass --format')
+    started = time.perf_counter()
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        try:
+            records = master_data.read_records(stream, fmt)
+        except ValueError as e:
+            raise click.ClickException(f'Cannot read {path}: {str(e)}')
+    funds, errors = master_data.parse_funds(records)
+    if errors:
+        for error in errors:
+            click.echo(f"Row {error['row']} ({error['fund_name']}): {'; '.join(error['errors'])}", err=True)
+        raise click.ClickException(f'{len(errors)} invalid rows, nothing loaded.')
+    counts = load_fund_master(funds, retire=not keep_missing)
+    click.echo(f"{len(funds)} funds: {counts['inserted']} inserted, {counts['updated']} updated, "
+               f"{counts['restored']} restored, {counts['retired']} retired, {counts['unchanged']} unchanged "
+               f"in {time.perf_counter() - started:.2f}s.")
+
+# NAV history
+@app.route('/api/nav/<scheme_code>', methods=['GET'])
+def get_nav_metrics(scheme_code):
+    years = request.args.get('years', app.config['NAV_RETURN_YEARS'], type=float)
+    if not 0 < years <= 50:
+        return jsonify({'error': 'years must be between 0 and 50'}), 400
+    nav_metrics = nav_store.reload().metrics(scheme_code, years)
+    if nav_metrics is None:
+        return jsonify({'error': 'No NAV history for this scheme.'}), 404
+    return jsonify(nav_metrics)
+
+@app.cli.command('nav-ingest')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--link-by-name', is_flag=True, help='Link unlinked funds whose name matches a scheme name')
+def nav_ingest_command(paths, link_by_name):
+    """Append NAVs from AMFI NAV files at PATHS to the NAV store."""
+    start = time.perf_counter()
+    report = ingest_amfi(nav_store.reload(), paths)
+    linked = 0
+    if link_by_name:
+        codes = {entry['name'].lower(): code for code, entry in nav_store.schemes().items()}
+        for fund in FundMaster.query.filter(FundMaster.scheme_code.is_(None)):
+            code = codes.get(fund.fund_name.lower())
+            if code:
+                fund.scheme_code = code
+                linked += 1
+    # NAV-based returns are part of the reference data
+    bump_reference_data_version(db.session)
+    db.session.commit()
+    click.echo(f"Read {report['rows']} NAVs for {report['schemes']} schemes, appended {report['appended']} "
+               f"(store version {report['version']}), linked {linked} funds in {time.perf_counter() - start:.2f}s.")
+
+@app.cli.command('nav-link')
+@click.argument('fund_id', type=int)
+@click.argument('scheme_code', required=False)
+def nav_link_command(fund_id, scheme_code):
+    """Link FundMaster FUND_ID to an AMFI SCHEME_CODE (omit it to unlink)."""
+    fund = db.session.get(FundMaster, fund_id)
+    if fund is None:
+        raise click.BadParameter(f'No fund with id {fund_id}', param_hint='FUND_ID')
+    if scheme_code and scheme_code not in nav_store.reload():
+        click.echo(f'Warning: no NAV history for scheme {scheme_code} yet.', err=True)
+    fund.scheme_code = scheme_code
+    db.session.commit()
+    click.echo(f'Fund {fund_id} ({fund.fund_name}) linked to scheme {scheme_code or "none"}.')
+
+# Portfolio rebalancing
+def portfolio_holdings(rows):
+    """Holdings of latest_portfolio_query rows"""
+    return [Holding(row.fund_id, row.fund_name, row.asset_class, row.amount, row.expected_return)
+            for row in rows if row.fund_id is not None]
+
+@app.route('/api/portfolio/<int:investor_id>/rebalance', methods=['GET'])
+def get_portfolio_rebalance(investor_id):
+    investor = Investor.query.get_or_404(investor_id)
+    rows = load_latest_portfolio(investor_id)
+    if not rows:
+        return jsonify({'error': 'No portfolio found for this investor.'}), 404
+
+    snapshot = reference_data.snapshot()
+    result = rebalance(portfolio_holdings(rows), investor.get_asset_allocation(snapshot), snapshot,
+                       app.config['REBALANCE_DRIFT_THRESHOLD'], app.config['REBALANCE_MIN_TRADE'])
+    return jsonify(dict({'investor_id': investor.id, 'portfolio_id': rows[0].id}, **result))
+
+@app.route('/api/rebalancing', methods=['GET'])
+def get_rebalancing():
+    # Portfolios flagged by the last scan, a page at a time
+    after_id = int_arg(request.args, 'after_id', 0)
+    limit = min(int_arg(request.args, 'limit', app.config['INVESTOR_PAGE_SIZE']), app.config['INVESTOR_PAGE_SIZE_MAX'])
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    rows = db.session.scalars(
+        db.select(PortfolioDrift)
+        .where(PortfolioDrift.needs_rebalance.is_(True), PortfolioDrift.investor_id > after_id)
+        .order_by(PortfolioDrift.investor_id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        'portfolios': [
+            dict({
+                'investor_id': row.investor_id,
+                'portfolio_id': row.portfolio_id,
+                'total_value': row.total_value,
+                'max_drift': row.max_drift,
+                'scanned_at': row.scanned_at.strftime('%Y-%m-%d %H:%M:%S')
+            }, **json.loads(row.result)) for row in rows
+        ],
+        'next_after_id': rows[-1].investor_id if has_more else None,
+        'has_more': has_more
+    })
+
+def rebalance_scan_query(snapshot, full=False, until_id=None):
+    """Investors with a portfolio to scan, with their latest portfolio id.
+
+    Unless ``full``, only investors whose latest portfolio, investor row or
+    the reference data changed since their last scan are included.
+    """
+    latest = db.aliased(Portfolio)
+    latest_portfolio_id = (
+        db.select(latest.id)
+        .where(latest.investor_id == Investor.id)
+        .order_by(latest.created_at.desc())
+        .limit(1)
+        .correlate(Investor)
+        .scalar_subquery()
+    )
+    query = (
+        db.select(Investor.id, Investor.row_version, Investor.risk_category, Portfolio.id.label('portfolio_id'))
+        .join(Portfolio, Portfolio.id == latest_portfolio_id)
+        .outerjoin(PortfolioDrift, PortfolioDrift.investor_id == Investor.id)
+    )
+    if not full:
+        query = query.where(db.or_(
+            PortfolioDrift.investor_id.is_(None),
+            PortfolioDrift.portfolio_id != Portfolio.id,
+            PortfolioDrift.investor_row_version != Investor.row_version,
+            PortfolioDrift.reference_data_version != snapshot.version
+        ))
+    if until_id is not None:
+        query = query.where(Investor.id <= until_id)
+    return query
+
+def rebalance_items_chunk(query, after_id, chunk_size):
+    """ScanItems for the next ``chunk_size`` investors of ``query`` after ``after_id``"""
+    rows = db.session.execute(query.where(Investor.id > after_id).order_by(Investor.id).limit(chunk_size)).all()
+    if not rows:
+        return []
+
+    holdings = {}
+    for row in db.session.execute(
+        db.select(Fund.portfolio_id, Fund.id, Fund.fund_name, FundMaster.asset_class, Fund.amount,
+                  Fund.expected_return)
+        .outerjoin(FundMaster, FundMaster.id == Fund.fund_master_id)
+        .where(Fund.portfolio_id.in_([row.portfolio_id for row in rows]))
+        .order_by(Fund.id)
+    ):
+        holdings.setdefault(row.portfolio_id, []).append(Holding(*row[1:]))
+
+    items = []
+    for row in rows:
+        risk_category = row.risk_category
+        if risk_category is None:
+            risk_category = db.session.get(Investor, row.id).risk_classification()[1]
+        items.append(ScanItem(row.id, row.row_version, row.portfolio_id,
+                              risk_scoring.risk_tolerance(risk_category), holdings.get(row.portfolio_id, [])))
+    return items
+
+def iter_rebalance_chunks(snapshot, chunk_size, full=False):
+    """Yield lists of ScanItems for investors with a portfolio, by investor id"""
+    query = rebalance_scan_query(snapshot, full)
+    last_id = 0
+    while True:
+        items = rebalance_items_chunk(query, last_id, chunk_size)
+        if not items:
+            return
+        last_id = items[-1].investor_id
+        yield items
+
+def store_rebalance_results(results, snapshot):
+    """Replace the PortfolioDrift rows of scanned investors, without committing"""
+    now = datetime.utcnow()
+    db.session.execute(db.delete(PortfolioDrift).where(
+        PortfolioDrift.investor_id.in_([item.investor_id for item, _ in results])))
+    db.session.execute(db.insert(PortfolioDrift), [{
+        'investor_id': item.investor_id,
+        'portfolio_id': item.portfolio_id,
+        'investor_row_version': item.investor_row_version,
+        'reference_data_version': snapshot.version,
+        'total_value': result['total_value'],
+        'max_drift': result['max_drift'],
+        'needs_rebalance': result['needs_rebalance'],
+        'result': json.dumps({'drift': result['drift'], 'trades': result['trades']}),
+        'scanned_at': now
+    } for item, result in results])
+
+def scan_rebalancing(full=False, workers=None, chunk_size=None):
+    """Store drift and trades for changed portfolios; returns (scanned, needing rebalance) counts.
+
+    Results are committed chunk by chunk, so an interrupted scan resumes
+    where it stopped on the next run.
+    """
+    snapshot = reference_data.snapshot()
+    workers = workers or app.config['REBALANCE_WORKERS']
+    chunk_size = chunk_size or app.config['BATCH_CHUNK_SIZE']
+    scanned = flagged = 0
+    chunks = iter_rebalance_chunks(snapshot, chunk_size, full)
+    for results in scan(chunks, snapshot, app.config['REBALANCE_DRIFT_THRESHOLD'],
+                        app.config['REBALANCE_MIN_TRADE'], workers):
+        store_rebalance_results(results, snapshot)
+        db.session.commit()
+        scanned += len(results)
+        flagged += sum(1 for _, result in results if result['needs_rebalance'])
+    return scanned, flagged
+
+@app.cli.command('rebalance-scan')
+@click.option('--full', is_flag=True, help='Rescan every portfolio, not only those changed since the last scan')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: REBALANCE_WORKERS)')
+@click.option('--chunk-size', type=int, default=None, help='Portfolios read and stored per chunk')
+def rebalance_scan_command(full, workers, chunk_size):
+    """Detect allocation drift in saved portfolios and store rebalancing trades."""
+    start = time.perf_counter()
+    scanned, flagged = scan_rebalancing(full, workers, chunk_size)
+    click.echo(f'Scanned {scanned} portfolios in {time.perf_counter() - start:.2f}s, '
+               f'{flagged} need rebalancing.')
+
+# Calculated risk profile backfill
+def backfill_risk_profiles(recompute_all=False, chunk_size=None):
+    """Store the calculated risk profile columns for existing investors.
+
+    By default only rows missing the demographic score or category are
+    filled; ``recompute_all`` rescores every investor, e.g. after a rule
+    change. Works in primary-key chunks with one bulk UPDATE per chunk.
+    Returns ``(updated, skipped)`` counts.
+    """
+    chunk_size = chunk_size or app.config['BATCH_CHUNK_SIZE']
+    query = risk_profile_backfill_query(recompute_all)
+    updated = skipped = 0
+    last_id = 0
+    while True:
+        rows, scored, last_id = backfill_risk_profile_chunk(query, last_id, chunk_size)
+        if last_id is None:
+            break
+        db.session.commit()
+        updated += scored
+        skipped += rows - scored
+    return updated, skipped
+
+def risk_profile_backfill_query(recompute_all=False, until_id=None):
+    """Investors whose risk profile columns a backfill rescores"""
+    columns = [Investor.id, Investor.row_version] + [getattr(Investor, c) for c in RISK_PROFILE_INPUTS]
+    query = db.select(*columns)
+    if not recompute_all:
+        query = query.where(db.or_(Investor.demographic_score.is_(None), Investor.risk_category.is_(None)))
+    if until_id is not None:
+        query = query.where(Investor.id <= until_id)
+    return query
+
+def backfill_risk_profile_chunk(query, after_id, chunk_size):
+    """Rescore the next chunk of ``query`` after ``after_id``, without committing.
+
+    Returns ``(rows read, rows updated, last id)``; the last id is None when
+    no rows are left.
+    """
+    rows = [row._asdict() for row in db.session.execute(
+        query.where(Investor.id > after_id).order_by(Investor.id).limit(chunk_size))]
+    if not rows:
+        return 0, 0, None
+    scored = score_investor_rows(rows)
+    if scored:
+        db.session.execute(db.update(Investor), [
+            dict({c: row[c] for c in ('id', 'risk_score', 'profile_score', 'combined_score', 'demographic_score',
+                                      'risk_category', 'risk_category_code', 'risk_tolerance')},
+                 row_version=(row['row_version'] or 0) + 1)
+            for row in scored
+        ])
+    return len(rows), len(scored), rows[-1]['id']
+
+@app.cli.command('backfill-risk-profiles')
+@click.option('--all', 'recompute_all', is_flag=True, help='Rescore every investor, not only rows missing values')
+@click.option('--chunk-size', type=int, default=None, help='Investors updated per transaction')
+def backfill_risk_profiles_command(recompute_all, chunk_size):
+    """Store risk category, code and demographic score for existing investors."""
+    updated, skipped = backfill_risk_profiles(recompute_all, chunk_size)
+    click.echo(f'Updated {updated} investors, skipped {skipped} with invalid answers.')
+
+# Background jobs
+def count_rows(query):
+    return db.session.scalar(db.select(db.func.count()).select_from(query.subquery()))
+
+def _risk_profile_job_count(job, params):
+    return count_rows(risk_profile_backfill_query(params.get('all', False), job.until_id))
+
+def _risk_profile_job_step(job, params, result):
+    query = risk_profile_backfill_query(params.get('all', False), job.until_id)
+    rows, scored, last_id = backfill_risk_profile_chunk(query, job.last_id, job.chunk_size)
+    result['updated'] = result.get('updated', 0) + scored
+    result['skipped'] = result.get('skipped', 0) + rows - scored
+    return rows, last_id
+
+def _recommendation_job_count(job, params):
+    query = db.select(Investor.id).where(Investor.id <= job.until_id)
+    if params.get('risk_category'):
+        query = query.where(Investor.risk_category == params['risk_category'])
+    return count_rows(query)
+
+def _recommendation_job_step(job, params, result):
+    frame = investor_frame_chunk(job.last_id, job.chunk_size, params.get('risk_category'), job.until_id)
+    if frame.empty:
+        return 0, None
+    path = result.setdefault('output', os.path.join(app.config['JOB_OUTPUT_PATH'], f'job-{job.id}-recommendations.ndjson'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    errors = 0
+    with open(path, 'ab') as stream:
+        # Drop lines written after the last checkpoint by an interrupted run
+        stream.truncate(result.get('output_bytes', 0))
+        for investor_id, payload, error in recommend_frame(frame, reference_data.snapshot(), fund_split_policy()):
+            stream.write((json.dumps(batch_result(investor_id, payload, error)) + '\n').encode('utf-8'))
+            errors += error is not None
+        result['output_bytes'] = stream.tell()
+    result['written'] = result.get('written', 0) + len(frame)
+    result['errors'] = result.get('errors', 0) + errors
+    return len(frame), int(frame['id'].iloc[-1])
+
+def _rebalance_job_count(job, params):
+    return count_rows(rebalance_scan_query(reference_data.snapshot(), params.get('full', False), job.until_id))
+
+def _rebalance_job_step(job, params, result):
+    snapshot = reference_data.snapshot()
+    query = rebalance_scan_query(snapshot, params.get('full', False), job.until_id)
+    items = rebalance_items_chunk(query, job.last_id, job.chunk_size)
+    if not items:
+        return 0, None
+    results = rebalance_items(items, snapshot, app.config['REBALANCE_DRIFT_THRESHOLD'], app.config['REBALANCE_MIN_TRADE'])
+    store_rebalance_results(results, snapshot)
+    result['scanned'] = result.get('scanned', 0) + len(results)
+    result['needs_rebalance'] = result.get('needs_rebalance', 0) + sum(1 for _, r in results if r['needs_rebalance'])
+    return len(items), items[-1].investor_id
+
+JOB_KINDS = {
+    # Rescore stored risk profiles, e.g. after a scoring rule change ("all": true rescores every investor)
+    'risk-profiles': JobKind(_risk_profile_job_count, _risk_profile_job_step, {'all': bool}),
+    # Write every investor's recommendation to an NDJSON file under JOB_OUTPUT_PATH
+    'recommendations': JobKind(_recommendation_job_count, _recommendation_job_step, {'risk_category': str}),
+    # Rebalancing scan of changed portfolios ("full": true rescans all of them)
+    'rebalance-scan': JobKind(_rebalance_job_count, _rebalance_job_step, {'full': bool}),
+}
+FINISHED_JOB_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+def validate_job_params(kind, params):
+    """Job parameters checked against the kind's; ValueError for anything else"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"kind must be one of {', '.join(sorted(JOB_KINDS))}")
+    if not isinstance(params, dict):
+        raise ValueError('params must be an object')
+    accepted = JOB_KINDS[kind].params
+    for name, value in params.items():
+        if name not in accepted:
+            raise ValueError(f"unknown parameter '{name}' for {kind} jobs")
+        if not isinstance(value, accepted[name]):
+            raise ValueError(f'{name} must be a {accepted[name].__name__}')
+    return params
+
+def submit_job(kind, params=None, chunk_size=None):
+    """Queue a job over the investors that exist now and wake the workers; returns the Job"""
+    params = validate_job_params(kind, params or {})
+    job = Job(kind=kind, params=json.dumps(params), chunk_size=chunk_size or app.config['BATCH_CHUNK_SIZE'],
+              until_id=db.session.scalar(db.select(db.func.max(Investor.id))) or 0, last_id=0)
+    job.total = JOB_KINDS[kind].count(job, params)
+    db.session.add(job)
+    db.session.commit()
+    job_pool.wake()
+    return job
+
+def claimable_jobs():
+    """Queued jobs not waiting to retry, and running jobs whose worker stopped checkpointing"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=app.config['JOB_STALE_SECONDS'])
+    return db.or_(
+        db.and_(Job.status == 'queued', db.or_(Job.retry_at.is_(None), Job.retry_at <= now)),
+        db.and_(Job.status == 'running', Job.heartbeat_at < stale)
+    )
+
+def claim_job(worker):
+    """Id of the oldest claimable job, now running on ``worker``, or None"""
+    while True:
+        job_id = db.session.scalar(db.select(Job.id).where(claimable_jobs()).order_by(Job.id).limit(1))
+        if job_id is None:
+            db.session.rollback()
+            return None
+        now = datetime.utcnow()
+        # Conditional on the job still being claimable, so only one worker wins it
+        claimed = db.session.execute(
+            db.update(Job).where(Job.id == job_id, claimable_jobs()).values(
+                status='running', worker=worker, attempts=Job.attempts + 1, heartbeat_at=now,
+                started_at=db.func.coalesce(Job.started_at, now))
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+
+def run_job(job_id, worker, stopping):
+    """Run a claimed job chunk by chunk until it finishes, fails, is cancelled or ``stopping`` is set.
+
+    Each chunk's writes commit in one transaction with the job's checkpoint
+    (last id, counters and result), and only while ``worker`` still owns the
+    job, so a job resumed after a crash restarts at its first uncommitted
+    chunk. Stopping hands the job back to the queue, and so does a database
+    OperationalError (see retry_job); any other error fails the job.
+    """
+    owned = db.and_(Job.id == job_id, Job.status == 'running', Job.worker == worker)
+    while True:
+        job = db.session.scalar(db.select(Job).where(owned))
+        if job is None:
+            # Cancelled, or taken over by another worker after a stall
+            db.session.rollback()
+            return
+        if stopping.is_set():
+            release_jobs(worker)
+            return
+        kind = job.kind
+        retries = job.retries
+        params = json.loads(job.params)
+        result = json.loads(job.result)
+        started = time.perf_counter()
+        try:
+            if kind not in JOB_KINDS:
+                raise ValueError(f'Unknown job kind: {kind}')
+            processed, last_id = JOB_KINDS[kind].step(job, params, result)
+
+            now = datetime.utcnow()
+            values = {
+                'result': json.dumps(result),
+                'elapsed_seconds': Job.elapsed_seconds + (time.perf_counter() - started),
+                'heartbeat_at': now,
+                'retries': 0
+            }
+            if last_id is None:
+                values.update(status='succeeded', finished_at=now)
+            else:
+                values.update(last_id=last_id, processed=Job.processed + processed)
+            if not db.session.execute(db.update(Job).where(owned).values(**values)).rowcount:
+                db.session.rollback()
+                return
+            db.session.commit()
+        except OperationalError as e:
+            db.session.rollback()
+            retry_job(owned, job_id, kind, retries, e)
+            return
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('Job %s (%s) failed', job_id, kind)
+            now = datetime.utcnow()
+            db.session.execute(db.update(Job).where(owned).values(
+                status='failed', error=str(e), heartbeat_at=now, finished_at=now))
+            db.session.commit()
+            return
+        if last_id is None:
+            return
+
+def retry_job(owned, job_id, kind, retries, error):
+    """Requeue a job at its last checkpoint after a retryable error, or fail it after JOB_MAX_RETRIES"""
+    now = datetime.utcnow()
+    if retries < app.config['JOB_MAX_RETRIES']:
+        delay = app.config['JOB_RETRY_DELAY'] * 2 ** retries
+        app.logger.warning('Job %s (%s) retries from its checkpoint in %.0fs: %s', job_id, kind, delay, error)
+        values = {'status': 'queued', 'worker': None, 'retry_at': now + timedelta(seconds=delay)}
+    else:
+        app.logger.error('Job %s (%s) failed after %d retries: %s', job_id, kind, retries, error)
+        values = {'status': 'failed', 'finished_at': now}
+    try:
+        db.session.execute(db.update(Job).where(owned).values(
+            retries=retries + 1, error=str(error), heartbeat_at=now, **values))
+        db.session.commit()
+    except OperationalError as e:
+        # Still locked: the job stays running and is taken over once its heartbeat is stale
+        db.session.rollback()
+        app.logger.warning('Could not requeue job %s: %s', job_id, e)
+
+def release_jobs(worker):
+    """Put the jobs running on ``worker`` back in the queue at their last checkpoint"""
+    db.session.rollback()
+    db.session.execute(db.update(Job).where(Job.status == 'running', Job.worker == worker).values(
+        status='queued', worker=None))
+    db.session.commit()
+
+def _claim_job_in_context(worker):
+    with app.app_context():
+        return claim_job(worker)
+
+def _run_job_in_context(job_id, worker, stopping):
+    with app.app_context():
+        run_job(job_id, worker, stopping)
+
+def _log_job_worker_error(worker, error):
+    app.logger.warning('Job worker %s: %s', worker, error)
+
+job_pool = WorkerPool(_claim_job_in_context, _run_job_in_context, app.config['JOB_WORKERS'],
+                      app.config['JOB_POLL_INTERVAL'], _log_job_worker_error)
+
+def start_job_workers():
+    """Start JOB_WORKERS job threads in this process (none by default); call after forking"""
+    return job_pool.start()
+
+def _timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+def job_payload(job):
+    done = job.status == 'succeeded'
+    rates = progress(job.processed, job.total, job.elapsed_seconds)
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'params': json.loads(job.params),
+        'status': job.status,
+        'progress': {
+            'processed': job.processed,
+            'total': job.total,
+            'percent': 100.0 if done else rates['percent'],
+            'last_investor_id': job.last_id,
+            'until_investor_id': job.until_id
+        },
+        'throughput': {
+            'elapsed_seconds': round(job.elapsed_seconds, 3),
+            'items_per_second': rates['items_per_second'],
+            'eta_seconds': 0 if done else rates['eta_seconds']
+        },
+        'result': json.loads(job.result),
+        'error': job.error,
+        'attempts': job.attempts,
+        'retries': job.retries,
+        'retry_at': _timestamp(job.retry_at),
+        'worker': job.worker,
+        'created_at': _timestamp(job.created_at),
+        'started_at': _timestamp(job.started_at),
+        'updated_at': _timestamp(job.heartbeat_at),
+        'finished_at': _timestamp(job.finished_at)
+    }
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    data = request.get_json(silent=True) or {}
+    try:
+        kind = data.get('kind')
+        params = validate_job_params(kind, data.get('params') or {})
+        chunk_size = int(data.get('chunk_size') or app.config['BATCH_CHUNK_SIZE'])
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid job request: {str(e)}'}), 400
+    job = submit_job(kind, params, chunk_size)
+    return jsonify(job_payload(job)), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    # Most recent jobs first, optionally of one status
+    limit = min(int_arg(request.args, 'limit', app.config['INVESTOR_PAGE_SIZE']), app.config['INVESTOR_PAGE_SIZE_MAX'])
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    query = db.select(Job).order_by(Job.id.desc()).limit(limit)
+    if request.args.get('status'):
+        query = query.where(Job.status == request.args['status'])
+    return jsonify({'jobs': [job_payload(job) for job in db.session.scalars(query)]})
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_payload(job))
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    # A running job stops before its next chunk; committed chunks stay
+    cancelled = db.session.execute(
+        db.update(Job).where(Job.id == job_id, Job.status.not_in(FINISHED_JOB_STATUSES)).values(
+            status='cancelled', finished_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not cancelled:
+        return jsonify({'error': f'Job already {job.status}'}), 409
+    return jsonify(job_payload(job))
+
+@app.cli.command('submit-job')
+@click.argument('kind', type=click.Choice(sorted(JOB_KINDS)))
+@click.option('--params', default='{}', help='Job parameters as a JSON object, e.g. \'{"all": true}\'')
+@click.option('--chunk-size', type=int, default=None, help='Investors per checkpointed chunk')
+def submit_job_command(kind, params, chunk_size):
+    """Queue a background job; workers of a running server or `flask run-jobs` pick it up."""
+    try:
+        job = submit_job(kind, json.loads(params), chunk_size)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--params')
+    click.echo(f'Queued job {job.id} ({kind}, {job.total} investors).')
+
+@app.cli.command('run-jobs')
+@click.option('--workers', type=int, default=1, help='Worker threads with --wait')
+@click.option('--wait', is_flag=True, help='Keep polling for new jobs instead of exiting once the queue is empty')
+def run_jobs_command(workers, wait):
+    """Run queued and interrupted background jobs in this process."""
+    pool = WorkerPool(_claim_job_in_context, _run_job_in_context, workers,
+                      app.config['JOB_POLL_INTERVAL'], _log_job_worker_error)
+    start = time.perf_counter()
+    if not wait:
+        worker = pool.worker_name('main')
+        try:
+            ran = pool.drain(worker)
+        except KeyboardInterrupt:
+            release_jobs(worker)
+            raise
+        click.echo(f'Ran {ran} jobs in {time.perf_counter() - start:.2f}s.')
+        return
+    pool.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        click.echo('Stopping after the current chunks...')
+        pool.stop()
+
+# Schema upgrades
+def upgrade_database():
+    """Apply pending schema migrations and backfill calculated columns"""
+    applied = migrations.migrate(db.engine)
+    backfill_risk_profiles()
+    return applied
+
+schema_lock = threading.Lock()
+schema_ready = threading.Event()
+
+@app.before_request
+def ensure_database():
+    """Bring an out of date database up to the current schema, once per process.
+
+    Every way of serving the app goes through this, so ``flask run`` or a bare
+    ``gunicorn app:app`` never serve requests against an un-migrated schema.
+    Once the schema is current it costs one read of ``schema_migrations``.
+    """
+    if schema_ready.is_set():
+        return
+    with schema_lock:
+        if schema_ready.is_set():
+            return
+        if migrations.pending_migrations(db.engine):
+            db.create_all()
+            for version, name in upgrade_database():
+                app.logger.info('Applied migration %s: %s', version, name)
+        schema_ready.set()
+
+@app.cli.command('migrate')
+@click.option('--status', is_flag=True, help='Only list applied and pending migrations')
+def migrate_command(status):
+    """Upgrade the database schema in place"""
+    if status:
+        # Read only: nothing is created or recorded
+        click.echo(f'Schema version {migrations.current_version(db.engine)}')
+        for version, name in migrations.pending_migrations(db.engine):
+            click.echo(f'Pending {version}: {name}')
+        return
+    db.create_all()
+    applied = upgrade_database()
+    for version, name in applied:
+        click.echo(f'Applied {version}: {name}')
+    click.echo(f'Schema version {migrations.current_version(db.engine)}')
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        upgrade_database()
     app.run(debug=True)
@@ -0,0 +1,270 @@
+"""ASGI flavour of the investor, recommendation and portfolio API.
+
+Serves the same JSON as the Flask routes in ``app.py`` and shares its models,
+statements and payload functions, but runs on an asyncio event loop with
+SQLAlchemy's asyncio extension and aiosqlite, so a request waiting on SQLite
+does not hold a thread. Independent queries of a request are issued
+concurrently, each on its own pooled connection.
+
+    python asgi_app.py --bind 127.0.0.1:8001 --workers 4
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, Response
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from werkzeug.http import parse_etags
+
+from app import (
+    ALLOCATION_ROWS_QUERY, FUND_RECORDS_QUERY, REFERENCE_DATA_VERSION_QUERY, Investor, app,
+    apply_sqlite_pragmas, db, ensure_database, insert_portfolios, int_arg, investor_page, investor_page_query,
+    latest_portfolio_query, new_portfolio_rows, portfolio_payload, project_investor, recommendation_cache,
+    reference_data, render_recommendation, with_nav_returns
+)
+from projection import horizon_years
+from reference_data import FundRecord
+
+
+def async_database_url():
+    """ASYNC_DATABASE_URL, or the Flask app's SQLite database through aiosqlite"""
+    if os.environ.get('ASYNC_DATABASE_URL'):
+        return os.environ['ASYNC_DATABASE_URL']
+    with app.app_context():
+        url = db.engine.url
+    if url.get_backend_name() != 'sqlite':
+        raise RuntimeError('Set ASYNC_DATABASE_URL to an async driver URL for non-SQLite databases')
+    return url.set(drivername='sqlite+aiosqlite')
+
+
+def create_engine():
+    url = async_database_url()
+    options = {k: v for k, v in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items() if k != 'connect_args'}
+    if str(url).startswith('sqlite'):
+        options['connect_args'] = {'timeout': app.config['SQLITE_BUSY_TIMEOUT'] / 1000}
+    engine = create_async_engine(url, **options)
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', lambda connection, record: apply_sqlite_pragmas(connection))
+    return engine
+
+
+engine = create_engine()
+Session = async_sessionmaker(engine, expire_on_commit=False)
+_reference_data_lock = asyncio.Lock()
+
+
+# Queries, each on its own session so they can run concurrently
+async def fetch_all(statement):
+    async with Session() as session:
+        return (await session.execute(statement)).all()
+
+
+async def fetch_scalar(statement):
+    async with Session() as session:
+        return await session.scalar(statement)
+
+
+async def get_investor(investor_id):
+    async with Session() as session:
+        return await session.get(Investor, investor_id)
+
+
+async def reference_snapshot():
+    """The shared reference data snapshot, reloaded without blocking the event loop"""
+    snapshot = reference_data.fresh()
+    if snapshot is not None:
+        return snapshot
+    async with _reference_data_lock:
+        snapshot = reference_data.fresh()
+        if snapshot is not None:
+            return snapshot
+        async with Session() as session:
+            try:
+                version = await session.scalar(REFERENCE_DATA_VERSION_QUERY) or 0
+            except OperationalError:
+                # Databases created before the version table existed
+                await session.rollback()
+                version = 0
+            snapshot = reference_data.confirm(version)
+            if snapshot is None:
+                funds = with_nav_returns([FundRecord(*row) for row in await session.execute(FUND_RECORDS_QUERY)])
+                allocation_rows = (await session.execute(ALLOCATION_ROWS_QUERY)).all()
+                snapshot = reference_data.store(version, funds, allocation_rows)
+        return snapshot
+
+
+def json_response(payload, status_code=200):
+    # Same body as Flask's jsonify
+    return Response(app.json.response(payload).get_data(), status_code=status_code, media_type='application/json')
+
+
+# Routes
+async def index(request):
+    return FileResponse(os.path.join(app.root_path, 'templates', 'index.html'))
+
+
+async def get_investors(request):
+    try:
+        try:
+            query, limit, sort = investor_page_query(request.query_params)
+        except ValueError as e:
+            return json_response({'error': str(e)}, 400)
+        async with Session() as session:
+            rows = (await session.execute(query)).all()
+
+            # Rows saved before the category was stored are categorised on the fly
+            missing_ids = [row.id for row in rows[:limit] if row.risk_category is None]
+            computed = {}
+            if missing_ids:
+                for investor in await session.scalars(db.select(Investor).where(Investor.id.in_(missing_ids))):
+                    computed[investor.id] = investor.determine_risk_category()
+
+        return json_response(investor_page(rows, limit, sort, computed))
+    except Exception as e:
+        return json_response({'error': f'Failed to retrieve investors: {str(e)}'}, 500)
+
+
+async def get_recommendations(request):
+    investor_id = request.path_params['investor_id']
+    row_version, snapshot = await asyncio.gather(
+        fetch_scalar(db.select(Investor.row_version).where(Investor.id == investor_id)),
+        reference_snapshot()
+    )
+    if row_version is None:
+        raise HTTPException(status_code=404)
+    version = (row_version, snapshot.version)
+    etag = f'{investor_id}-{row_version}-{snapshot.version}'
+
+    if parse_etags(request.headers.get('if-none-match')).contains(etag):
+        response = Response(status_code=304)
+    else:
+        cached = recommendation_cache.get(investor_id, version)
+        if cached is not None:
+            body = cached.body
+        else:
+            investor = await get_investor(investor_id)
+            if investor is None:
+                raise HTTPException(status_code=404)
+            body = render_recommendation(investor, snapshot)
+            recommendation_cache.put(investor_id, version, etag, body)
+        response = Response(body, media_type='application/json')
+    response.headers['ETag'] = f'"{etag}"'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+async def get_recommendation_cache_stats(request):
+    return json_response(recommendation_cache.stats())
+
+
+async def get_reference_data_stats(request):
+    return json_response(reference_data.stats())
+
+
+async def get_portfolio(request):
+    rows = await fetch_all(latest_portfolio_query(request.path_params['investor_id']))
+    if not rows:
+        return json_response({'error': 'No portfolio found for this investor.'}, 404)
+    return json_response(portfolio_payload(rows), 201)
+
+
+async def create_portfolio(request):
+    investor_id = request.path_params['investor_id']
+    try:
+        data = await request.json()
+    except ValueError:
+        return json_response({'error': 'Request body must be JSON'}, 400)
+
+    snapshot = await reference_snapshot()
+    async with Session() as session:
+        investor = await session.get(Investor, investor_id)
+        if investor is None:
+            raise HTTPException(status_code=404)
+        try:
+            rows = new_portfolio_rows(investor, data, snapshot)
+        except ValueError as e:
+            return json_response({'error': str(e)}, 400)
+        # Same statements as the Flask app, on this request's session
+        portfolio_id, = await session.run_sync(lambda sync_session: insert_portfolios([rows], sync_session))
+        await session.commit()
+
+    return json_response({'message': 'Portfolio created successfully', 'portfolio_id': portfolio_id}, 201)
+
+
+async def get_portfolio_projection(request):
+    investor_id = request.path_params['investor_id']
+    investor, rows, snapshot = await asyncio.gather(
+        get_investor(investor_id),
+        fetch_all(latest_portfolio_query(investor_id)),
+        reference_snapshot()
+    )
+    if investor is None:
+        raise HTTPException(status_code=404)
+    years = int_arg(request.query_params, 'years', horizon_years(investor.investment_horizon))
+    paths = int_arg(request.query_params, 'paths', app.config['PROJECTION_PATHS'])
+    seed = int_arg(request.query_params, 'seed', None)
+    if not 1 <= years <= 50:
+        return json_response({'error': 'years must be between 1 and 50'}, 400)
+    if not 100 <= paths <= app.config['PROJECTION_PATHS_MAX']:
+        return json_response({'error': f"paths must be between 100 and {app.config['PROJECTION_PATHS_MAX']}"}, 400)
+
+    # The simulation is CPU bound; keep it off the event loop
+    result = await run_in_threadpool(project_investor, investor, rows, snapshot, years, paths, seed)
+    if result is None:
+        return json_response({'error': 'Nothing to project for this investor.'}, 404)
+    return json_response(result)
+
+
+def prepare_schema():
+    with app.app_context():
+        ensure_database()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(application):
+    # The same once-per-process schema upgrade the Flask app runs before its first request
+    await run_in_threadpool(prepare_schema)
+    yield
+
+
+application = Starlette(routes=[
+    Route('/', index),
+    Route('/api/investors', get_investors, methods=['GET']),
+    Route('/api/portfolio/{investor_id:int}', get_portfolio, methods=['GET']),
+    Route('/api/portfolio/{investor_id:int}', create_portfolio, methods=['POST']),
+    Route('/api/portfolio/{investor_id:int}/projection', get_portfolio_projection, methods=['GET']),
+    Route('/api/recommendations/cache/stats', get_recommendation_cache_stats, methods=['GET']),
+    Route('/api/recommendations/{investor_id:int}', get_recommendations, methods=['GET']),
+    Route('/api/reference-data/stats', get_reference_data_stats, methods=['GET']),
+    Mount('/static', StaticFiles(directory=os.path.join(app.root_path, 'static')), name='static')
+], middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan)
+
+
+def main():
+    import uvicorn
+
+    from serve import prepare_database
+
+    parser = argparse.ArgumentParser(description='Serve the async API with uvicorn')
+    parser.add_argument('--bind', default=os.environ.get('BIND', '127.0.0.1:8001'), help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', 1)))
+    args = parser.parse_args()
+
+    prepare_database()
+    host, port = args.bind.rsplit(':', 1)
+    uvicorn.run('asgi_app:application', host=host, port=int(port), workers=args.workers, access_log=False)
+
+
+if __name__ == '__main__':
+    main()
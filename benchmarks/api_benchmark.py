@@ -0,0 +1,378 @@
+"""Benchmark every API endpoint against a synthetic database.
+
+Generates investors (valid questionnaire answers and demographic strings),
+a fund universe and saved portfolios into a scratch SQLite database, then
+drives each endpoint through the Flask test client and records throughput,
+p50/p95/p99 latency and peak Python memory per endpoint. Results are written
+to JSON; pass a previous results file with --compare to flag regressions.
+
+    python benchmarks/api_benchmark.py --investors 10000 --output bench.json
+    python benchmarks/api_benchmark.py --investors 100000 --compare bench.json
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ASSET_CLASSES = {
+    # asset class: (categories, mean expected return, risk levels)
+    'equity': (['Large Cap', 'Mid Cap', 'Small Cap', 'Multi Cap', 'Flexi Cap'], 13.0, ['Medium', 'High']),
+    'hybrid_baf': (['Balanced Advantage', 'Aggressive Hybrid', 'Multi Asset'], 10.5, ['Medium']),
+    'debt_arbitrage': (['Liquid', 'Ultra Short', 'Corporate Bond', 'Arbitrage'], 6.5, ['Low']),
+    'international_equity': (['US Equity', 'Global Equity'], 10.5, ['Medium']),
+    'gold': (['ETF', 'FoF'], 6.8, ['Low'])
+}
+MIN_INVESTMENTS = [500, 1000, 1000, 5000, 5000, 10000, 25000]
+INVESTMENT_HORIZONS = ['Upto 3 years', '3-5 years', '5+ years', '7+ years']
+FINANCIAL_GOALS = ['Retirement', 'Child education', 'House purchase', 'Wealth creation']
+POPULATE_CHUNK = 10000
+
+
+# Synthetic data
+def fund_rows(count, rng):
+    rows = []
+    classes = list(ASSET_CLASSES)
+    for i in range(count):
+        asset_class = classes[i % len(classes)]
+        categories, mean_return, risk_levels = ASSET_CLASSES[asset_class]
+        category = categories[(i // len(classes)) % len(categories)]
+        rows.append({
+            'fund_name': f'{category} Fund {i + 1}',
+            'asset_class': asset_class,
+            'category': category,
+            'expected_return': round(float(mean_return + rng.normal(0, 1.5)), 2),
+            'risk_level': risk_levels[i % len(risk_levels)],
+            'min_investment': float(rng.choice(MIN_INVESTMENTS))
+        })
+    return rows
+
+
+def investor_rows(start, count, rng):
+    """``count`` investor dicts with IDs from ``start``, as accepted by the Investor model"""
+    from risk_scoring import (EDUCATION_SCORES, EXPERIENCE_SCORES, INCOME_SCORES, OCCUPATION_SCORES,
+                              PROFILE_QUESTIONS, RISK_QUESTIONS)
+
+    def pick(options):
+        options = list(options)
+        return [options[i] for i in rng.integers(0, len(options), count)]
+
+    income = rng.integers(20000, 500000, count).astype(float)
+    columns = {
+        'education_level': pick(EDUCATION_SCORES),
+        'occupation_type': pick(OCCUPATION_SCORES),
+        'annual_income_range': pick(INCOME_SCORES),
+        'equity_experience': pick(EXPERIENCE_SCORES),
+        'investment_horizon': pick(INVESTMENT_HORIZONS),
+        'financial_goals': pick(FINANCIAL_GOALS),
+        'age': rng.integers(21, 70, count).tolist(),
+        'monthly_income': income.tolist(),
+        'monthly_expenses': (income * rng.uniform(0.3, 1.1, count)).round(0).tolist(),
+        'existing_assets': rng.integers(0, 5000000, count).astype(float).tolist(),
+        'existing_liabilities': rng.integers(0, 2000000, count).astype(float).tolist(),
+        'emergency_fund': rng.integers(0, 1000000, count).astype(float).tolist(),
+        'investment_amount': (rng.integers(10, 1000, count) * 1000).astype(float).tolist(),
+        'required_return': rng.integers(6, 16, count).astype(float).tolist()
+    }
+    for question in RISK_QUESTIONS + PROFILE_QUESTIONS:
+        columns[question] = pick('ABCD')
+    rows = []
+    for i in range(count):
+        investor_id = start + i
+        row = {name: values[i] for name, values in columns.items()}
+        row.update(id=investor_id, name=f'Investor {investor_id}', email=f'investor{investor_id}@example.com',
+                   risk_q1_reason='', risk_q8_reason='')
+        rows.append(row)
+    return rows
+
+
+def populate(investors, funds, portfolios, seed):
+    """Fill the scratch database; returns seconds taken"""
+    from app import AssetAllocation, Fund, FundMaster, Investor, Portfolio, db, score_investor_rows
+    from populate_master_data import allocation_matrix
+
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    db.session.execute(db.insert(AssetAllocation), allocation_matrix)
+    master = fund_rows(funds, rng)
+    db.session.execute(db.insert(FundMaster), master)
+    db.session.commit()
+
+    for start in range(1, investors + 1, POPULATE_CHUNK):
+        count = min(POPULATE_CHUNK, investors + 1 - start)
+        db.session.execute(db.insert(Investor), score_investor_rows(investor_rows(start, count, rng)))
+        db.session.commit()
+
+    owners = rng.choice(np.arange(1, investors + 1), size=min(portfolios, investors), replace=False)
+    for start in range(0, len(owners), POPULATE_CHUNK):
+        chunk = owners[start:start + POPULATE_CHUNK]
+        db.session.execute(db.insert(Portfolio), [
+            {'id': start + i + 1, 'investor_id': int(owner), 'name': f'Portfolio of investor {owner}'}
+            for i, owner in enumerate(chunk)
+        ])
+        holdings = []
+        for i in range(len(chunk)):
+            for fund_index in rng.choice(len(master), size=4, replace=False):
+                fund = master[fund_index]
+                holdings.append({
+                    'portfolio_id': start + i + 1, 'fund_master_id': int(fund_index) + 1,
+                    'fund_name': fund['fund_name'], 'amount': float(rng.integers(5, 100) * 1000),
+                    'expected_return': fund['expected_return']
+                })
+        db.session.execute(db.insert(Fund), holdings)
+        db.session.commit()
+    return time.perf_counter() - started, sorted(int(o) for o in owners)
+
+
+# Measurement
+def measure(call, count, memory_samples):
+    """Time ``call(i)`` ``count`` times, then trace peak allocations over a few more calls"""
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(count):
+        t = time.perf_counter()
+        status = call(i)
+        latencies.append(time.perf_counter() - t)
+        errors += status >= 400
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for i in range(count, count + memory_samples):
+        call(i)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': count,
+        'errors': int(errors),
+        'throughput_rps': round(count / elapsed, 2),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+
+def scenarios(client, investors, owners, rng):
+    """name -> (call(i) -> status, request count divisor)"""
+    from app import recommendation_cache
+    from risk_scoring import CATEGORIES
+
+    ids = rng.permutation(np.arange(1, investors + 1)).tolist()
+    owners = rng.permutation(owners).tolist() or [1]
+    warm_ids = ids[:50]
+    etags = {}
+    new_investor = investor_rows(investors + 1, 1, rng)[0]
+    created = [0]
+
+    def get(url, **kwargs):
+        return client.get(url, **kwargs).status_code
+
+    def create_investor(i):
+        created[0] += 1
+        investor_id = investors + created[0]
+        body = dict(new_investor, name=f'New investor {investor_id}', email=f'new{investor_id}@example.com')
+        body.pop('id')
+        return client.post('/api/investors', json=body).status_code
+
+    def not_modified(i):
+        investor_id = warm_ids[i % len(warm_ids)]
+        if investor_id not in etags:
+            etags[investor_id] = client.get(f'/api/recommendations/{investor_id}').headers['ETag']
+        return client.get(f'/api/recommendations/{investor_id}', headers={'If-None-Match': etags[investor_id]}).status_code
+
+    bulk_rows = investor_rows(0, 500, rng)
+
+    def bulk(i):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=[k for k in bulk_rows[0] if k != 'id'], extrasaction='ignore')
+        writer.writeheader()
+        for row in bulk_rows:
+            writer.writerow(dict(row, email=row['email'].replace('@', f'+bulk{i}@')))
+        data = {'file': (io.BytesIO(buffer.getvalue().encode()), 'investors.csv')}
+        return client.post('/api/investors/bulk', data=data, content_type='multipart/form-data').status_code
+
+    def batch(i):
+        response = client.post('/api/recommendations/batch', json={'investor_ids': ids[:1000]})
+        response.get_data()
+        return response.status_code
+
+    def export(url):
+        def call(i):
+            response = client.get(url)
+            for _ in response.response:
+                pass
+            return response.status_code
+        return call
+
+    def cold_recommendation(i):
+        recommendation_cache.clear()
+        return get(f'/api/recommendations/{ids[i % len(ids)]}')
+
+    portfolio_body = {'recommendations': [
+        {'fund_name': 'Large Cap Fund 1', 'recommended_investment': 10000, 'expected_return': 12.0}
+    ]}
+
+    return {
+        'get_investors_first_page': (lambda i: get('/api/investors?limit=50'), 1),
+        'get_investors_deep_page': (lambda i: get(f'/api/investors?limit=50&after_id={ids[i % len(ids)]}'), 1),
+        'get_investors_by_category': (
+            lambda i: get(f'/api/investors?limit=50&risk_category={CATEGORIES[i % 4]}&after_id={ids[i % len(ids)]}'), 1),
+        'get_investors_sorted_by_category': (
+            lambda i: get(f'/api/investors?limit=50&sort=risk_category&after_category={CATEGORIES[i % 4]}'
+                          f'&after_id={ids[i % len(ids)]}'), 1),
+        'create_investor': (create_investor, 1),
+        'bulk_create_investors_500': (bulk, 20),
+        'get_recommendations_cold': (cold_recommendation, 1),
+        'get_recommendations_warm': (lambda i: get(f'/api/recommendations/{warm_ids[i % len(warm_ids)]}'), 1),
+        'get_recommendations_not_modified': (not_modified, 1),
+        'recommendations_batch_1000': (batch, 20),
+        'get_portfolio': (lambda i: get(f'/api/portfolio/{owners[i % len(owners)]}'), 1),
+        'create_portfolio': (lambda i: client.post(f'/api/portfolio/{owners[i % len(owners)]}',
+                                                   json=portfolio_body).status_code, 1),
+        'get_portfolio_projection_1000_paths': (
+            lambda i: get(f'/api/portfolio/{owners[i % len(owners)]}/projection?paths=1000&seed={i}'), 5),
+        'export_investors_csv': (export('/api/export/investors?format=csv'), 100),
+        'export_portfolios_parquet': (export('/api/export/portfolios?format=parquet'), 100),
+        'get_recommendation_cache_stats': (lambda i: get('/api/recommendations/cache/stats'), 1),
+        'get_reference_data_stats': (lambda i: get('/api/reference-data/stats'), 1),
+        'get_metrics': (lambda i: get('/metrics'), 1)
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """Print p95/throughput changes against a previous run; returns the regressed endpoints"""
+    with open(baseline_path) as f:
+        baseline_results = json.load(f)
+    baseline = baseline_results['endpoints']
+    for key in ('investors', 'funds', 'portfolios'):
+        if baseline_results['meta'].get(key) != results['meta'][key]:
+            print(f"\nWarning: baseline was run with {key}={baseline_results['meta'].get(key)}, "
+                  f"this run with {results['meta'][key]}")
+    regressions = []
+    print(f"\n{'endpoint':<38} {'p95 before':>10} {'p95 now':>9} {'change':>8} {'req/s before':>12} {'req/s now':>9}")
+    for name, now in results['endpoints'].items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = now['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0.0
+        slower_rps = before['throughput_rps'] and now['throughput_rps'] < before['throughput_rps'] / (1 + threshold)
+        flag = ''
+        if change > threshold or slower_rps:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<38} {before['p95_ms']:>10.2f} {now['p95_ms']:>9.2f} {change:>+8.1%} "
+              f"{before['throughput_rps']:>12.1f} {now['throughput_rps']:>9.1f}{flag}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the API endpoints on synthetic data')
+    parser.add_argument('--investors', type=int, default=10000)
+    parser.add_argument('--funds', type=int, default=1000)
+    parser.add_argument('--portfolios', type=int, help='investors with a saved portfolio (default: a tenth)')
+    parser.add_argument('--requests', type=int, default=300, help='requests per endpoint (heavy ones run fewer)')
+    parser.add_argument('--memory-samples', type=int, default=5, help='extra requests traced for peak memory')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', help='comma separated endpoint names to run')
+    parser.add_argument('--db', help='scratch database path (default: a temporary file)')
+    parser.add_argument('--output', '-o', help='write results JSON here')
+    parser.add_argument('--compare', help='previous results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown counted as a regression')
+    args = parser.parse_args()
+    portfolios = args.portfolios if args.portfolios is not None else max(args.investors // 10, 1)
+
+    workdir = tempfile.TemporaryDirectory()
+    db_path = os.path.abspath(args.db or os.path.join(workdir.name, 'benchmark.db'))
+    if os.path.exists(db_path):
+        parser.error(f'{db_path} already exists; the benchmark needs an empty scratch database')
+    # Configure the app for the scratch database before it is imported
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    from app import app, db, upgrade_database
+
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'investors': args.investors,
+            'funds': args.funds,
+            'portfolios': portfolios,
+            'requests': args.requests,
+            'seed': args.seed
+        },
+        'endpoints': {}
+    }
+    with app.app_context():
+        db.create_all()
+        upgrade_database()
+        # Bulk inserts trip the slow query warning; it is not useful while populating
+        log_level = app.logger.level
+        app.logger.setLevel(logging.ERROR)
+        populate_seconds, owners = populate(args.investors, args.funds, portfolios, args.seed)
+        app.logger.setLevel(log_level)
+        results['meta']['populate_seconds'] = round(populate_seconds, 2)
+        print(f'Populated {args.investors} investors, {args.funds} funds, {portfolios} portfolios '
+              f'in {populate_seconds:.1f}s')
+
+    client = app.test_client()
+    selected = set(args.only.split(',')) if args.only else None
+    print(f"{'endpoint':<38} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'peak KB':>9} {'errors':>6}")
+    rng = np.random.default_rng(args.seed)
+    for name, (call, divisor) in scenarios(client, args.investors, owners, rng).items():
+        if selected and name not in selected:
+            continue
+        result = measure(call, max(args.requests // divisor, 3), args.memory_samples)
+        results['endpoints'][name] = result
+        print(f"{name:<38} {result['throughput_rps']:>9.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['peak_memory_kb']:>9.1f} {result['errors']:>6}")
+    if resource is not None:
+        results['meta']['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}')
+    with app.app_context():
+        db.engine.dispose()
+    workdir.cleanup()
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
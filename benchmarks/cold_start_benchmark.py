@@ -0,0 +1,83 @@
+"""Benchmark the cold start of an app process up to its first recommendation.
+
+Starts fresh Python processes that import the app and serve one
+GET /api/recommendations/<id> through the Flask test client, and reports
+the median time to import, to the first response, and in total (process
+start to response). Each scenario runs with and without a saved reference
+data snapshot, so the saving from installing it instead of loading the
+reference tables shows up directly.
+
+    python benchmarks/cold_start_benchmark.py
+    python benchmarks/cold_start_benchmark.py --database /tmp/bench.db --repeats 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from app import app, db, Investor, reference_data
+imported = time.perf_counter()
+with app.app_context():
+    investor_id = int(sys.argv[1]) or db.session.scalar(db.select(Investor.id).order_by(Investor.id).limit(1))
+    response = app.test_client().get(f'/api/recommendations/{investor_id}')
+    assert response.status_code == 200, response.status_code
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (finished - imported) * 1000,
+    'source': reference_data.stats()['source']
+}))
+'''
+
+
+def run_child(env, investor_id):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, str(investor_id)], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['total_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark time to the first served recommendation')
+    parser.add_argument('--database', help='SQLite database file (default: the app database)')
+    parser.add_argument('--investor-id', type=int, default=0, help='investor to recommend for (default: the first)')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        snapshot_path = os.path.join(scratch, 'reference_snapshot.json')
+        env = dict(os.environ, REFERENCE_SNAPSHOT_PATH=snapshot_path, PYTHONPATH=ROOT)
+        if args.database:
+            env['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.database)}'
+
+        print(f"{'reference data':<16} {'import ms':>10} {'first req ms':>13} {'total ms':>9}")
+        for scenario in ('database', 'snapshot'):
+            runs = []
+            for _ in range(args.repeats):
+                if scenario == 'database' and os.path.exists(snapshot_path):
+                    os.remove(snapshot_path)
+                elif scenario == 'snapshot' and not os.path.exists(snapshot_path):
+                    run_child(env, args.investor_id)
+                result = run_child(env, args.investor_id)
+                expected = 'file' if scenario == 'snapshot' else 'database'
+                if result['source'] != expected:
+                    sys.exit(f'Expected the {expected} snapshot, the process used {result["source"]}')
+                runs.append(result)
+            print(f"{scenario:<16} {statistics.median(r['import_ms'] for r in runs):>10.1f} "
+                  f"{statistics.median(r['first_request_ms'] for r in runs):>13.1f} "
+                  f"{statistics.median(r['total_ms'] for r in runs):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""Load test the API under the dev server, serve.py and the ASGI app.
+
+Starts each server against its own scratch copy of the database, fires a mix
+of reads (investor pages, recommendations, portfolios) with a portfolio write
+every ``--write-every`` requests from concurrent client threads spread over
+several processes, and reports throughput and latency percentiles.
+
+    python benchmarks/load_test.py --clients 32 --duration 15
+    python benchmarks/load_test.py --servers serve,asgi --clients 200
+    python benchmarks/load_test.py --url http://127.0.0.1:8000   # an already running server
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE = os.path.join(ROOT, 'instance', 'mutual_funds.db')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with code {process.returncode}')
+        try:
+            urllib.request.urlopen(url + '/api/investors?limit=1', timeout=2).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f'server at {url} did not start')
+
+
+def request_paths(url):
+    """Paths to request, built from the investors in the database"""
+    with urllib.request.urlopen(url + '/api/investors?limit=500') as response:
+        investor_ids = [i['id'] for i in json.load(response)['investors']]
+    if not investor_ids:
+        raise RuntimeError('the database has no investors to load test with')
+    paths = ['/api/investors?limit=50']
+    for investor_id in investor_ids:
+        paths.append(f'/api/recommendations/{investor_id}')
+        paths.append(f'/api/portfolio/{investor_id}')
+    return paths, investor_ids
+
+
+def send(url, path, body=None):
+    """Issue one request; False if it failed (a 404 for a missing portfolio is an answer)"""
+    data = None if body is None else json.dumps(body).encode()
+    req = urllib.request.Request(url + path, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        return e.code < 500
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return False
+    return True
+
+
+def client_process(url, paths, investor_ids, threads, offset, stop_at, write_every):
+    """Run ``threads`` client loops until ``stop_at``; returns (latencies, errors)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    portfolio = {'recommendations': [
+        {'fund_name': 'Load Test Fund', 'recommended_investment': 1000, 'expected_return': 10}
+    ]}
+
+    def client(i):
+        local = []
+        failed = 0
+        while time.time() < stop_at:
+            started = time.perf_counter()
+            if write_every and i % write_every == 0:
+                ok = send(url, f'/api/portfolio/{investor_ids[i % len(investor_ids)]}', portfolio)
+            else:
+                ok = send(url, paths[i % len(paths)])
+            local.append(time.perf_counter() - started)
+            failed += not ok
+            i += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    workers = [threading.Thread(target=client, args=(offset + n * 7919,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return latencies, errors[0]
+
+
+def run_load(url, clients, duration, processes, write_every):
+    """Drive the server from several client processes so the client is not the bottleneck"""
+    paths, investor_ids = request_paths(url)
+    processes = max(1, min(processes, clients))
+    stop_at = time.time() + duration
+    started = time.monotonic()
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(client_process, url, paths, investor_ids, len(range(n, clients, processes)),
+                               n, stop_at, write_every) for n in range(processes)]
+        results = [f.result() for f in futures]
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(latency for latencies, _ in results for latency in latencies)
+
+    def percentile(p):
+        return latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)] * 1000 if latencies else 0.0
+
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99)
+    }
+
+
+SERVERS = ('dev', 'serve', 'asgi')
+
+
+def start_server(name, workdir, workers=None):
+    """Start the dev server, serve.py or asgi_app.py on a free port against a copy of the database"""
+    instance = os.path.join(workdir, name)
+    os.makedirs(instance)
+    shutil.copy(DATABASE, os.path.join(instance, 'mutual_funds.db'))
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(instance, 'mutual_funds.db')}")
+    if name == 'dev':
+        # The setup app.py runs today, minus the reloader
+        command = [sys.executable, '-c',
+                   'from app import app, db, upgrade_database\n'
+                   'with app.app_context():\n'
+                   '    db.create_all()\n'
+                   '    upgrade_database()\n'
+                   f'app.run(port={port}, debug=True, use_reloader=False)']
+    elif name == 'serve':
+        command = [sys.executable, 'serve.py', '--bind', f'127.0.0.1:{port}']
+    else:
+        command = [sys.executable, 'asgi_app.py', '--bind', f'127.0.0.1:{port}']
+    if workers and name != 'dev':
+        command += ['--workers', str(workers)]
+    process = subprocess.Popen(command, cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_up(url, process)
+    except Exception:
+        process.kill()
+        raise
+    return process, url
+
+
+def report(name, result):
+    print(f"{name:>8} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} "
+          f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the mutual fund API')
+    parser.add_argument('--url', help='test an already running server instead of starting servers')
+    parser.add_argument('--servers', default='dev,serve',
+                        help=f"comma separated servers to compare, from {', '.join(SERVERS)}")
+    parser.add_argument('--workers', type=int, help='worker processes for serve and asgi (default: their own)')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15, help='seconds per run')
+    parser.add_argument('--client-processes', type=int, default=os.cpu_count() or 1,
+                        help='processes the client threads are spread over')
+    parser.add_argument('--write-every', type=int, default=20,
+                        help='every Nth request creates a portfolio (0 for read only)')
+    args = parser.parse_args()
+
+    print(f"{'server':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    if args.url:
+        report('target', run_load(args.url.rstrip('/'), args.clients, args.duration,
+                                    args.client_processes, args.write_every))
+        return 0
+
+    names = [name.strip() for name in args.servers.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SERVERS]
+    if unknown:
+        parser.error(f"unknown server {', '.join(unknown)}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            process, url = start_server(name, workdir, args.workers)
+            try:
+                results[name] = run_load(url, args.clients, args.duration,
+                                         args.client_processes, args.write_every)
+            finally:
+                process.terminate()
+                process.wait()
+            report(name, results[name])
+    baseline = names[0]
+    for name in names[1:]:
+        print(f"{name} throughput: {results[name]['rps'] / results[baseline]['rps']:.1f}x {baseline}, "
+              f"p99 {results[name]['p99_ms']:.1f} ms vs {results[baseline]['p99_ms']:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
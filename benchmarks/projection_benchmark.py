@@ -0,0 +1,49 @@
+"""Benchmark the Monte Carlo projection engine.
+
+Times projection.project() for a five-asset-class portfolio at 10,000 paths
+over 30 years (the target is well under 100 ms) and a few other sizes.
+
+    python benchmarks/projection_benchmark.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projection import project  # noqa: E402
+
+AMOUNTS = [50000, 25000, 15000, 5000, 5000]
+EXPECTED_RETURNS = [14.0, 11.0, 7.0, 11.0, 7.0]
+VOLATILITIES = [0.22, 0.14, 0.04, 0.14, 0.04]
+TARGET_MS = 100
+REPEATS = 20
+
+
+def time_projection(paths, years):
+    project(AMOUNTS, EXPECTED_RETURNS, VOLATILITIES, years, 12.0, paths=paths, seed=0)  # warm up
+    timings = []
+    for seed in range(REPEATS):
+        started = time.perf_counter()
+        project(AMOUNTS, EXPECTED_RETURNS, VOLATILITIES, years, 12.0, paths=paths, seed=seed)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[-1]
+
+
+def main():
+    print(f"{'paths':>8} {'years':>6} {'median ms':>10} {'max ms':>8}")
+    for paths, years in [(1000, 10), (10000, 10), (10000, 30), (50000, 30)]:
+        median, worst = time_projection(paths, years)
+        print(f'{paths:>8} {years:>6} {median:>10.1f} {worst:>8.1f}')
+
+    median, _ = time_projection(10000, 30)
+    if median >= TARGET_MS:
+        print(f'FAIL: 10k paths x 30 years took {median:.1f} ms (target < {TARGET_MS} ms)')
+        return 1
+    print(f'OK: 10k paths x 30 years in {median:.1f} ms (target < {TARGET_MS} ms)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
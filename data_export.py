@@ -0,0 +1,138 @@
+"""Chunked export of tabular data to CSV, NDJSON and Parquet.
+
+Rows arrive as an iterable of chunks (lists of row tuples in column order)
+and are encoded one chunk at a time, so an export of the whole investor book
+is written out while it is read and never held in memory at once. Parquet
+output writes one row group per chunk and hands the bytes on as soon as the
+row group is complete. Parquet needs ``pyarrow``; CSV and NDJSON do not.
+"""
+import csv
+import io
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+# kind is one of 'int', 'float', 'bool', 'str', 'datetime'
+Column = namedtuple('Column', ['name', 'kind'])
+
+
+def column_kind(python_type):
+    """Export kind for a column's Python type"""
+    if issubclass(python_type, bool):
+        return 'bool'
+    if issubclass(python_type, int):
+        return 'int'
+    if issubclass(python_type, float):
+        return 'float'
+    if issubclass(python_type, (datetime, date)):
+        return 'datetime'
+    return 'str'
+
+
+def detect_export_format(filename):
+    """Export format from a filename extension, or None"""
+    filename = (filename or '').lower()
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if filename.endswith('.parquet'):
+        return 'parquet'
+    return None
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_chunks(columns, chunks, fmt):
+    """Yield the encoded export of ``chunks`` as bytes, one piece per chunk"""
+    if fmt == 'csv':
+        return _csv_chunks(columns, chunks)
+    if fmt == 'ndjson':
+        return _ndjson_chunks(columns, chunks)
+    if fmt == 'parquet':
+        return _parquet_chunks(columns, chunks)
+    raise ValueError(f'Unsupported export format: {fmt}')
+
+
+def _csv_chunks(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.name for c in columns])
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _ndjson_chunks(columns, chunks):
+    names = [c.name for c in columns]
+    for chunk in chunks:
+        yield ''.join(json.dumps(dict(zip(names, row)), default=_json_default) + '\n' for row in chunk).encode()
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink that keeps the bytes written since the last drain()"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        # Parquet records absolute offsets in the footer
+        return self._size
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def _parquet_chunks(columns, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_(),
+             'str': pa.string(), 'datetime': pa.timestamp('us')}
+    schema = pa.schema([(c.name, types[c.kind]) for c in columns])
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pydict(
+                {c.name: [row[i] for row in chunk] for i, c in enumerate(columns)}, schema=schema)
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,196 @@
+"""Precomputed fund selection index for one asset class.
+
+The recommendation rule picks, for an allocated amount, the fund with the
+highest expected return among funds whose minimum investment fits the amount;
+when no fund's minimum fits, no fund is recommended. ``FundIndex``
+sorts the funds by ``min_investment`` once and keeps a running best of
+expected return, so each lookup is a bisect instead of a scan of the class.
+
+Larger amounts can instead be split across several funds of the class
+(``FundIndex.split``): the highest total expected return with at most
+``max_funds`` holdings, each at least its fund's minimum investment and at
+most ``max_share`` of the amount. That is a bounded knapsack, solved exactly
+on a grid of at most ``SPLIT_MAX_UNITS`` steps by a dynamic program over the
+few funds that can matter (see ``split_candidates``). Because returns are
+linear in the amount, every DP transition is a sliding-window maximum, which
+NumPy evaluates for all grid points at once.
+"""
+import math
+from bisect import bisect_right, insort
+from collections import namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Finest grid the split is solved on, and memoised splits kept per class
+SPLIT_MAX_UNITS = 100
+SPLIT_CACHE_ENTRIES = 4096
+
+# When and how an asset class amount is split across funds
+SplitPolicy = namedtuple('SplitPolicy', ['min_amount', 'max_funds', 'max_share', 'step'])
+
+
+class FundIndex:
+    """Funds of one asset class sorted by minimum investment"""
+
+    def __init__(self, funds):
+        # ``funds`` arrive in FundMaster id order; ties on expected return and
+        # on min_investment resolve to the earlier fund, like max()/min() did
+        order = sorted(range(len(funds)), key=lambda i: funds[i].min_investment)
+        self.funds = tuple(funds[i] for i in order)
+        self.min_investments = [f.min_investment for f in self.funds]
+        self.min_investment_array = np.array(self.min_investments, dtype=float)
+
+        # best[k] is the position of the best fund among self.funds[:k + 1]
+        best = []
+        for k, fund in enumerate(self.funds):
+            if best:
+                current = best[-1]
+                leader = self.funds[current]
+                if (fund.expected_return > leader.expected_return or
+                        (fund.expected_return == leader.expected_return and order[k] < order[current])):
+                    current = k
+            else:
+                current = 0
+            best.append(current)
+        self.best = best
+        self.best_array = np.array(best, dtype=np.int64)
+        self._split_candidates = {}
+        self._splits = {}
+
+    def __len__(self):
+        return len(self.funds)
+
+    def best_affordable(self, amount):
+        """Highest-return fund with min_investment <= amount, or None"""
+        k = bisect_right(self.min_investments, amount)
+        if k == 0:
+            return None
+        return self.funds[self.best[k - 1]]
+
+    def lowest_minimum(self):
+        """Fund with the lowest minimum investment, or None for an empty class"""
+        return self.funds[0] if self.funds else None
+
+    def select(self, amount):
+        """Recommended fund for an amount: the best affordable one, or None"""
+        return self.best_affordable(amount)
+
+    def select_positions(self, amounts):
+        """Vectorized select(): positions into ``funds`` for an array of amounts, -1 for None"""
+        if not self.funds:
+            return np.full(len(amounts), -1, dtype=np.int64)
+        k = np.searchsorted(self.min_investment_array, amounts, side='right')
+        # k == 0 means no fund's minimum fits the amount
+        return np.where(k > 0, self.best_array[np.maximum(k - 1, 0)], -1)
+
+    def split_candidates(self, max_funds):
+        """Funds that can appear in a best split into at most ``max_funds`` holdings.
+
+        A fund ranked below ``max_funds`` others that each have an equal or
+        lower minimum investment is never needed: one of those is always
+        free to take its amount for at least the same return. Best return first.
+        """
+        candidates = self._split_candidates.get(max_funds)
+        if candidates is None:
+            # Rank by return, then lower minimum, then FundMaster id
+            ranking = sorted(range(len(self.funds)), key=lambda k: (-self.funds[k].expected_return, k))
+            seen = []
+            candidates = []
+            for k in ranking:
+                fund = self.funds[k]
+                if bisect_right(seen, fund.min_investment) < max_funds:
+                    candidates.append(fund)
+                insort(seen, fund.min_investment)
+            candidates = self._split_candidates[max_funds] = tuple(candidates)
+        return candidates
+
+    def split(self, amount, max_funds=3, max_share=0.5, step=500.0):
+        """Split an amount across funds for the highest total expected return.
+
+        Holdings are multiples of ``step`` (or of amount / SPLIT_MAX_UNITS if
+        coarser), at least the fund's min_investment and at most ``max_share``
+        of the amount; the cap is raised to 1 / max_funds when it could not
+        place the whole amount. Returns ``[(fund, amount)]`` largest holding
+        first, or ``[]`` when no fund's minimum fits.
+        """
+        key = (amount, max_funds, max_share, step)
+        holdings = self._splits.get(key)
+        if holdings is None:
+            holdings = self._solve_split(amount, max_funds, max_share, step)
+            if len(self._splits) >= SPLIT_CACHE_ENTRIES:
+                self._splits.clear()
+            self._splits[key] = holdings
+        return holdings
+
+    def _solve_split(self, amount, max_funds, max_share, step):
+        if amount <= 0 or max_funds < 1:
+            return []
+        units = max(1, int(min(amount // step, SPLIT_MAX_UNITS)))
+        unit = amount / units
+        cap = min(units, max(int(units * max_share + 1e-9), -(-units // max_funds)))
+
+        # (fund, smallest holding in units) for candidates whose minimum fits under the cap
+        rows = []
+        for fund in self.split_candidates(max_funds):
+            lowest = max(1, math.ceil(fund.min_investment / unit - 1e-9))
+            if lowest <= cap:
+                rows.append((fund, lowest))
+        if not rows:
+            return []
+
+        # best[k, t]: highest return of k holdings totalling t units;
+        # takes[i][k, t]: units given to rows[i] when it improved best[k, t]
+        most = min(max_funds, len(rows))
+        best = np.full((most + 1, units + 1), -np.inf)
+        best[0, 0] = 0.0
+        grid = np.arange(units + 1, dtype=float)
+        takes = []
+        for fund, lowest in rows:
+            rate = fund.expected_return
+            width = cap - lowest + 1
+            take = np.zeros((most + 1, units + 1), dtype=np.int64)
+            # Descending k so every fund is held at most once
+            for k in range(most - 1, -1, -1):
+                # best[k + 1, t] from best[k, u] + rate * (t - u) for u in [t - cap, t - lowest]
+                shifted = np.concatenate((np.full(width - 1, -np.inf), best[k] - rate * grid))
+                windows = sliding_window_view(shifted, width)[:units + 1 - lowest]
+                arg = windows.argmax(axis=1)
+                values = windows[np.arange(len(arg)), arg] + rate * grid[lowest:]
+                target = best[k + 1, lowest:]
+                better = values > target
+                if better.any():
+                    target[better] = values[better]
+                    take[k + 1, lowest:][better] = (cap - arg)[better]
+            takes.append(take)
+
+        totals = best[1:, units]
+        if not np.isfinite(totals).any():
+            return []
+        k = 1 + int(np.argmax(totals))
+        t = units
+        holdings = []
+        for (fund, _), take in zip(reversed(rows), reversed(takes)):
+            size = int(take[k, t])
+            if size:
+                holdings.append([fund, round(size * unit, 2)])
+                k -= 1
+                t -= size
+        holdings.sort(key=lambda h: (-h[1], -h[0].expected_return))
+        # Fold rounding into the largest holding so the split adds up to the amount
+        holdings[0][1] = round(holdings[0][1] + round(amount, 2) - sum(h[1] for h in holdings), 2)
+        return [tuple(h) for h in holdings]
+
+    def allocate(self, amount, policy=None):
+        """``[(fund, amount)]`` recommended for an asset class amount.
+
+        Amounts of at least ``policy.min_amount`` are split across funds;
+        smaller ones, and amounts no split fits, go to select(). Returns ``[]``
+        when the amount is below every fund's minimum investment.
+        """
+        if policy is not None and amount >= policy.min_amount:
+            holdings = self.split(amount, policy.max_funds, policy.max_share, policy.step)
+            if holdings:
+                return holdings
+        fund = self.select(amount)
+        return [(fund, amount)] if fund else []
@@ -0,0 +1,129 @@
+"""Streaming parsing and validation for bulk investor onboarding files.
+
+Distributor files arrive as CSV (header row with Investor column names) or
+NDJSON (one JSON object per line). Records are read lazily so a file with tens
+of thousands of investors is never held in memory at once; each record is
+validated and coerced to the column types of the ``Investor`` model.
+"""
+import csv
+import json
+import math
+from itertools import islice
+
+from risk_scoring import ANSWER_SCORES, PROFILE_QUESTIONS, RISK_QUESTIONS
+
+TEXT_FIELDS = [
+    'name', 'email', 'education_level', 'occupation_type', 'annual_income_range',
+    'investment_horizon', 'equity_experience', 'financial_goals'
+]
+INT_FIELDS = ['age']
+FLOAT_FIELDS = [
+    'monthly_income', 'monthly_expenses', 'existing_assets', 'existing_liabilities',
+    'emergency_fund', 'investment_amount', 'required_return'
+]
+# Numbers that must be above zero; the other numeric fields only must not be negative
+POSITIVE_FIELDS = ['age', 'monthly_income', 'investment_amount']
+ANSWER_FIELDS = RISK_QUESTIONS + PROFILE_QUESTIONS
+OPTIONAL_FIELDS = ['risk_q1_reason', 'risk_q8_reason']
+RECORD_FIELDS = TEXT_FIELDS + INT_FIELDS + FLOAT_FIELDS + ANSWER_FIELDS + OPTIONAL_FIELDS
+
+SUPPORTED_FORMATS = ('csv', 'ndjson')
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess the file format from a filename or content type"""
+    filename = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if filename.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return None
+
+
+def iter_records(stream, fmt):
+    """Yield ``(row_number, record, error)`` for each record of a text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row_number, record in enumerate(reader, start=1):
+            yield row_number, record, None
+    elif fmt == 'ndjson':
+        row_number = 0
+        for line in stream:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f'Invalid JSON: {str(e)}'
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, 'Each line must be a JSON object'
+                continue
+            yield row_number, record, None
+    else:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(SUPPORTED_FORMATS)}")
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def validate_field(field, value):
+    """Return ``(clean, error)`` for one Investor field: the value coerced to its column type, or why not"""
+    if field in TEXT_FIELDS:
+        if _blank(value):
+            return None, f'{field} is required'
+        return str(value).strip(), None
+    if field in INT_FIELDS or field in FLOAT_FIELDS:
+        if _blank(value):
+            return None, f'{field} is required'
+        integer = field in INT_FIELDS
+        try:
+            number = int(value) if integer else float(value)
+        except (TypeError, ValueError):
+            number = None
+        if number is None or not math.isfinite(number):
+            return None, f"{field} must be {'an integer' if integer else 'a number'}"
+        if field in POSITIVE_FIELDS and number <= 0:
+            return None, f'{field} must be positive'
+        if number < 0:
+            return None, f'{field} must not be negative'
+        return number, None
+    if field in ANSWER_FIELDS:
+        answer = str(value).strip() if value is not None else ''
+        if answer not in ANSWER_SCORES:
+            return None, f'{field} must be one of A, B, C, D'
+        return answer, None
+    if field in OPTIONAL_FIELDS:
+        return ('' if value is None else str(value)), None
+    raise KeyError(field)
+
+
+def validate_record(record):
+    """Return ``(clean, errors)``: the record coerced to Investor column types"""
+    clean = {}
+    errors = []
+
+    for field in RECORD_FIELDS:
+        value, error = validate_field(field, record.get(field))
+        if error:
+            errors.append(error)
+        else:
+            clean[field] = value
+
+    if 'email' in clean and '@' not in clean['email']:
+        errors.append('email is not a valid address')
+
+    return clean, errors
+
+
+def chunked(iterable, size):
+    """Yield lists of at most ``size`` items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
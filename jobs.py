@@ -0,0 +1,108 @@
+"""In-process worker pool for background jobs, and job progress arithmetic.
+
+Jobs themselves live in a database table (see ``Job`` in app.py); this
+module only runs them. A ``WorkerPool`` starts a few daemon threads that
+repeatedly ``claim`` a job and ``run`` it, and sleep for ``poll_interval``
+seconds when there is nothing to claim (``wake`` cuts the sleep short after
+a job is submitted). ``run`` receives the pool's stop event and is expected
+to check it between chunks, so stopping the pool hands unfinished jobs back
+to the queue instead of abandoning them mid-chunk.
+"""
+import os
+import socket
+import threading
+from collections import namedtuple
+
+# A job kind: ``count(job, params)`` is the number of items the job will
+# process; ``step(job, params, result)`` processes the next chunk after
+# ``job.last_id``, updating the ``result`` dict in place, and returns
+# ``(processed, last_id)`` with ``last_id`` None once nothing is left.
+# ``params`` maps each accepted parameter name to its type.
+JobKind = namedtuple('JobKind', ['count', 'step', 'params'])
+
+
+def progress(processed, total, elapsed_seconds):
+    """Percent done, items per second and estimated seconds left"""
+    rate = processed / elapsed_seconds if elapsed_seconds > 0 else None
+    remaining = max(total - processed, 0) if total is not None else None
+    return {
+        'percent': round(min(processed / total, 1) * 100, 1) if total else None,
+        'items_per_second': round(rate, 1) if rate else None,
+        'eta_seconds': round(remaining / rate, 1) if rate and remaining is not None else None
+    }
+
+
+class WorkerPool:
+    """Threads that claim and run jobs until stopped"""
+
+    def __init__(self, claim, run, workers=1, poll_interval=1.0, on_error=None):
+        self.claim = claim
+        self.run = run
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.on_error = on_error
+        self.stopping = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def worker_name(self, number):
+        return f'{socket.gethostname()}:{os.getpid()}:{number}'
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    def start(self):
+        """Start the worker threads once; returns whether this call started them"""
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return False
+            self.stopping.clear()
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._loop, args=(self.worker_name(number),),
+                                          name=f'job-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            return True
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        """Ask the workers to stop after their current chunk and wait for them"""
+        with self._lock:
+            self.stopping.set()
+            self._wake.set()
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def run_once(self, worker):
+        """Claim and run one job; returns False when there was none"""
+        job_id = self.claim(worker)
+        if job_id is None:
+            return False
+        self.run(job_id, worker, self.stopping)
+        return True
+
+    def drain(self, worker=None):
+        """Run jobs in the calling thread until none can be claimed; returns how many ran"""
+        worker = worker or self.worker_name('main')
+        count = 0
+        while not self.stopping.is_set() and self.run_once(worker):
+            count += 1
+        return count
+
+    def _loop(self, worker):
+        while not self.stopping.is_set():
+            try:
+                ran = self.run_once(worker)
+            except Exception as e:
+                # Keep the worker alive; a broken database is retried after the poll interval
+                ran = False
+                if self.on_error is not None:
+                    self.on_error(worker, e)
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
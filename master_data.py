@@ -0,0 +1,138 @@
+"""Parsing and diffing of scheme master files for FundMaster.
+
+A scheme master file lists the whole fund universe, one fund per row, as CSV
+(FundMaster column headers), a JSON array of objects, or NDJSON. Funds are
+keyed by ``fund_name``. ``diff_funds`` compares the file with the current
+table contents, read in one query, and returns only the rows that change:
+new funds, funds whose columns differ, funds that reappear after being
+retired, and funds missing from the file, which are retired. Columns absent
+from a record keep their stored value, so a file without ``scheme_code``
+does not unlink NAV history.
+"""
+import csv
+import json
+from datetime import datetime
+
+FUND_FIELDS = ['fund_name', 'asset_class', 'category', 'expected_return', 'risk_level', 'min_investment', 'scheme_code']
+REQUIRED_FIELDS = ['fund_name', 'asset_class']
+NUMBER_FIELDS = ['expected_return', 'min_investment']
+OPTIONAL_FIELDS = ['category', 'risk_level', 'scheme_code']
+
+SUPPORTED_FORMATS = ('csv', 'json', 'ndjson')
+
+
+def detect_format(filename):
+    """Scheme master format from a filename extension, or None"""
+    filename = (filename or '').lower()
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith('.json'):
+        return 'json'
+    if filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def read_records(stream, fmt):
+    """List of record dicts from a text stream"""
+    if fmt == 'csv':
+        return list(csv.DictReader(stream))
+    if fmt == 'json':
+        records = json.load(stream)
+        if not isinstance(records, list):
+            raise ValueError('A JSON scheme master must be an array of funds')
+        return records
+    if fmt == 'ndjson':
+        return [json.loads(line) for line in stream if line.strip()]
+    raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(SUPPORTED_FORMATS)}")
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def validate_fund(record):
+    """Return ``(clean, errors)``: the record coerced to FundMaster column types"""
+    clean = {}
+    errors = []
+    if not isinstance(record, dict):
+        return clean, ['Each fund must be an object']
+
+    for field in REQUIRED_FIELDS:
+        value = record.get(field)
+        if _blank(value):
+            errors.append(f'{field} is required')
+        else:
+            clean[field] = str(value).strip()
+
+    for field in NUMBER_FIELDS:
+        value = record.get(field)
+        if _blank(value):
+            errors.append(f'{field} is required')
+            continue
+        try:
+            clean[field] = float(value)
+        except (TypeError, ValueError):
+            errors.append(f'{field} must be a number')
+
+    for field in OPTIONAL_FIELDS:
+        if field in record:
+            value = record[field]
+            clean[field] = None if _blank(value) else str(value).strip()
+
+    return clean, errors
+
+
+def parse_funds(records):
+    """Return ``(funds, errors)`` for scheme master records, rejecting duplicate names"""
+    funds = []
+    errors = []
+    seen = set()
+    for row_number, record in enumerate(records, start=1):
+        clean, row_errors = validate_fund(record)
+        name = clean.get('fund_name')
+        if name is not None and name in seen:
+            row_errors.append('Duplicate fund_name in file')
+        if row_errors:
+            errors.append({'row': row_number, 'fund_name': name, 'errors': row_errors})
+            continue
+        seen.add(name)
+        funds.append(clean)
+    return funds, errors
+
+
+def diff_funds(existing, funds, retire=True, retired_at=None):
+    """Changes that bring the table to ``funds``.
+
+    ``existing`` maps fund_name to the stored row as a dict of FUND_FIELDS
+    plus ``retired_at``. Returns ``(rows, counts)``: full rows to upsert, each
+    with ``retired_at`` set, and the number of inserted, updated, retired,
+    restored and unchanged funds. With ``retire`` false, funds missing from
+    the file are left alone.
+    """
+    retired_at = retired_at or datetime.utcnow()
+    rows = []
+    counts = {'inserted': 0, 'updated': 0, 'retired': 0, 'restored': 0, 'unchanged': 0}
+    for fund in funds:
+        stored = existing.get(fund['fund_name'])
+        if stored is None:
+            rows.append(dict({field: None for field in FUND_FIELDS}, **fund, retired_at=None))
+            counts['inserted'] += 1
+            continue
+        row = dict(stored, **fund, retired_at=None)
+        if row == stored:
+            counts['unchanged'] += 1
+            continue
+        rows.append(row)
+        if stored['retired_at'] is not None:
+            counts['restored'] += 1
+        else:
+            counts['updated'] += 1
+
+    if retire:
+        listed = {fund['fund_name'] for fund in funds}
+        for name, stored in existing.items():
+            if name not in listed and stored['retired_at'] is None:
+                rows.append(dict(stored, retired_at=retired_at))
+                counts['retired'] += 1
+    return rows, counts
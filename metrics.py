@@ -0,0 +1,182 @@
+"""In-process request and SQL metrics in the Prometheus text format.
+
+Requests are timed per route and every SQL statement is timed by SQLAlchemy
+engine events. While a request is being handled its statements are also
+collected on a ``RequestTrace`` (held in a context variable, so it follows
+the request across threads and asyncio tasks). The trace gives the query
+count and SQL time for ``X-Query-Count`` / ``Server-Timing`` headers, and
+the same statement repeated many times in one request is reported as a
+likely N+1 pattern.
+
+Metrics are kept per process; behind a multi-worker server each worker
+reports its own counts.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SQL_OPERATIONS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'PRAGMA', 'CREATE', 'ALTER')
+
+current_trace = ContextVar('current_trace', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {_number(value)}')
+        return lines
+
+
+class RequestTrace:
+    """SQL statements issued while handling one request"""
+
+    __slots__ = ('route', 'started', 'query_count', 'query_time', 'statements')
+
+    def __init__(self, route, started):
+        self.route = route
+        self.started = started
+        self.query_count = 0
+        self.query_time = 0.0
+        self.statements = StatementCounter()
+
+    def record(self, statement, duration):
+        self.query_count += 1
+        self.query_time += duration
+        self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        """(statement, count) for statements run at least ``threshold`` times"""
+        return [(statement, count) for statement, count in self.statements.items() if count >= threshold]
+
+
+def sql_operation(statement):
+    """First keyword of a statement, for the operation label"""
+    keyword = statement.lstrip()[:6].upper()
+    return keyword if keyword in SQL_OPERATIONS else 'OTHER'
+
+
+class MetricsRegistry:
+    """The app's request and SQL metrics plus extra gauges from collectors"""
+
+    def __init__(self, slow_query_seconds=0.1, n_plus_one_threshold=10):
+        self.slow_query_seconds = slow_query_seconds
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.request_duration = Histogram(
+            'http_request_duration_seconds', 'Request latency by route.',
+            ('method', 'route', 'status'), LATENCY_BUCKETS)
+        self.request_queries = Histogram(
+            'http_request_sql_queries', 'SQL statements issued per request.',
+            ('method', 'route'), QUERY_COUNT_BUCKETS)
+        self.sql_duration = Histogram(
+            'sql_query_duration_seconds', 'SQL statement latency by operation.',
+            ('operation',), LATENCY_BUCKETS)
+        self.slow_queries = Counter(
+            'sql_slow_queries_total', 'SQL statements slower than the slow query threshold.', ('route',))
+        self.n_plus_one = Counter(
+            'sql_n_plus_one_total', 'Requests repeating one statement at least the N+1 threshold times.',
+            ('method', 'route'))
+        self._collectors = []
+
+    def add_collector(self, collector):
+        """Register ``collector() -> [(name, type, help, value)]`` evaluated on every render"""
+        self._collectors.append(collector)
+
+    def observe_query(self, statement, duration):
+        """Record one statement; returns True if it was slow"""
+        self.sql_duration.observe((sql_operation(statement),), duration)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.record(statement, duration)
+        slow = duration >= self.slow_query_seconds
+        if slow:
+            self.slow_queries.inc((trace.route if trace is not None else 'none',))
+        return slow
+
+    def observe_request(self, method, status, trace, duration):
+        """Record a finished request; returns the statements that look like N+1 queries"""
+        self.request_duration.observe((method, trace.route, str(status)), duration)
+        self.request_queries.observe((method, trace.route), trace.query_count)
+        repeated = trace.repeated(self.n_plus_one_threshold)
+        if repeated:
+            self.n_plus_one.inc((method, trace.route))
+        return repeated
+
+    def render(self):
+        lines = []
+        for metric in (self.request_duration, self.request_queries, self.sql_duration,
+                       self.slow_queries, self.n_plus_one):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, metric_type, help_text, value in collector():
+                lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}',
+                              f'{name} {_number(value)}'])
+        return '\n'.join(lines) + '\n'
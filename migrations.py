@@ -0,0 +1,164 @@
+"""Versioned, in-place schema migrations.
+
+``db.create_all()`` creates missing tables with the current models, but it
+never changes a table that already exists. Each migration below upgrades an
+existing database (such as a shipped ``instance/mutual_funds.db``) by one
+step. Applied versions are recorded in the ``schema_migrations`` table so
+every migration runs once per database, in version order, each in its own
+transaction. Migrations are written in plain DDL rather than from the models
+so they keep describing the schema as it was at that version. Every step is
+safe to re-run: it tolerates a table that ``create_all()`` has just created in
+its final shape, and a migration interrupted half way (SQLite commits some
+DDL immediately) simply runs again.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register a migration function taking a Connection"""
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+
+# Helpers
+def column_names(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def add_column(conn, table, name, ddl):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there"""
+    if name not in column_names(conn, table):
+        conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}')
+
+
+def create_index(conn, name, table, columns):
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+
+# Migrations
+@migration(1, 'stored investor risk classification')
+def _investor_risk_classification(conn):
+    add_column(conn, 'investor', 'risk_category', 'VARCHAR(30)')
+    add_column(conn, 'investor', 'risk_category_code', 'VARCHAR(10)')
+    add_column(conn, 'investor', 'demographic_score', 'INTEGER')
+    create_index(conn, 'ix_investor_risk_category_id', 'investor', ['risk_category', 'id'])
+    create_index(conn, 'ix_investor_risk_category_code_id', 'investor', ['risk_category_code', 'id'])
+    create_index(conn, 'ix_investor_risk_tolerance_id', 'investor', ['risk_tolerance', 'id'])
+
+
+@migration(2, 'investor row version')
+def _investor_row_version(conn):
+    add_column(conn, 'investor', 'row_version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+@migration(3, 'reference data and portfolio lookup indexes')
+def _lookup_indexes(conn):
+    create_index(conn, 'ix_asset_allocation_risk_profile_asset_class', 'asset_allocation',
+                 ['risk_profile', 'asset_class'])
+    create_index(conn, 'ix_fund_master_asset_class_min_investment', 'fund_master',
+                 ['asset_class', 'min_investment'])
+    create_index(conn, 'ix_fund_master_fund_name', 'fund_master', ['fund_name'])
+    create_index(conn, 'ix_portfolio_investor_id_created_at', 'portfolio', ['investor_id', 'created_at'])
+    create_index(conn, 'ix_fund_portfolio_id', 'fund', ['portfolio_id'])
+
+
+@migration(4, 'fund to fund master foreign key')
+def _fund_master_foreign_key(conn):
+    add_column(conn, 'fund', 'fund_master_id', 'INTEGER REFERENCES fund_master (id)')
+    # Link existing holdings to the first master fund with their name, as the name join did
+    conn.exec_driver_sql(
+        'UPDATE fund SET fund_master_id = ('
+        'SELECT fund_master.id FROM fund_master WHERE fund_master.fund_name = fund.fund_name '
+        'ORDER BY fund_master.id LIMIT 1'
+        ') WHERE fund_master_id IS NULL'
+    )
+    create_index(conn, 'ix_fund_fund_master_id', 'fund', ['fund_master_id'])
+
+
+@migration(5, 'fund master NAV scheme code')
+def _fund_master_scheme_code(conn):
+    add_column(conn, 'fund_master', 'scheme_code', 'VARCHAR(20)')
+    create_index(conn, 'ix_fund_master_scheme_code', 'fund_master', ['scheme_code'])
+
+
+@migration(6, 'unique master data keys and fund retirement')
+def _master_data_keys(conn):
+    add_column(conn, 'fund_master', 'retired_at', 'DATETIME')
+    # Upserts need unique keys: merge duplicate names into the first fund, as the name lookups did
+    conn.exec_driver_sql(
+        'UPDATE fund SET fund_master_id = ('
+        'SELECT MIN(first.id) FROM fund_master first JOIN fund_master duplicate '
+        'ON duplicate.fund_name = first.fund_name WHERE duplicate.id = fund.fund_master_id'
+        ') WHERE fund_master_id NOT IN (SELECT MIN(id) FROM fund_master GROUP BY fund_name)'
+    )
+    conn.exec_driver_sql(
+        'DELETE FROM fund_master WHERE id NOT IN (SELECT MIN(id) FROM fund_master GROUP BY fund_name)'
+    )
+    # The allocation matrix took the last row of a duplicated pair
+    conn.exec_driver_sql(
+        'DELETE FROM asset_allocation WHERE id NOT IN '
+        '(SELECT MAX(id) FROM asset_allocation GROUP BY risk_profile, asset_class)'
+    )
+    for name, table, columns in [
+        ('ix_fund_master_fund_name', 'fund_master', ['fund_name']),
+        ('ix_asset_allocation_risk_profile_asset_class', 'asset_allocation', ['risk_profile', 'asset_class']),
+    ]:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+        conn.exec_driver_sql(f"CREATE UNIQUE INDEX {name} ON {table} ({', '.join(columns)})")
+
+
+@migration(7, 'job retries')
+def _job_retries(conn):
+    add_column(conn, 'job', 'retries', 'INTEGER NOT NULL DEFAULT 0')
+    add_column(conn, 'job', 'retry_at', 'DATETIME')
+
+
+# Runner
+def ensure_version_table(conn):
+    conn.exec_driver_sql(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME NOT NULL)'
+    )
+
+
+def applied_versions(engine):
+    """Set of migration versions recorded as applied; only reads the database"""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table('schema_migrations'):
+            return set()
+        return {row[0] for row in conn.exec_driver_sql('SELECT version FROM schema_migrations')}
+
+
+def current_version(engine):
+    return max(applied_versions(engine), default=0)
+
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+def migrate(engine):
+    """Apply pending migrations in order; returns the (version, name) pairs applied"""
+    with engine.begin() as conn:
+        ensure_version_table(conn)
+    applied = applied_versions(engine)
+    done = []
+    for version, name, func in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+                {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+            )
+        done.append((version, name))
+    return done
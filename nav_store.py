@@ -0,0 +1,302 @@
+"""Append-only NAV history per scheme, stored as memory-mapped columns.
+
+Every scheme has two flat files in the store directory: ``<code>.dates``
+(int64 days since 1970-01-01) and ``<code>.nav`` (float64), both in date
+order. ``manifest.json`` records each scheme's name, observation count and
+date range plus a store version bumped on every save. Readers map only the
+first ``count`` values of each file, so bytes appended by an ingest that has
+not saved its manifest yet are never seen, and a crashed ingest is trimmed
+back to the manifest before the next append. Only one ingest should write a
+store at a time.
+
+NAV files are read in the semicolon-separated AMFI format (the daily
+``NAVAll.txt`` and the historical NAV report), located by their header row.
+Return analytics work on the mapped arrays directly: CAGR, rolling returns,
+volatility of daily log returns and maximum drawdown, all in percent.
+"""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+DAYS_PER_YEAR = 365.25
+
+
+# AMFI NAV files
+def parse_amfi(lines):
+    """Yield ``(scheme_code, scheme_name, date, nav)`` from the lines of an AMFI NAV file.
+
+    Section headings and rows without a NAV (``N.A.``) are skipped; raises
+    ValueError when no header row is found.
+    """
+    columns = None
+    parsed_dates = {}
+    for line in lines:
+        if ';' not in line:
+            continue
+        fields = [field.strip() for field in line.split(';')]
+        if fields[0].lower() == 'scheme code':
+            names = [field.lower() for field in fields]
+            columns = (names.index('scheme code'), names.index('scheme name'),
+                       names.index('net asset value'), names.index('date'))
+            continue
+        if columns is None:
+            continue
+        code, name, nav, date = columns
+        try:
+            value = float(fields[nav])
+            text = fields[date]
+            day = parsed_dates.get(text)
+            if day is None:
+                # A file repeats the same few dates for every scheme
+                day = parsed_dates[text] = datetime.strptime(text, '%d-%b-%Y').date()
+        except (ValueError, IndexError):
+            continue
+        if value > 0:
+            yield fields[code], fields[name], day, value
+    if columns is None:
+        raise ValueError('Not an AMFI NAV file: no "Scheme Code" header row')
+
+
+def ingest_amfi(store, paths):
+    """Append the NAVs of AMFI files at ``paths`` to ``store`` and save it; returns a report"""
+    schemes = {}
+    rows = 0
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as stream:
+            for code, name, day, nav in parse_amfi(stream):
+                entry = schemes.setdefault(code, [name, [], []])
+                entry[0] = name
+                entry[1].append(day)
+                entry[2].append(nav)
+                rows += 1
+    appended = sum(store.append(code, name, dates, navs) for code, (name, dates, navs) in schemes.items())
+    store.save()
+    return {'rows': rows, 'schemes': len(schemes), 'appended': appended, 'version': store.version}
+
+
+# Analytics on (dates, navs) arrays
+def _days(dates):
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def _window_start(days, ends, years):
+    """Index of the last observation at least ``years`` before each of ``ends`` (-1 if none)"""
+    return np.searchsorted(days, ends - int(round(years * DAYS_PER_YEAR)), side='right') - 1
+
+
+def cagr(dates, navs, years=None):
+    """Annualised return over the last ``years`` (or the whole history), or None"""
+    days = _days(dates)
+    if len(days) < 2:
+        return None
+    start = 0
+    if years is not None:
+        start = int(_window_start(days, days[-1:], years)[0])
+        if start < 0:
+            return None
+    span = days[-1] - days[start]
+    if span <= 0:
+        return None
+    return float(((navs[-1] / navs[start]) ** (DAYS_PER_YEAR / span) - 1) * 100)
+
+
+def rolling_returns(dates, navs, years):
+    """Annualised return of every ``years`` window ending at an observation"""
+    days = _days(dates)
+    navs = np.asarray(navs, dtype=float)
+    starts = _window_start(days, days, years)
+    ends = np.flatnonzero(starts >= 0)
+    starts = starts[ends]
+    span = days[ends] - days[starts]
+    return ((navs[ends] / navs[starts]) ** (DAYS_PER_YEAR / span) - 1) * 100
+
+
+def volatility(dates, navs, years=None):
+    """Annualised volatility of log returns over the last ``years`` (or all), or None"""
+    days = _days(dates)
+    navs = np.asarray(navs, dtype=float)
+    if years is not None:
+        start = max(int(_window_start(days, days[-1:], years)[0]), 0)
+        days, navs = days[start:], navs[start:]
+    if len(days) < 3 or days[-1] == days[0]:
+        return None
+    returns = np.diff(np.log(navs))
+    per_year = len(returns) / ((days[-1] - days[0]) / DAYS_PER_YEAR)
+    return float(returns.std(ddof=1) * np.sqrt(per_year) * 100)
+
+
+def max_drawdown(navs):
+    """Largest peak-to-trough fall, in percent"""
+    navs = np.asarray(navs, dtype=float)
+    if len(navs) == 0:
+        return None
+    return float((1 - (navs / np.maximum.accumulate(navs)).min()) * 100)
+
+
+class NavStore:
+    """Directory of per-scheme NAV columns"""
+
+    def __init__(self, path):
+        self.path = path
+        self._manifest = None
+        self._manifest_mtime = None
+        self._series = {}
+
+    # Manifest
+    def _manifest_path(self):
+        return os.path.join(self.path, MANIFEST)
+
+    def reload(self):
+        """Re-read the manifest if another process saved the store since it was read"""
+        try:
+            mtime = os.stat(self._manifest_path()).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._manifest is None or mtime != self._manifest_mtime:
+            manifest = {'version': 0, 'schemes': {}}
+            if mtime is not None:
+                with open(self._manifest_path(), encoding='utf-8') as stream:
+                    manifest = json.load(stream)
+            self._manifest = manifest
+            self._manifest_mtime = mtime
+            self._series = {}
+        return self
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self.reload()
+        return self._manifest
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+    def schemes(self):
+        """scheme code -> {'name', 'count', 'first', 'last'}"""
+        return self.manifest['schemes']
+
+    def __contains__(self, code):
+        return code in self.schemes()
+
+    def save(self):
+        """Write the manifest atomically and bump the store version"""
+        os.makedirs(self.path, exist_ok=True)
+        self.manifest['version'] += 1
+        temporary = self._manifest_path() + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as stream:
+            json.dump(self.manifest, stream, indent=1, sort_keys=True)
+        os.replace(temporary, self._manifest_path())
+        self._manifest_mtime = os.stat(self._manifest_path()).st_mtime_ns
+
+    # Columns
+    def _files(self, code):
+        base = os.path.join(self.path, code)
+        return base + '.dates', base + '.nav'
+
+    def series(self, code):
+        """(dates as datetime64[D], navs) mapped read-only, or None for an unknown scheme"""
+        entry = self.schemes().get(code)
+        if entry is None or entry['count'] == 0:
+            return None
+        cached = self._series.get(code)
+        if cached is None or len(cached[1]) != entry['count']:
+            dates_file, nav_file = self._files(code)
+            count = entry['count']
+            cached = (np.memmap(dates_file, dtype='datetime64[D]', mode='r', shape=(count,)),
+                      np.memmap(nav_file, dtype=np.float64, mode='r', shape=(count,)))
+            self._series[code] = cached
+        return cached
+
+    def append(self, code, name, dates, navs):
+        """Append observations later than the scheme's last date; returns how many were added.
+
+        Call save() afterwards to make them visible.
+        """
+        if not code.isalnum():
+            raise ValueError(f'Invalid scheme code: {code!r}')
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        navs = np.asarray(navs, dtype=np.float64)
+        order = np.argsort(dates, kind='stable')
+        dates, navs = dates[order], navs[order]
+        # One observation per date, the last one given
+        last_of_day = np.append(dates[1:] != dates[:-1], True)
+        dates, navs = dates[last_of_day], navs[last_of_day]
+
+        entry = self.schemes().setdefault(code, {'name': name, 'count': 0, 'first': None, 'last': None})
+        entry['name'] = name
+        if entry['last'] is not None:
+            newer = dates > np.datetime64(entry['last'])
+            dates, navs = dates[newer], navs[newer]
+        if len(dates) == 0:
+            return 0
+
+        os.makedirs(self.path, exist_ok=True)
+        self._series.pop(code, None)
+        for path, values in zip(self._files(code), (dates.astype(np.int64), navs)):
+            with open(path, 'ab') as stream:
+                # Drop anything past the manifest left by an interrupted ingest
+                stream.truncate(entry['count'] * 8)
+                stream.write(values.tobytes())
+        entry['count'] += len(dates)
+        entry['first'] = entry['first'] or str(dates[0])
+        entry['last'] = str(dates[-1])
+        return len(dates)
+
+    def nav_on(self, code, dates):
+        """(navs, nav dates) of the last observation on or before each date.
+
+        Dates before the first observation get the first one. Returns None
+        for an unknown scheme.
+        """
+        series = self.series(code)
+        if series is None:
+            return None
+        scheme_dates, navs = series
+        wanted = np.asarray(dates, dtype='datetime64[D]')
+        positions = np.maximum(np.searchsorted(scheme_dates, wanted, side='right') - 1, 0)
+        return np.asarray(navs[positions]), np.asarray(scheme_dates[positions])
+
+    # Analytics
+    def return_and_volatility(self, code, years=3):
+        """(CAGR, volatility) over ``years``; either is None without enough history"""
+        series = self.series(code)
+        if series is None:
+            return None, None
+        return cagr(*series, years), volatility(*series, years)
+
+    def metrics(self, code, years=3):
+        """Return analytics for a scheme over ``years``, or None for an unknown scheme"""
+        series = self.series(code)
+        if series is None:
+            return None
+        dates, navs = series
+        rolling = rolling_returns(dates, navs, years)
+        entry = self.schemes()[code]
+        return {
+            'scheme_code': code,
+            'scheme_name': entry['name'],
+            'first_date': entry['first'],
+            'last_date': entry['last'],
+            'observations': entry['count'],
+            'latest_nav': float(navs[-1]),
+            'years': years,
+            'cagr': _rounded(cagr(dates, navs, years)),
+            'cagr_since_inception': _rounded(cagr(dates, navs)),
+            'volatility': _rounded(volatility(dates, navs, years)),
+            'max_drawdown': _rounded(max_drawdown(navs)),
+            'rolling_return': {
+                'mean': _rounded(rolling.mean()) if len(rolling) else None,
+                'median': _rounded(np.median(rolling)) if len(rolling) else None,
+                'min': _rounded(rolling.min()) if len(rolling) else None,
+                'max': _rounded(rolling.max()) if len(rolling) else None,
+                'windows': int(len(rolling))
+            }
+        }
+
+
+def _rounded(value, digits=4):
+    return None if value is None else round(float(value), digits)
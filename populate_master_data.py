@@ -1,4 +1,4 @@
-from app import db, FundMaster, AssetAllocation
+from app import db, load_asset_allocation, load_fund_master
 
 # --- Master Fund List ---
 fund_list = [
@@ -52,23 +52,19 @@ allocation_matrix = [
 ]
 
 def populate_fund_master():
-    for fund in fund_list:
-        exists = FundMaster.query.filter_by(fund_name=fund["fund_name"]).first()
-        if not exists:
-            db.session.add(FundMaster(**fund))
-    db.session.commit()
-    print(f"Inserted {len(fund_list)} funds into FundMaster table.")
+    # The seed list only covers its own funds; funds loaded from a scheme master are kept
+    counts = load_fund_master(fund_list, retire=False)
+    print(f"FundMaster: {counts['inserted']} funds inserted, {counts['updated']} updated.")
 
 def populate_asset_allocation():
-    for row in allocation_matrix:
-        exists = AssetAllocation.query.filter_by(risk_profile=row["risk_profile"], asset_class=row["asset_class"]).first()
-        if not exists:
-            db.session.add(AssetAllocation(**row))
-    db.session.commit()
-    print(f"Inserted {len(allocation_matrix)} asset allocations.")
+    changed = load_asset_allocation(allocation_matrix)
+    print(f"AssetAllocation: {changed} of {len(allocation_matrix)} rows inserted or updated.")
 
 if __name__ == "__main__":
-    from app import app
+    from app import app, upgrade_database
     with app.app_context():
+        db.create_all()
+        upgrade_database()
+        # Writes bump the reference data version, so running app processes reload their cache
         populate_fund_master()
         populate_asset_allocation()
@@ -0,0 +1,139 @@
+"""Portfolio drift detection and rebalancing trades.
+
+A saved portfolio drifts from the investor's target allocation as holdings
+change. ``rebalance`` compares the holdings of one portfolio, grouped by the
+asset class of their FundMaster row, with the target percentages and, when
+any class is off by at least the drift threshold, returns the fewest trades
+that restore the target at the portfolio's current value: each overweight
+class is sold from its largest holdings first, each underweight class is
+bought into its best existing holding (or the best affordable fund of the
+class when it holds none). Holdings without a FundMaster row have no asset
+class and are left out of the rebalance.
+
+``scan`` runs ``rebalance`` over many portfolios, chunk by chunk, optionally
+across a process pool; every worker receives the reference data snapshot
+once when it starts.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+Holding = namedtuple('Holding', ['fund_id', 'fund_name', 'asset_class', 'amount', 'expected_return'])
+
+# A scan item: an investor's current portfolio, risk tolerance and the row version it was read at
+ScanItem = namedtuple('ScanItem', ['investor_id', 'investor_row_version', 'portfolio_id', 'risk_tolerance', 'holdings'])
+
+
+def rebalance(holdings, allocation, snapshot, threshold=5.0, min_trade=0.0):
+    """Drift per asset class and the trades that bring ``holdings`` back to ``allocation``.
+
+    ``allocation`` maps asset class to target percentage. ``threshold`` is
+    the drift in percentage points that triggers a rebalance; per-class
+    differences below ``min_trade`` are not traded.
+    """
+    by_class = {}
+    current_amounts = {}
+    unclassified = 0.0
+    for holding in holdings:
+        if not holding.asset_class:
+            unclassified += holding.amount
+            continue
+        by_class.setdefault(holding.asset_class, []).append(holding)
+        current_amounts[holding.asset_class] = current_amounts.get(holding.asset_class, 0.0) + holding.amount
+    total = sum(current_amounts.values())
+
+    drift = []
+    differences = {}
+    for asset_class in list(allocation) + [c for c in by_class if c not in allocation]:
+        current = current_amounts.get(asset_class, 0.0)
+        target_percentage = allocation.get(asset_class, 0.0)
+        current_percentage = current / total * 100 if total > 0 else 0.0
+        differences[asset_class] = total * target_percentage / 100 - current
+        drift.append({
+            'asset_class': asset_class,
+            'current_amount': round(current, 2),
+            'current_percentage': round(current_percentage, 2),
+            'target_percentage': target_percentage,
+            'drift': round(current_percentage - target_percentage, 2)
+        })
+    max_drift = max((abs(d['drift']) for d in drift), default=0.0)
+    needs_rebalance = total > 0 and max_drift >= threshold
+
+    trades = []
+    if needs_rebalance:
+        for asset_class, difference in differences.items():
+            if abs(difference) < max(min_trade, 0.01):
+                continue
+            if difference < 0:
+                # Sell from the largest holdings first
+                remaining = -difference
+                for holding in sorted(by_class[asset_class], key=lambda h: (-h.amount, h.fund_id)):
+                    amount = min(remaining, holding.amount)
+                    trades.append(_trade('sell', asset_class, holding.fund_name, amount))
+                    remaining -= amount
+                    if remaining <= 0.005:
+                        break
+            else:
+                held = by_class.get(asset_class)
+                if held:
+                    fund_name = max(held, key=lambda h: (h.expected_return, h.amount, -h.fund_id)).fund_name
+                else:
+                    fund = snapshot.fund_index(asset_class).best_affordable(difference)
+                    if fund is None:
+                        continue
+                    fund_name = fund.fund_name
+                trades.append(_trade('buy', asset_class, fund_name, difference))
+
+    return {
+        'total_value': round(total, 2),
+        'unclassified_amount': round(unclassified, 2),
+        'max_drift': round(max_drift, 2),
+        'needs_rebalance': needs_rebalance,
+        'drift': drift,
+        'trades': trades
+    }
+
+
+def _trade(action, asset_class, fund_name, amount):
+    return {'action': action, 'asset_class': asset_class, 'fund_name': fund_name, 'amount': round(amount, 2)}
+
+
+# Scanning
+_worker_snapshot = None
+
+
+def _init_worker(snapshot):
+    global _worker_snapshot
+    _worker_snapshot = snapshot
+
+
+def rebalance_items(items, snapshot, threshold, min_trade):
+    """[(item, result)] for a list of ScanItems"""
+    return [
+        (item, rebalance(item.holdings, snapshot.allocation_for(item.risk_tolerance), snapshot, threshold, min_trade))
+        for item in items
+    ]
+
+
+def _rebalance_items_in_worker(items, threshold, min_trade):
+    return rebalance_items(items, _worker_snapshot, threshold, min_trade)
+
+
+def scan(chunks, snapshot, threshold=5.0, min_trade=0.0, workers=1):
+    """Yield ``rebalance_items`` results for each chunk of ScanItems, in chunk order.
+
+    With ``workers > 1`` chunks are rebalanced in a process pool, keeping at
+    most two chunks per worker in flight so ``chunks`` is consumed lazily.
+    """
+    if workers <= 1:
+        for items in chunks:
+            yield rebalance_items(items, snapshot, threshold, min_trade)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot,)) as pool:
+        pending = []
+        for items in chunks:
+            pending.append(pool.submit(_rebalance_items_in_worker, items, threshold, min_trade))
+            if len(pending) >= workers * 2:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
@@ -0,0 +1,194 @@
+"""Vectorized recommendation engine for batches of investors.
+
+Computes exactly the same payload as ``GET /api/recommendations/<id>`` but for
+a whole chunk of investors at once: the questionnaire, demographic scoring,
+risk categorisation, allocation amounts and fund picks are evaluated with
+NumPy/pandas column operations instead of one investor at a time.
+"""
+import numpy as np
+import pandas as pd
+
+import risk_scoring
+from risk_scoring import CATEGORY_CODES, CATEGORY_TOLERANCE, RISK_QUESTIONS
+
+# Investor columns the engine needs, in the order they are selected
+INVESTOR_COLUMNS = [
+    'id', 'name', 'age', 'education_level', 'occupation_type', 'annual_income_range',
+    'equity_experience', 'investment_horizon', 'financial_goals',
+    'monthly_income', 'monthly_expenses', 'existing_assets', 'existing_liabilities',
+    'emergency_fund', 'investment_amount', 'risk_score', 'risk_tolerance'
+] + RISK_QUESTIONS
+
+
+def _round(value, digits=2):
+    return round(float(value), digits)
+
+
+def recommendation_line(asset_class, fund, amount):
+    """One fund recommendation of a payload"""
+    return {
+        'asset_class': asset_class.replace('_', ' ').title(),
+        'fund_name': fund.fund_name,
+        'recommended_investment': _round(amount),
+        'expected_return': fund.expected_return
+    }
+
+
+def below_minimum_line(asset_class, amount, index):
+    """Recommendation line for an asset class amount below every fund's minimum investment"""
+    return {
+        'asset_class': asset_class.replace('_', ' ').title(),
+        'fund_name': None,
+        'recommended_investment': _round(amount),
+        'expected_return': None,
+        'below_minimum': True,
+        'min_investment': index.lowest_minimum().min_investment
+    }
+
+
+def recommend_frame(frame, snapshot, policy=None):
+    """Compute recommendation payloads for a chunk of investors.
+
+    ``frame`` holds INVESTOR_COLUMNS, ``snapshot`` is the reference data
+    snapshot and ``policy`` the optional fund SplitPolicy. Without the stored
+    ``risk_score`` and ``risk_tolerance`` columns (unsaved investors) the
+    computed ones are reported. Returns a list of ``(investor_id, payload, error)`` tuples in
+    frame order; ``payload`` matches ``GET /api/recommendations/<id>``.
+    """
+    n = len(frame)
+    if n == 0:
+        return []
+
+    computed_risk, valid = risk_scoring.risk_scores(risk_scoring.answer_codes(frame, RISK_QUESTIONS))
+    demo = risk_scoring.frame_demographic_scores(frame)
+    categories = risk_scoring.risk_categories(computed_risk, demo)
+
+    income = frame['monthly_income'].to_numpy(dtype=float)
+    expenses = frame['monthly_expenses'].to_numpy(dtype=float)
+    assets = frame['existing_assets'].to_numpy(dtype=float)
+    liabilities = frame['existing_liabilities'].to_numpy(dtype=float)
+    emergency = frame['emergency_fund'].to_numpy(dtype=float)
+    investment = frame['investment_amount'].to_numpy(dtype=float)
+
+    net_worth = assets - liabilities
+    surplus = income - expenses
+    positive_income = income > 0
+    dti = np.divide(liabilities, income, out=np.zeros(n), where=positive_income)
+    high_debt = dti > 0.4
+    low_emergency = emergency < (expenses * 6)
+    negative_surplus = surplus < 0
+
+    # Allocation amounts and fund picks, grouped by risk tolerance so every
+    # group shares one allocation vector
+    tolerances = pd.Series(categories).map(CATEGORY_TOLERANCE).to_numpy()
+    strategies = [None] * n
+    amounts = [None] * n
+    recommendations = [None] * n
+    for tolerance in pd.unique(tolerances):
+        rows = np.flatnonzero((tolerances == tolerance) & valid)
+        if len(rows) == 0:
+            continue
+        allocation = snapshot.allocation_for(tolerance)
+        asset_classes = list(allocation)
+        percentages = np.array([allocation[a] for a in asset_classes], dtype=float)
+        class_amounts = (investment[rows, None] * percentages[None, :]) / 100
+
+        # Fund picks via the per-class index: best affordable fund, or a below-minimum line.
+        # Amounts large enough to split go through FundIndex.allocate() row by row.
+        picks = {}
+        for j, asset_class in enumerate(asset_classes):
+            index = snapshot.fund_index(asset_class)
+            positions = index.select_positions(class_amounts[:, j])
+            split = np.zeros(len(rows), dtype=bool)
+            if policy is not None:
+                split = class_amounts[:, j] >= policy.min_amount
+            picks[asset_class] = (index, positions, split)
+
+        for i, row in enumerate(rows):
+            strategies[row] = allocation
+            amounts[row] = {a: float(class_amounts[i, j]) for j, a in enumerate(asset_classes)}
+            row_recommendations = []
+            for j, asset_class in enumerate(asset_classes):
+                index, positions, split = picks[asset_class]
+                amount = class_amounts[i, j]
+                if amount <= 0 or not len(index):
+                    continue
+                if split[i]:
+                    holdings = index.allocate(float(amount), policy)
+                elif positions[i] >= 0:
+                    holdings = [(index.funds[positions[i]], amount)]
+                else:
+                    holdings = []
+                if not holdings:
+                    row_recommendations.append(below_minimum_line(asset_class, amount, index))
+                for fund, fund_amount in holdings:
+                    row_recommendations.append(recommendation_line(asset_class, fund, fund_amount))
+            recommendations[row] = row_recommendations
+
+    if 'risk_score' not in frame:
+        frame = frame.assign(risk_score=computed_risk, risk_tolerance=tolerances)
+
+    # Built from column lists: to_dict('records') boxes every cell one at a
+    # time, which is slow for Arrow-backed string columns
+    names = list(frame.columns)
+    records = [dict(zip(names, values)) for values in zip(*(frame[name].tolist() for name in names))]
+    results = []
+    for i, investor in enumerate(records):
+        investor_id = int(investor['id'])
+        if not valid[i]:
+            results.append((investor_id, None, 'Invalid risk questionnaire answers'))
+            continue
+
+        financial_health = 'Good'
+        health_warnings = []
+        if high_debt[i]:
+            financial_health = 'Needs Attention'
+            health_warnings.append("High debt-to-income ratio. Consider reducing debt before investing.")
+        if low_emergency[i]:
+            financial_health = 'Needs Attention'
+            health_warnings.append("Insufficient emergency fund. Maintain 6 months of expenses as emergency fund.")
+        if negative_surplus[i]:
+            financial_health = 'Poor'
+            health_warnings.append("Monthly expenses exceed income. Focus on budgeting before investing.")
+
+        risk_score = int(investor['risk_score'])
+        demographic_score = int(demo[i])
+        category = str(categories[i])
+        payload = {
+            'investor_profile': {
+                'name': investor['name'],
+                'age': int(investor['age']),
+                'education_level': investor['education_level'],
+                'occupation_type': investor['occupation_type'],
+                'annual_income_range': investor['annual_income_range'],
+                'equity_experience': investor['equity_experience'],
+                'investment_horizon': investor['investment_horizon'],
+                'financial_goals': investor['financial_goals']
+            },
+            'risk_assessment': {
+                'risk_score': risk_score,
+                'demographic_score': demographic_score,
+                'combined_score': risk_score + demographic_score,
+                'risk_category': category,
+                'risk_category_code': CATEGORY_CODES[category],
+                'risk_tolerance': investor['risk_tolerance']
+            },
+            'asset_allocation': {
+                'strategy': strategies[i],
+                'amounts': {k: _round(v) for k, v in amounts[i].items()},
+                'total_investment': float(investment[i])
+            },
+            'financial_analysis': {
+                'monthly_income': float(income[i]),
+                'monthly_expenses': float(expenses[i]),
+                'monthly_surplus': float(surplus[i]),
+                'net_worth': float(net_worth[i]),
+                'debt_to_income_ratio': _round(dti[i] * 100) if positive_income[i] else 0,
+                'emergency_fund': float(emergency[i]),
+                'financial_health': financial_health,
+                'health_warnings': health_warnings
+            },
+            'recommendations': recommendations[i]
+        }
+        results.append((investor_id, payload, None))
+    return results
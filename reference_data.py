@@ -0,0 +1,215 @@
+"""In-process cache for the fund universe and the asset allocation matrix.
+
+FundMaster and AssetAllocation are small and change rarely, so each process
+keeps an immutable snapshot of both tables indexed by asset class and risk
+profile. Every write to either table bumps a version number stored in the
+database; the cache compares its snapshot version against it at most once per
+``check_interval`` seconds and reloads when another process (for example
+``populate_master_data.py``) has changed the data.
+
+A snapshot can also be saved to a compact JSON file and installed from it
+when a process starts, before it touches the database: the first version
+check then confirms the file instead of querying and indexing both tables.
+A server that preloads the snapshot before forking shares it with all its
+workers. A file written for another database or other settings is ignored.
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from fund_selection import FundIndex
+
+# ``volatility`` (annual, as a fraction) is only set for funds with NAV history
+FundRecord = namedtuple('FundRecord', [
+    'id', 'fund_name', 'asset_class', 'category',
+    'expected_return', 'risk_level', 'min_investment', 'scheme_code', 'volatility'
+], defaults=(None, None))
+
+DEFAULT_RISK_PROFILE = 'Conservative'
+SNAPSHOT_FILE_FORMAT = 1
+
+
+class ReferenceSnapshot:
+    """Immutable view of the reference tables at a given version"""
+
+    def __init__(self, version, funds, allocation_rows):
+        self.version = version
+        self.funds = tuple(funds)
+
+        funds_by_class = {}
+        funds_by_name = {}
+        for fund in self.funds:
+            funds_by_class.setdefault(fund.asset_class, []).append(fund)
+            # Keep the first fund for a name, matching query(...).first()
+            funds_by_name.setdefault(fund.fund_name, fund)
+        self.funds_by_class = {k: tuple(v) for k, v in funds_by_class.items()}
+        self.fund_indexes = {k: FundIndex(v) for k, v in self.funds_by_class.items()}
+        self.funds_by_name = funds_by_name
+
+        allocation_by_profile = {}
+        for risk_profile, asset_class, percentage in allocation_rows:
+            allocation_by_profile.setdefault(risk_profile, {})[asset_class] = percentage
+        self.allocation_by_profile = allocation_by_profile
+
+    def funds_for(self, asset_class):
+        """Funds of an asset class in FundMaster id order"""
+        return self.funds_by_class.get(asset_class, ())
+
+    def fund_index(self, asset_class):
+        """Precomputed selection index for an asset class"""
+        index = self.fund_indexes.get(asset_class)
+        if index is None:
+            index = FundIndex(())
+        return index
+
+    def fund_id(self, fund_name):
+        """FundMaster id of the first fund with this name, or None"""
+        fund = self.funds_by_name.get(fund_name)
+        return fund.id if fund else None
+
+    def allocation_for(self, risk_profile):
+        """Allocation percentages for a risk profile, falling back to Conservative"""
+        allocation = self.allocation_by_profile.get(risk_profile)
+        if not allocation:
+            allocation = self.allocation_by_profile.get(DEFAULT_RISK_PROFILE, {})
+        return dict(allocation)
+
+
+def write_snapshot_file(snapshot, path, key):
+    """Save ``snapshot`` to ``path`` atomically, tagged with ``key`` (a JSON-able dict)"""
+    document = {
+        'format': SNAPSHOT_FILE_FORMAT,
+        'key': key,
+        'version': snapshot.version,
+        'fund_fields': list(FundRecord._fields),
+        'funds': [list(fund) for fund in snapshot.funds],
+        'allocation': [
+            [risk_profile, asset_class, percentage]
+            for risk_profile, allocation in snapshot.allocation_by_profile.items()
+            for asset_class, percentage in allocation.items()
+        ]
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as stream:
+        json.dump(document, stream, separators=(',', ':'))
+    os.replace(temporary, path)
+
+
+def read_snapshot_file(path, key):
+    """ReferenceSnapshot saved at ``path`` for ``key``, or None if there is no usable file"""
+    try:
+        with open(path, encoding='utf-8') as stream:
+            document = json.load(stream)
+    except (OSError, ValueError):
+        return None
+    if (not isinstance(document, dict) or document.get('format') != SNAPSHOT_FILE_FORMAT
+            or document.get('key') != key or document.get('fund_fields') != list(FundRecord._fields)):
+        return None
+    try:
+        return ReferenceSnapshot(document['version'], [FundRecord(*fund) for fund in document['funds']],
+                                 document['allocation'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ReferenceDataCache:
+    """Versioned, thread-safe cache of FundMaster and AssetAllocation"""
+
+    def __init__(self, loader, version_reader, check_interval=5.0, on_store=None):
+        # loader() -> (fund records, (risk_profile, asset_class, percentage) rows)
+        # version_reader() -> current reference data version stored in the DB
+        # on_store(snapshot) is called with every snapshot loaded from the DB
+        self._loader = loader
+        self._version_reader = version_reader
+        self._on_store = on_store
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self.source = None
+        self.hits = 0
+        self.misses = 0
+        self.version_checks = 0
+        self.invalidations = 0
+
+    def snapshot(self):
+        """Return the current snapshot, reloading it if it is stale"""
+        snapshot = self.fresh()
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            snapshot = self.fresh()
+            if snapshot is not None:
+                return snapshot
+            version = self._version_reader()
+            snapshot = self.confirm(version)
+            if snapshot is None:
+                funds, allocation_rows = self._loader()
+                snapshot = self.store(version, funds, allocation_rows)
+            return snapshot
+
+    # The steps of snapshot(), for callers that read the database themselves
+    # (the async app) and serialise reloads with their own lock
+    def fresh(self):
+        """The snapshot if it was checked within ``check_interval``, else None"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            self.hits += 1
+            return snapshot
+        return None
+
+    def confirm(self, version):
+        """The snapshot if it is still at ``version`` (restarting the interval), else None"""
+        self.version_checks += 1
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            self._checked_at = time.monotonic()
+            self.hits += 1
+            return snapshot
+        return None
+
+    def store(self, version, funds, allocation_rows):
+        """Install a freshly loaded snapshot"""
+        snapshot = ReferenceSnapshot(version, funds, allocation_rows)
+        self._snapshot = snapshot
+        self._checked_at = time.monotonic()
+        self.source = 'database'
+        self.misses += 1
+        if self._on_store is not None:
+            self._on_store(snapshot)
+        return snapshot
+
+    def preload(self, snapshot):
+        """Install a snapshot read elsewhere; its version is checked on the next read"""
+        with self._lock:
+            self._snapshot = snapshot
+            self._checked_at = 0.0
+            self.source = 'file'
+
+    def invalidate(self):
+        """Drop the snapshot so the next read reloads from the database"""
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+            self.invalidations += 1
+
+    def stats(self):
+        """Hit/miss counters and the version of the cached snapshot"""
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version if snapshot is not None else None,
+            'source': self.source if snapshot is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'version_checks': self.version_checks,
+            'invalidations': self.invalidations,
+            'fund_count': len(snapshot.funds) if snapshot is not None else 0,
+            'risk_profiles': sorted(snapshot.allocation_by_profile) if snapshot is not None else [],
+            'check_interval': self.check_interval
+        }
@@ -0,0 +1,185 @@
+"""Risk profiling kernel shared by the Investor model and the batch paths.
+
+Scoring tables and the risk category matrix are built once at import time.
+Every rule has a scalar form for a single investor and an array form that
+scores a whole batch at once: questionnaire answers are encoded as a uint8
+matrix (A=1 .. D=4, 0 for an invalid answer) and scored with one matrix
+product, and categories are a gather from the category matrix.
+"""
+import numpy as np
+import pandas as pd
+
+ANSWER_SCORES = {'A': 1, 'B': 2, 'C': 3, 'D': 4}
+
+RISK_QUESTIONS = [f'risk_q{i}' for i in range(1, 13)]
+PROFILE_QUESTIONS = [f'profile_q{i}' for i in range(1, 8)]
+QUESTIONS = RISK_QUESTIONS + PROFILE_QUESTIONS
+
+# The questionnaire score is reported on a 120-480 scale
+RISK_SCORE_MULTIPLIER = 10
+
+EDUCATION_SCORES = {
+    'High School': 0,
+    'Some College but not graduate': 1,
+    'Graduate': 2,
+    'Post Graduate': 3
+}
+
+OCCUPATION_SCORES = {
+    'Retired': 0,
+    'Salaried – Govt': 1,
+    'Salaried – Private sector': 2,
+    'Self Employed': 3,
+    'Business': 4
+}
+
+INCOME_SCORES = {
+    'Upto Rs 5 lacs': 0,
+    'Between Rs 5 – 10 lacs': 1,
+    'Between Rs 10 20 lacs': 2,
+    'Between Rs 20 -50 lacs': 3,
+    'Above Rs 50 lacs': 4
+}
+
+EXPERIENCE_SCORES = {
+    'None': 0,
+    'Less than 3 years': 1,
+    'More than 3 years': 2
+}
+
+MAX_DEMOGRAPHIC_SCORE = 7
+
+CATEGORIES = ['Conservative Investor', 'Cautious Investor', 'Moderate Investor', 'Aggressive Investor']
+CATEGORY_CODES = {
+    'Conservative Investor': 'CON I',
+    'Cautious Investor': 'CAU I',
+    'Moderate Investor': 'MI',
+    'Aggressive Investor': 'AI'
+}
+CATEGORY_TOLERANCE = {
+    'Conservative Investor': 'Conservative',
+    'Cautious Investor': 'Cautious',
+    'Moderate Investor': 'Moderate',
+    'Aggressive Investor': 'Aggressive'
+}
+
+# Upper bounds (inclusive) of the risk score bands: <=150, <=200, <=300, 301 & above
+RISK_BAND_LIMITS = np.array([150, 200, 300])
+
+# Risk categorisation matrix: CATEGORY_MATRIX[band][demographic score 0-7]
+CON, CAU, MOD, AGG = range(4)
+CATEGORY_MATRIX = np.array([
+    [CON, CON, CON, CON, CON, CON, CAU, CAU],  # <= 150
+    [CON, CON, CAU, CAU, CAU, CAU, MOD, MOD],  # 151 - 200
+    [CAU, CAU, MOD, MOD, MOD, MOD, AGG, AGG],  # 201 - 300
+    [CAU, MOD, AGG, AGG, AGG, AGG, AGG, AGG],  # 301 & above
+], dtype=np.uint8)
+
+# Weights turning the 19 answer codes into (questionnaire score, profile score)
+SCORE_WEIGHTS = np.zeros((len(QUESTIONS), 2), dtype=np.int64)
+SCORE_WEIGHTS[:len(RISK_QUESTIONS), 0] = RISK_SCORE_MULTIPLIER
+SCORE_WEIGHTS[len(RISK_QUESTIONS):, 1] = 1
+
+
+# Single investor
+def risk_score(answers):
+    """Questionnaire score (120-480) for the 12 risk answers"""
+    return sum(ANSWER_SCORES[a] for a in answers) * RISK_SCORE_MULTIPLIER
+
+
+def profile_score(answers):
+    """Profile score (7-28) for the 7 profile answers"""
+    return sum(ANSWER_SCORES[a] for a in answers)
+
+
+def demographic_score(education_level, occupation_type, annual_income_range, equity_experience):
+    """Demographic score, capped at 7 as per the matrix"""
+    score = (
+        EDUCATION_SCORES.get(education_level, 0) +
+        OCCUPATION_SCORES.get(occupation_type, 0) +
+        INCOME_SCORES.get(annual_income_range, 0) +
+        EXPERIENCE_SCORES.get(equity_experience, 0)
+    )
+    return min(score, MAX_DEMOGRAPHIC_SCORE)
+
+
+def risk_band(score):
+    """Index of the risk score band"""
+    for band, limit in enumerate(RISK_BAND_LIMITS):
+        if score <= limit:
+            return band
+    return len(RISK_BAND_LIMITS)
+
+
+def risk_category(score, demo_score):
+    """(category, code) from the risk score and demographic score"""
+    category = CATEGORIES[CATEGORY_MATRIX[risk_band(score), demo_score]]
+    return category, CATEGORY_CODES[category]
+
+
+def risk_tolerance(category):
+    """Risk tolerance used to pick the asset allocation for a category"""
+    return CATEGORY_TOLERANCE[category]
+
+
+# Arrays of investors
+def encode_answers(answers):
+    """Encode an (n, k) array of answer letters as uint8 codes, 0 where invalid"""
+    letters = np.ascontiguousarray(answers, dtype='U2')
+    codepoints = letters.view(np.uint32).reshape(letters.shape + (2,))
+    first, rest = codepoints[..., 0], codepoints[..., 1]
+    valid = (rest == 0) & (first >= ord('A')) & (first <= ord('D'))
+    return np.where(valid, first - (ord('A') - 1), 0).astype(np.uint8)
+
+
+def answer_codes(frame, questions=QUESTIONS):
+    """uint8 answer matrix for the given question columns of a DataFrame"""
+    return encode_answers(frame[questions].fillna('').to_numpy(dtype=str))
+
+
+def score_answers(codes):
+    """Questionnaire and profile scores for an (n, 19) answer code matrix.
+
+    Returns ``(risk_scores, profile_scores, valid)``; rows with an invalid
+    answer have ``valid`` False and meaningless scores.
+    """
+    scores = codes.astype(np.int64) @ SCORE_WEIGHTS
+    return scores[:, 0], scores[:, 1], (codes != 0).all(axis=1)
+
+
+def risk_scores(codes):
+    """Questionnaire scores for an (n, 12) risk answer code matrix, plus validity"""
+    return (codes.astype(np.int64) @ SCORE_WEIGHTS[:len(RISK_QUESTIONS), 0],
+            (codes != 0).all(axis=1))
+
+
+def _lookup(values, table):
+    return pd.Series(values, dtype=object).map(table).fillna(0).to_numpy(dtype=np.int64)
+
+
+def demographic_scores(education_level, occupation_type, annual_income_range, equity_experience):
+    """Demographic scores for arrays of demographic answers"""
+    score = (
+        _lookup(education_level, EDUCATION_SCORES) +
+        _lookup(occupation_type, OCCUPATION_SCORES) +
+        _lookup(annual_income_range, INCOME_SCORES) +
+        _lookup(equity_experience, EXPERIENCE_SCORES)
+    )
+    return np.minimum(score, MAX_DEMOGRAPHIC_SCORE)
+
+
+def frame_demographic_scores(frame):
+    """Demographic scores for the demographic columns of a DataFrame"""
+    return demographic_scores(frame['education_level'], frame['occupation_type'],
+                              frame['annual_income_range'], frame['equity_experience'])
+
+
+def risk_category_indexes(scores, demo_scores):
+    """Category index (into CATEGORIES) for arrays of risk and demographic scores"""
+    bands = np.searchsorted(RISK_BAND_LIMITS, scores, side='left')
+    return CATEGORY_MATRIX[bands, np.asarray(demo_scores)]
+
+
+def risk_categories(scores, demo_scores):
+    """Category names for arrays of risk and demographic scores"""
+    return np.array(CATEGORIES, dtype=object)[risk_category_indexes(scores, demo_scores)]
@@ -0,0 +1,92 @@
+"""Production server for the mutual fund app.
+
+Creates and upgrades the database once in the parent process and loads the
+reference data snapshot there, then serves the app with several worker
+processes of several threads each: gunicorn (gthread workers) on
+Linux/macOS, waitress (threads only) on Windows. Forked workers share the
+parent's snapshot copy-on-write instead of each loading their own. With
+JOB_WORKERS set, every server process also runs that many background job
+threads, started after the fork.
+
+    python serve.py --bind 0.0.0.0:8000 --workers 4 --threads 8
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import sys
+
+from app import app, db, reference_data, start_job_workers, upgrade_database
+
+
+def prepare_database():
+    """Create missing tables and run upgrades before any worker starts"""
+    with app.app_context():
+        db.create_all()
+        upgrade_database()
+        reference_data.snapshot()
+        # Workers are forked from this process; they must open their own connections
+        db.engine.dispose()
+    # Keep the collector from touching (and so copying) the parent's objects in every worker
+    gc.freeze()
+
+
+def default_workers():
+    return min(multiprocessing.cpu_count() * 2 + 1, 8)
+
+
+def serve_gunicorn(bind, workers, threads, timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class GunicornServer(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    GunicornServer(app, {
+        'bind': bind,
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'timeout': timeout,
+        'post_worker_init': lambda worker: start_job_workers()
+    }).run()
+
+
+def serve_waitress(bind, threads):
+    from waitress import serve
+
+    start_job_workers()
+    serve(app, listen=bind, threads=threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the mutual fund app')
+    parser.add_argument('--bind', default=os.environ.get('BIND', '127.0.0.1:8000'),
+                        help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', default_workers())),
+                        help='worker processes (gunicorn only)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 8)),
+                        help='threads per worker')
+    parser.add_argument('--timeout', type=int, default=60, help='worker timeout in seconds')
+    parser.add_argument('--server', choices=['gunicorn', 'waitress'],
+                        default='waitress' if sys.platform == 'win32' else 'gunicorn')
+    args = parser.parse_args()
+
+    prepare_database()
+    if args.server == 'waitress':
+        serve_waitress(args.bind, args.threads)
+    else:
+        serve_gunicorn(args.bind, args.workers, args.threads, args.timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -35,41 +35,90 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // --- LOAD INVESTORS ---
-    function loadInvestors() {
-        fetch('/api/investors')
+    const INVESTOR_PAGE_SIZE = 50;
+    let nextAfterId = 0;
+    let hasMoreInvestors = true;
+    let loadingInvestors = false;
+    let sentinelVisible = false;
+    let investorsGeneration = 0;
+    let investorsRequest = null;
+
+    const investorsSentinel = document.createElement('div');
+    investorsSentinel.className = 'investors-sentinel';
+    investorsListDiv.after(investorsSentinel);
+
+    function createInvestorCard(investor) {
+        const investorCard = document.createElement('div');
+        investorCard.className = 'investor-card';
+        investorCard.setAttribute('data-investor-id', investor.id);
+        investorCard.innerHTML = `
+            <div class="investor-header">
+                <strong>${investor.name}</strong>
+            </div>
+            <div class="investor-details">
+                <p><strong>Email:</strong> ${investor.email}</p>
+                <p><strong>Risk Tolerance:</strong> ${investor.risk_tolerance}</p>
+                <p><strong>Risk Category:</strong> ${investor.risk_category} (${investor.risk_category_code})</p>
+            </div>
+            <div class="investor-actions">
+                <button class="save-portfolio-btn" data-investor-id="${investor.id}" disabled>Save Portfolio</button>
+                <button class="recommendation-btn" data-investor-id="${investor.id}">Get Recommendations</button>
+                <button class="view-portfolio-btn" data-investor-id="${investor.id}">View Portfolio</button>
+            </div>
+            <div class="message-area"></div>
+            <div class="investor-content" style="display:none;"></div>
+        `;
+        return investorCard;
+    }
+
+    // Fetch the next page of investors using the keyset cursor
+    function loadMoreInvestors() {
+        if (loadingInvestors || !hasMoreInvestors) return;
+        loadingInvestors = true;
+        // Responses from before the list was last reset are ignored
+        const generation = investorsGeneration;
+        investorsRequest = new AbortController();
+
+        fetch(`/api/investors?after_id=${nextAfterId}&limit=${INVESTOR_PAGE_SIZE}`, { signal: investorsRequest.signal })
             .then(response => response.json())
             .then(data => {
-                investorsListDiv.innerHTML = '';
-                data.forEach(investor => {
-                    const investorCard = document.createElement('div');
-                    investorCard.className = 'investor-card';
-                    investorCard.setAttribute('data-investor-id', investor.id);
-                    investorCard.innerHTML = `
-                        <div class="investor-header">
-                            <strong>${investor.name}</strong>
-                        </div>
-                        <div class="investor-details">
-                            <p><strong>Email:</strong> ${investor.email}</p>
-                            <p><strong>Risk Tolerance:</strong> ${investor.risk_tolerance}</p>
-                            <p><strong>Risk Category:</strong> ${investor.risk_category} (${investor.risk_category_code})</p>
-                        </div>
-                        <div class="investor-actions">
-                            <button class="save-portfolio-btn" data-investor-id="${investor.id}" disabled>Save Portfolio</button>
-                            <button class="recommendation-btn" data-investor-id="${investor.id}">Get Recommendations</button>
-                            <button class="view-portfolio-btn" data-investor-id="${investor.id}">View Portfolio</button>
-                        </div>
-                        <div class="message-area"></div>
-                        <div class="investor-content" style="display:none;"></div>
-                    `;
-                    investorsListDiv.appendChild(investorCard);
+                if (generation !== investorsGeneration) return;
+                data.investors.forEach(investor => {
+                    investorsListDiv.appendChild(createInvestorCard(investor));
                 });
+                hasMoreInvestors = data.has_more;
+                nextAfterId = data.next_after_id;
             })
             .catch(error => {
+                if (generation !== investorsGeneration) return;
                 console.error('Error loading investors:', error);
-                investorsListDiv.innerHTML = '<p class="error">Could not load investors.</p>';
+                hasMoreInvestors = false;
+                investorsListDiv.insertAdjacentHTML('beforeend', '<p class="error">Could not load investors.</p>');
+            })
+            .finally(() => {
+                if (generation !== investorsGeneration) return;
+                loadingInvestors = false;
+                // Keep filling while the sentinel is still on screen
+                if (hasMoreInvestors && sentinelVisible) loadMoreInvestors();
             });
     }
 
+    function loadInvestors() {
+        investorsGeneration++;
+        if (investorsRequest) investorsRequest.abort();
+        investorsListDiv.innerHTML = '';
+        nextAfterId = 0;
+        hasMoreInvestors = true;
+        loadingInvestors = false;
+        loadMoreInvestors();
+    }
+
+    // Infinite scrolling: load the next page when the end of the list scrolls into view
+    const investorsObserver = new IntersectionObserver(entries => {
+        sentinelVisible = entries.some(entry => entry.isIntersecting);
+        if (sentinelVisible) loadMoreInvestors();
+    }, { rootMargin: '200px' });
+
     // --- REGISTER INVESTOR ---
     function registerInvestor(e) {
         e.preventDefault();
@@ -142,8 +191,13 @@ document.addEventListener('DOMContentLoaded', function() {
                     htmlContent += `<table class="recommendation-table"><tr><th>Asset Class</th><th>Fund Name</th><th>Amount (₹)</th><th>Return (%)</th></tr>`;
                     let total = 0;
                     data.recommendations.forEach(r => {
-                        total += r.recommended_investment;
                         const formattedAssetClass = r.asset_class.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase());
+                        if (r.below_minimum) {
+                            // No fund's minimum investment fits this amount; it is not part of the portfolio
+                            htmlContent += `<tr><td>${formattedAssetClass}</td><td colspan="3">₹${formatNumber(r.recommended_investment)} is below the minimum investment of every fund (lowest ₹${formatNumber(r.min_investment)})</td></tr>`;
+                            return;
+                        }
+                        total += r.recommended_investment;
                         htmlContent += `<tr><td>${formattedAssetClass}</td><td>${r.fund_name}</td><td>₹${formatNumber(r.recommended_investment)}</td><td>${r.expected_return}</td></tr>`;
                     });
                     htmlContent += `<tr><td colspan="2" style="text-align:right;font-weight:bold;">Total Recommended Investment:</td><td style="font-weight:bold;">₹${formatNumber(total)}</td><td></td></tr></table>`;
@@ -230,7 +284,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error('Could not check existing portfolio.');
             }
 
-            const newFunds = currentRecommendations.map(r => ({ fund_name: r.fund_name, amount: r.recommended_investment })).sort((a, b) => a.fund_name.localeCompare(b.fund_name));
+            const newFunds = currentRecommendations.filter(r => !r.below_minimum).map(r => ({ fund_name: r.fund_name, amount: r.recommended_investment })).sort((a, b) => a.fund_name.localeCompare(b.fund_name));
 
             if (JSON.stringify(savedFunds) === JSON.stringify(newFunds)) {
                 renderMessage(investorCard, 'No changes detected. Portfolio is already up-to-date.', 'success');
@@ -240,7 +294,7 @@ document.addEventListener('DOMContentLoaded', function() {
             renderMessage(investorCard, 'Saving new portfolio...', 'info');
             const portfolioData = {
                 name: `Portfolio for ${currentInvestorId} - ${new Date().toISOString().split('T')[0]}`,
-                funds: currentRecommendations.map(rec => ({
+                funds: currentRecommendations.filter(rec => !rec.below_minimum).map(rec => ({
                     fund_name: rec.fund_name,
                     amount: rec.recommended_investment,
                     expected_return: rec.expected_return
@@ -270,6 +324,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // --- INITIALIZATION & EVENT LISTENERS ---
     loadInvestors();
+    investorsObserver.observe(investorsSentinel);
     investorForm.addEventListener('submit', registerInvestor);
 
     investorsListDiv.addEventListener('click', e => {
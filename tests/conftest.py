@@ -0,0 +1,79 @@
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+# The app reads its configuration at import: point it at an in-memory database
+# and keep it away from the instance directory and the background job workers
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+os.environ['REFERENCE_SNAPSHOT_PATH'] = ''
+os.environ['JOB_WORKERS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INVESTOR_FIELDS = {
+    'name': 'Test Investor', 'age': 50, 'education_level': 'Graduate', 'occupation_type': 'Salaried-Private',
+    'annual_income_range': 'Above 25 Lakhs', 'monthly_income': 300000.0, 'monthly_expenses': 200000.0,
+    'existing_assets': 50000000.0, 'existing_liabilities': 5000000.0, 'emergency_fund': 100000.0,
+    'investment_amount': 100000.0, 'investment_horizon': 'Medium', 'required_return': 12.0,
+    'equity_experience': 'More than 3 years', 'financial_goals': 'retirement',
+    'risk_q1': 'B', 'risk_q2': 'D', 'risk_q3': 'B', 'risk_q4': 'C', 'risk_q5': 'D', 'risk_q6': 'D',
+    'risk_q7': 'C', 'risk_q8': 'C', 'risk_q9': 'C', 'risk_q10': 'B', 'risk_q11': 'C', 'risk_q12': 'B',
+    'profile_q1': 'C', 'profile_q2': 'B', 'profile_q3': 'B', 'profile_q4': 'C', 'profile_q5': 'C',
+    'profile_q6': 'B', 'profile_q7': 'C'
+}
+
+
+@pytest.fixture
+def app():
+    from app import app as flask_app, db, ensure_database
+
+    with flask_app.app_context():
+        db.create_all()
+        # Migrated once per process, before any test counts statements
+        ensure_database()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_investor(app):
+    from app import Investor, db
+
+    def make(email, **fields):
+        investor = Investor(**dict(INVESTOR_FIELDS, email=email, **fields))
+        investor.risk_score = investor.calculate_risk_score()
+        investor.profile_score = investor.calculate_profile_score()
+        investor.combined_score = investor.calculate_combined_score()
+        investor.risk_tolerance = investor.determine_risk_tolerance()
+        db.session.add(investor)
+        db.session.commit()
+        return investor
+    return make
+
+
+@pytest.fixture
+def count_statements(app):
+    """Context manager collecting the SQL statements executed inside it"""
+    from app import db
+
+    @contextmanager
+    def counting():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return counting
@@ -0,0 +1,18 @@
+from sqlalchemy import create_engine, inspect
+
+import migrations
+
+
+def test_status_only_reads(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "status.db"}')
+
+    assert migrations.current_version(engine) == 0
+    assert [version for version, _ in migrations.pending_migrations(engine)] == [m[0] for m in migrations.MIGRATIONS]
+    assert inspect(engine).get_table_names() == []
+
+
+def test_migrated_database_has_nothing_pending(app):
+    from app import db
+
+    assert migrations.pending_migrations(db.engine) == []
+    assert migrations.current_version(db.engine) == migrations.MIGRATIONS[-1][0]
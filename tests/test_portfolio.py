@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import Fund, FundMaster, Portfolio, db
+
+
+def add_portfolio(investor, fund_count, created_at=None):
+    portfolio = Portfolio(investor_id=investor.id, name=f'{fund_count} funds',
+                          created_at=created_at or datetime.utcnow())
+    db.session.add(portfolio)
+    db.session.flush()
+    for i in range(fund_count):
+        master = db.session.scalar(db.select(FundMaster).where(FundMaster.fund_name == f'Fund {i}'))
+        if master is None:
+            master = FundMaster(fund_name=f'Fund {i}', asset_class='equity' if i % 2 else 'gold',
+                                expected_return=10.0, min_investment=1000.0)
+            db.session.add(master)
+            db.session.flush()
+        db.session.add(Fund(portfolio_id=portfolio.id, fund_master_id=master.id, fund_name=master.fund_name,
+                            amount=1000.0 * (i + 1), expected_return=10.0))
+    db.session.commit()
+    return portfolio
+
+
+def get_portfolio(client, count_statements, investor_id):
+    db.session.remove()
+    with count_statements() as statements:
+        response = client.get(f'/api/portfolio/{investor_id}')
+    return response, statements
+
+
+@pytest.mark.parametrize('fund_count', [1, 25])
+def test_get_portfolio_runs_one_statement(client, make_investor, count_statements, fund_count):
+    investor = make_investor(f'investor{fund_count}@example.com')
+    add_portfolio(investor, fund_count)
+
+    response, statements = get_portfolio(client, count_statements, investor.id)
+
+    assert response.status_code == 201
+    assert len(response.get_json()['funds']) == fund_count
+    assert len(statements) == 1, statements
+
+
+def test_statement_count_does_not_grow_with_funds(client, make_investor, count_statements):
+    counts = []
+    for fund_count in (1, 5, 50):
+        investor = make_investor(f'growth{fund_count}@example.com')
+        add_portfolio(investor, fund_count)
+        response, statements = get_portfolio(client, count_statements, investor.id)
+        assert response.status_code == 201
+        counts.append(len(statements))
+    assert len(set(counts)) == 1, counts
+
+
+def test_get_portfolio_returns_latest_with_asset_classes(client, make_investor):
+    investor = make_investor('latest@example.com')
+    add_portfolio(investor, 1, datetime.utcnow() - timedelta(days=1))
+    latest = add_portfolio(investor, 3)
+
+    funds = client.get(f'/api/portfolio/{investor.id}').get_json()['funds']
+
+    assert client.get(f'/api/portfolio/{investor.id}').get_json()['portfolio_id'] == latest.id
+    assert [f['fund_name'] for f in funds] == ['Fund 0', 'Fund 1', 'Fund 2']
+    assert [f['asset_class'] for f in funds] == ['gold', 'equity', 'gold']
+
+
+def test_fund_without_master_row_is_not_an_error(client, make_investor):
+    investor = make_investor('unlisted@example.com')
+    portfolio = add_portfolio(investor, 0)
+    db.session.add(Fund(portfolio_id=portfolio.id, fund_name='Unlisted Fund', amount=500.0, expected_return=8.0))
+    db.session.commit()
+
+    response = client.get(f'/api/portfolio/{investor.id}')
+
+    assert response.status_code == 201
+    assert response.get_json()['funds'][0]['asset_class'] == 'N/A'
+
+
+def test_missing_portfolio_is_404(client, make_investor):
+    investor = make_investor('none@example.com')
+    with client:
+        assert client.get(f'/api/portfolio/{investor.id}').status_code == 404
+
+
+def test_diff_of_a_single_portfolio_is_against_an_empty_one(client, make_investor):
+    investor = make_investor('single@example.com')
+    add_portfolio(investor, 2)
+
+    response = client.get(f'/api/portfolios/{investor.id}/diff')
+
+    assert response.status_code == 200
+    diff = response.get_json()
+    assert diff['from'] is None
+    assert diff['to']['version'] == 1
+    assert diff['total_amount_change'] == 3000.0
+    assert diff['weighted_expected_return_change'] is None
+    assert [(f['fund_name'], f['status'], f['change']) for f in diff['funds']] == [
+        ('Fund 0', 'added', 1000.0), ('Fund 1', 'added', 2000.0)]
+
+
+def test_diff_defaults_to_latest_against_previous(client, make_investor):
+    investor = make_investor('two@example.com')
+    add_portfolio(investor, 1, datetime.utcnow() - timedelta(days=1))
+    add_portfolio(investor, 2)
+
+    diff = client.get(f'/api/portfolios/{investor.id}/diff').get_json()
+
+    assert (diff['from']['version'], diff['to']['version']) == (1, 2)
+    assert [(f['fund_name'], f['status']) for f in diff['funds']] == [('Fund 0', 'unchanged'), ('Fund 1', 'added')]
+
+
+@pytest.mark.parametrize('query', ['from=0', 'from=2', 'to=2', 'from=1&to=3'])
+def test_diff_of_missing_requested_version_is_404(client, make_investor, query):
+    investor = make_investor('missing@example.com')
+    add_portfolio(investor, 1)
+
+    assert client.get(f'/api/portfolios/{investor.id}/diff?{query}').status_code == 404
+
+
+def test_diff_without_portfolios_is_404(client, make_investor):
+    investor = make_investor('empty@example.com')
+
+    assert client.get(f'/api/portfolios/{investor.id}/diff').status_code == 404
+
+
+def recommendation(fund_name, amount):
+    return {'asset_class': 'Equity', 'fund_name': fund_name, 'recommended_investment': amount,
+            'expected_return': 10.0 if fund_name else None}
+
+
+def test_create_portfolio_saves_fund_lines(client, make_investor):
+    investor = make_investor('create@example.com')
+    below_minimum = dict(recommendation(None, 500.0), below_minimum=True, min_investment=1000.0)
+
+    response = client.post(f'/api/portfolio/{investor.id}',
+                           json={'recommendations': [recommendation('Fund 0', 5000.0), below_minimum]})
+
+    assert response.status_code == 201
+    funds = client.get(f'/api/portfolio/{investor.id}').get_json()['funds']
+    assert [(f['fund_name'], f['amount']) for f in funds] == [('Fund 0', 5000.0)]
+
+
+@pytest.mark.parametrize('body', [
+    [recommendation('Fund 0', 5000.0)],
+    'recommendations',
+    {},
+    {'recommendations': []},
+    {'recommendations': 'Fund 0'},
+    {'recommendations': [dict(recommendation(None, 500.0), below_minimum=True)]},
+])
+def test_create_portfolio_without_fund_lines_is_400(client, make_investor, body):
+    investor = make_investor('invalid@example.com')
+
+    response = client.post(f'/api/portfolio/{investor.id}', json=body)
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert db.session.scalar(db.select(db.func.count()).select_from(Portfolio)) == 0
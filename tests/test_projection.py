@@ -0,0 +1,31 @@
+import pytest
+
+from app import Fund, FundMaster, Portfolio, db
+from projection import horizon_years
+
+
+@pytest.mark.parametrize('horizon, years', [('Short', 3), ('Medium', 7), ('Long', 10)])
+def test_stored_horizons_map_to_their_ranges(horizon, years):
+    assert horizon_years(horizon) == years
+
+
+@pytest.mark.parametrize('horizon, years', [('long', 10), ('3-5 years', 5), ('7+ years', 7), ('', 5), (None, 5)])
+def test_other_horizons_fall_back_to_digits_or_default(horizon, years):
+    assert horizon_years(horizon) == years
+
+
+@pytest.mark.parametrize('horizon, years', [('Short', 3), ('Medium', 7), ('Long', 10)])
+def test_projection_defaults_to_the_investor_horizon(client, make_investor, horizon, years):
+    investor = make_investor(f'{horizon.lower()}@example.com', investment_horizon=horizon)
+    master = FundMaster(fund_name='Index Fund', asset_class='equity', expected_return=12.0, min_investment=500.0)
+    portfolio = Portfolio(investor_id=investor.id, name='Projected')
+    db.session.add_all([master, portfolio])
+    db.session.flush()
+    db.session.add(Fund(portfolio_id=portfolio.id, fund_master_id=master.id, fund_name=master.fund_name,
+                        amount=10000.0, expected_return=12.0))
+    db.session.commit()
+
+    response = client.get(f'/api/portfolio/{investor.id}/projection?paths=100&seed=1')
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['horizon_years'] == years
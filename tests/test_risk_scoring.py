@@ -0,0 +1,223 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import risk_scoring
+from risk_scoring import (CATEGORY_CODES, CATEGORY_TOLERANCE, EDUCATION_SCORES, EXPERIENCE_SCORES, INCOME_SCORES,
+                          OCCUPATION_SCORES, PROFILE_QUESTIONS, RISK_QUESTIONS)
+
+LETTERS = np.array(list('ABCD'))
+SAMPLE_SIZE = 100000
+
+
+class ReferenceInvestor:
+    """The if/elif scoring the Investor model used before risk_scoring existed"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def calculate_risk_score(self):
+        score_map = {'A': 1, 'B': 2, 'C': 3, 'D': 4}
+        total_score = (
+            score_map[self.risk_q1] + score_map[self.risk_q2] + score_map[self.risk_q3] +
+            score_map[self.risk_q4] + score_map[self.risk_q5] + score_map[self.risk_q6] +
+            score_map[self.risk_q7] + score_map[self.risk_q8] + score_map[self.risk_q9] +
+            score_map[self.risk_q10] + score_map[self.risk_q11] + score_map[self.risk_q12]
+        )
+        return total_score * 10
+
+    def calculate_profile_score(self):
+        score_map = {'A': 1, 'B': 2, 'C': 3, 'D': 4}
+        return (
+            score_map[self.profile_q1] + score_map[self.profile_q2] + score_map[self.profile_q3] +
+            score_map[self.profile_q4] + score_map[self.profile_q5] + score_map[self.profile_q6] +
+            score_map[self.profile_q7]
+        )
+
+    def calculate_demographic_score(self):
+        score = 0
+        score += {'High School': 0, 'Some College but not graduate': 1, 'Graduate': 2,
+                  'Post Graduate': 3}.get(self.education_level, 0)
+        score += {'Retired': 0, 'Salaried – Govt': 1, 'Salaried – Private sector': 2, 'Self Employed': 3,
+                  'Business': 4}.get(self.occupation_type, 0)
+        score += {'Upto Rs 5 lacs': 0, 'Between Rs 5 – 10 lacs': 1, 'Between Rs 10 20 lacs': 2,
+                  'Between Rs 20 -50 lacs': 3, 'Above Rs 50 lacs': 4}.get(self.annual_income_range, 0)
+        score += {'None': 0, 'Less than 3 years': 1, 'More than 3 years': 2}.get(self.equity_experience, 0)
+        return min(score, 7)
+
+    def determine_risk_category(self):
+        risk_score = self.calculate_risk_score()
+        demo_score = self.calculate_demographic_score()
+        if risk_score <= 150:
+            if demo_score <= 5:
+                return 'Conservative Investor', 'CON I'
+            else:
+                return 'Cautious Investor', 'CAU I'
+        elif risk_score <= 200:
+            if demo_score <= 1:
+                return 'Conservative Investor', 'CON I'
+            elif demo_score <= 5:
+                return 'Cautious Investor', 'CAU I'
+            else:
+                return 'Moderate Investor', 'MI'
+        elif risk_score <= 300:
+            if demo_score <= 1:
+                return 'Cautious Investor', 'CAU I'
+            elif demo_score <= 5:
+                return 'Moderate Investor', 'MI'
+            else:
+                return 'Aggressive Investor', 'AI'
+        else:
+            if demo_score == 0:
+                return 'Cautious Investor', 'CAU I'
+            elif demo_score == 1:
+                return 'Moderate Investor', 'MI'
+            else:
+                return 'Aggressive Investor', 'AI'
+
+    def determine_risk_tolerance(self):
+        category, _ = self.determine_risk_category()
+        if 'Conservative' in category:
+            return 'Conservative'
+        elif 'Cautious' in category:
+            return 'Cautious'
+        elif 'Moderate' in category:
+            return 'Moderate'
+        else:
+            return 'Aggressive'
+
+
+def with_unknown(table):
+    # Unknown values score 0 in every implementation
+    return list(table) + ['Something else']
+
+
+DEMOGRAPHICS = list(itertools.product(with_unknown(EDUCATION_SCORES), with_unknown(OCCUPATION_SCORES),
+                                      with_unknown(INCOME_SCORES), with_unknown(EXPERIENCE_SCORES)))
+DEMOGRAPHIC_COLUMNS = ['education_level', 'occupation_type', 'annual_income_range', 'equity_experience']
+
+
+def answers_for_sum(total):
+    """12 risk answers adding up to ``total`` (12-48)"""
+    codes = [1] * 12
+    extra = total - 12
+    for i in range(12):
+        step = min(extra, 3)
+        codes[i] += step
+        extra -= step
+    return [str(LETTERS[c - 1]) for c in codes]
+
+
+@pytest.fixture(scope='module')
+def sample():
+    """Seeded sample of investor rows: random answers, cycling through every demographic combination"""
+    rng = np.random.default_rng(20240607)
+    answers = LETTERS[rng.integers(0, 4, size=(SAMPLE_SIZE, len(RISK_QUESTIONS) + len(PROFILE_QUESTIONS)))].tolist()
+    columns = RISK_QUESTIONS + PROFILE_QUESTIONS + DEMOGRAPHIC_COLUMNS
+    return [dict(zip(columns, row + list(DEMOGRAPHICS[i % len(DEMOGRAPHICS)]))) for i, row in enumerate(answers)]
+
+
+def reference_rows(rows):
+    return [ReferenceInvestor(**row) for row in rows]
+
+
+def test_scalar_and_array_scores_match_reference(sample):
+    frame = pd.DataFrame(sample)
+    references = reference_rows(sample)
+    expected_risk = [r.calculate_risk_score() for r in references]
+    expected_profile = [r.calculate_profile_score() for r in references]
+    expected_demo = [r.calculate_demographic_score() for r in references]
+    expected_category = [r.determine_risk_category() for r in references]
+    expected_tolerance = [r.determine_risk_tolerance() for r in references]
+
+    # Scalar forms
+    assert [risk_scoring.risk_score([row[q] for q in RISK_QUESTIONS]) for row in sample] == expected_risk
+    assert [risk_scoring.profile_score([row[q] for q in PROFILE_QUESTIONS]) for row in sample] == expected_profile
+    assert [risk_scoring.demographic_score(*(row[c] for c in DEMOGRAPHIC_COLUMNS)) for row in sample] == expected_demo
+    assert [risk_scoring.risk_category(s, d) for s, d in zip(expected_risk, expected_demo)] == expected_category
+
+    # Array forms
+    risk, profile, valid = risk_scoring.score_answers(risk_scoring.answer_codes(frame))
+    risk_only, risk_valid = risk_scoring.risk_scores(risk_scoring.answer_codes(frame, RISK_QUESTIONS))
+    demo = risk_scoring.frame_demographic_scores(frame)
+    categories = risk_scoring.risk_categories(risk, demo)
+    assert valid.all() and risk_valid.all()
+    assert risk.tolist() == risk_only.tolist() == expected_risk
+    assert profile.tolist() == expected_profile
+    assert demo.tolist() == expected_demo
+    assert [(c, CATEGORY_CODES[c]) for c in categories] == expected_category
+    assert [CATEGORY_TOLERANCE[c] for c in categories] == expected_tolerance
+
+
+def test_every_score_and_demographic_combination_matches_reference():
+    # The category depends on the risk score (120-480 in steps of 10) and
+    # the demographic answers only, so this covers the whole matrix
+    rows = []
+    for total in range(12, 49):
+        answers = dict(zip(RISK_QUESTIONS, answers_for_sum(total)))
+        for demographics in DEMOGRAPHICS:
+            rows.append(dict(answers, **dict(zip(DEMOGRAPHIC_COLUMNS, demographics))))
+    frame = pd.DataFrame(rows)
+
+    risk, valid = risk_scoring.risk_scores(risk_scoring.answer_codes(frame, RISK_QUESTIONS))
+    demo = risk_scoring.frame_demographic_scores(frame)
+    categories = risk_scoring.risk_categories(risk, demo)
+
+    assert valid.all()
+    for i, reference in enumerate(reference_rows(rows)):
+        expected = reference.determine_risk_category()
+        assert risk_scoring.risk_category(risk[i], demo[i]) == expected
+        assert (categories[i], CATEGORY_CODES[categories[i]]) == expected
+        assert risk_scoring.risk_tolerance(categories[i]) == reference.determine_risk_tolerance()
+
+
+def test_every_profile_combination_matches_reference():
+    combinations = list(itertools.product('ABCD', repeat=len(PROFILE_QUESTIONS)))
+    codes = risk_scoring.encode_answers(np.array(combinations))
+    profile = (codes.astype(np.int64) @ risk_scoring.SCORE_WEIGHTS[len(RISK_QUESTIONS):, 1])
+
+    for i, answers in enumerate(combinations):
+        expected = ReferenceInvestor(**dict(zip(PROFILE_QUESTIONS, answers))).calculate_profile_score()
+        assert risk_scoring.profile_score(answers) == profile[i] == expected
+
+
+def test_investor_model_matches_reference(app, sample):
+    from app import Investor
+
+    for row in sample[:2000]:
+        investor = Investor(**row)
+        reference = ReferenceInvestor(**row)
+        assert investor.calculate_risk_score() == reference.calculate_risk_score()
+        assert investor.calculate_profile_score() == reference.calculate_profile_score()
+        assert investor.calculate_demographic_score() == reference.calculate_demographic_score()
+        assert investor.determine_risk_category() == reference.determine_risk_category()
+        assert investor.determine_risk_tolerance() == reference.determine_risk_tolerance()
+
+
+def test_bulk_scoring_matches_reference(app, sample):
+    from app import score_investor_rows
+
+    rows = sample[:5000]
+    references = reference_rows(rows)
+    for row, reference in zip(score_investor_rows([dict(r) for r in rows]), references):
+        category = reference.determine_risk_category()
+        assert row['risk_score'] == reference.calculate_risk_score()
+        assert row['profile_score'] == reference.calculate_profile_score()
+        assert row['combined_score'] == reference.calculate_risk_score() + reference.calculate_profile_score()
+        assert row['demographic_score'] == reference.calculate_demographic_score()
+        assert (row['risk_category'], row['risk_category_code']) == category
+        assert row['risk_tolerance'] == reference.determine_risk_tolerance()
+
+
+@pytest.mark.parametrize('answer', ['', 'E', 'a', 'AB', None])
+def test_invalid_answers_are_flagged(answer):
+    answers = ['C'] * len(RISK_QUESTIONS)
+    answers[4] = answer
+    frame = pd.DataFrame([answers, ['C'] * len(RISK_QUESTIONS)], columns=RISK_QUESTIONS)
+
+    with pytest.raises((KeyError, TypeError)):
+        ReferenceInvestor(**dict(zip(RISK_QUESTIONS, answers))).calculate_risk_score()
+    _, valid = risk_scoring.risk_scores(risk_scoring.answer_codes(frame, RISK_QUESTIONS))
+    assert valid.tolist() == [False, True]
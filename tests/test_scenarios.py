@@ -0,0 +1,43 @@
+from app import AssetAllocation, FundMaster, db
+from conftest import INVESTOR_FIELDS
+
+BASE = {field: value for field, value in INVESTOR_FIELDS.items() if field != 'name'}
+
+
+def seed_reference_data():
+    for profile in ('Conservative', 'Cautious', 'Moderate', 'Aggressive'):
+        db.session.add(AssetAllocation(risk_profile=profile, asset_class='equity', percentage=100.0))
+    db.session.add(FundMaster(fund_name='Index Fund', asset_class='equity', expected_return=12.0,
+                              min_investment=500.0))
+    db.session.commit()
+
+
+def test_non_positive_amounts_are_per_scenario_errors(client):
+    seed_reference_data()
+
+    response = client.post('/api/scenarios', json={
+        'base': BASE,
+        'grid': {'investment_amount': [100000, 0, -5000], 'monthly_income': [300000, 0]}
+    })
+
+    assert response.status_code == 200
+    scenarios = response.get_json()['scenarios']
+    errors = {(s['parameters']['investment_amount'], s['parameters']['monthly_income']): s.get('errors')
+              for s in scenarios}
+    assert errors == {
+        (100000, 300000): None,
+        (100000, 0): ['monthly_income must be positive'],
+        (0, 300000): ['investment_amount must be positive'],
+        (0, 0): ['monthly_income must be positive', 'investment_amount must be positive'],
+        (-5000, 300000): ['investment_amount must be positive'],
+        (-5000, 0): ['monthly_income must be positive', 'investment_amount must be positive'],
+    }
+    [valid] = [s for s in scenarios if 'recommendation' in s]
+    amounts = [line['recommended_investment'] for line in valid['recommendation']['recommendations']]
+    assert amounts and all(amount > 0 for amount in amounts)
+
+
+def test_negative_balances_are_rejected(client):
+    response = client.post('/api/scenarios', json={'base': BASE, 'scenarios': [{'existing_liabilities': -1}]})
+
+    assert response.get_json()['scenarios'][0]['errors'] == ['existing_liabilities must not be negative']
@@ -0,0 +1,64 @@
+from datetime import date
+
+import pytest
+
+from nav_store import NavStore
+from valuation import Position, cash_flows, summarize, value_positions, xirr
+
+AS_OF = date(2024, 1, 1)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NavStore(str(tmp_path / 'nav'))
+    store.append('100', 'Index Fund', ['2022-01-01', '2023-01-01', '2024-01-01'], [10.0, 11.0, 12.0])
+    store.save()
+    return store
+
+
+def test_fund_with_nav_history_is_valued_from_navs(store):
+    [valuation] = value_positions([Position('Index Fund', '100', 1000.0, date(2023, 1, 1))], store, AS_OF)
+
+    assert valuation['source'] == 'nav'
+    assert valuation['purchase_nav'] == 11.0
+    assert valuation['current_value'] == pytest.approx(1090.91, abs=0.01)
+
+
+@pytest.mark.parametrize('position, reason', [
+    (Position('Unlisted Fund', None, 1000.0, date(2023, 1, 1)), 'no NAV history'),
+    (Position('Unknown Fund', '999', 1000.0, date(2023, 1, 1)), 'no NAV history'),
+    (Position('Index Fund', '100', 1000.0, date(2021, 6, 1)), 'bought before NAV history'),
+])
+def test_fund_without_purchase_nav_is_not_valued(store, position, reason):
+    [valuation] = value_positions([position], store, AS_OF)
+
+    assert valuation['source'] is None
+    assert valuation['reason'] == reason
+    assert valuation['current_value'] is None and valuation['gain'] is None
+    assert cash_flows([position], [valuation], AS_OF) == []
+    assert xirr([cash_flows([position], [valuation], AS_OF)]) == [None]
+
+
+def test_totals_and_xirr_cover_valued_funds_only(store):
+    positions = [Position('Index Fund', '100', 1000.0, date(2023, 1, 1)),
+                 Position('Unlisted Fund', None, 3000.0, date(2023, 1, 1))]
+    valuations = value_positions(positions, store, AS_OF)
+
+    totals = summarize(valuations)
+    valued_only = summarize(valuations[:1])
+
+    assert totals['invested'] == 4000.0
+    assert totals['valued_invested'] == 1000.0
+    assert totals['coverage'] == 25.0
+    assert (totals['current_value'], totals['gain']) == (valued_only['current_value'], valued_only['gain'])
+    assert xirr([cash_flows(positions, valuations, AS_OF)]) == xirr([cash_flows(positions[:1], valuations[:1], AS_OF)])
+    # Group totals summarize the same way
+    assert summarize([totals, valued_only])['coverage'] == pytest.approx(40.0)
+
+
+def test_group_without_valued_funds_has_no_value():
+    positions = [Position('Unlisted Fund', None, 3000.0, date(2023, 1, 1))]
+    totals = summarize(value_positions(positions, None, AS_OF))
+
+    assert totals['current_value'] is None and totals['gain'] is None
+    assert totals['coverage'] == 0.0
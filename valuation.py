@@ -0,0 +1,155 @@
+"""Current value, gain and XIRR of saved portfolios.
+
+A saved fund holding is the amount invested on the day its portfolio was
+created. The amount buys units at that day's NAV and is valued at the latest
+NAV on or before the valuation date; all holdings of one scheme are resolved
+with a single lookup into the NAV store. Holdings without a NAV for their
+purchase day (no scheme code, no history, or bought before the history
+starts) are not valued: their current value, gain and XIRR are None, and
+group totals and XIRRs cover the valued holdings only, with ``coverage``
+reporting the valued share of the invested amount.
+
+XIRR solves ``sum(flow / (1 + r) ** years) = 0`` for every requested set of
+cash flows at once: the flows are laid out as a padded (problems, flows)
+array and Newton's method updates all rates together.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+DAYS_PER_YEAR = 365.0
+
+# One saved holding: invested ``amount`` on ``invested_on`` (a date)
+Position = namedtuple('Position', ['fund_name', 'scheme_code', 'amount', 'invested_on'])
+
+
+def xirr(problems, guess=0.1, tolerance=1e-9, max_iterations=100):
+    """Annualised internal rate of return, in percent, for each list of ``(date, amount)`` flows.
+
+    None for problems that need flows of both signs on at least two dates,
+    or that do not converge.
+    """
+    n = len(problems)
+    if n == 0:
+        return []
+    width = max(len(flows) for flows in problems)
+    amounts = np.zeros((n, width))
+    years = np.zeros((n, width))
+    valid = np.zeros(n, dtype=bool)
+    for i, flows in enumerate(problems):
+        if not flows:
+            continue
+        days = np.array([np.datetime64(day, 'D').astype(np.int64) for day, _ in flows])
+        values = np.array([amount for _, amount in flows], dtype=float)
+        amounts[i, :len(flows)] = values
+        years[i, :len(flows)] = (days - days.min()) / DAYS_PER_YEAR
+        valid[i] = (values > 0).any() and (values < 0).any() and days.max() > days.min()
+
+    rate = np.full(n, guess)
+    done = ~valid
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        for _ in range(max_iterations):
+            active = ~done
+            if not active.any():
+                break
+            growth = (1 + rate[active, None]) ** -years[active]
+            value = (amounts[active] * growth).sum(axis=1)
+            slope = (-years[active] * amounts[active] * growth / (1 + rate[active, None])).sum(axis=1)
+            step = value / slope
+            updated = np.maximum(rate[active] - step, -0.999999)
+            converged = np.abs(updated - rate[active]) < tolerance
+            rate[active] = updated
+            failed = ~np.isfinite(updated)
+            index = np.flatnonzero(active)
+            done[index[converged | failed]] = True
+            valid[index[failed]] = False
+        valid &= done
+    return [round(float(r) * 100, 4) if ok else None for r, ok in zip(rate, valid)]
+
+
+def value_positions(positions, store, as_of):
+    """Valuation dict per Position, in order, with NAVs looked up once per scheme"""
+    results = [None] * len(positions)
+    by_scheme = {}
+    for i, position in enumerate(positions):
+        by_scheme.setdefault(position.scheme_code, []).append(i)
+
+    for scheme_code, indexes in by_scheme.items():
+        dates = [positions[i].invested_on for i in indexes]
+        purchase = store.nav_on(scheme_code, dates) if scheme_code else None
+        if purchase is None:
+            for i in indexes:
+                results[i] = _valuation(positions[i], None, {'source': None, 'reason': 'no NAV history'})
+            continue
+        current_navs, current_dates = store.nav_on(scheme_code, [as_of])
+        for i, purchase_nav, purchase_date in zip(indexes, *purchase):
+            position = positions[i]
+            # nav_on() answers dates before the history with its first NAV
+            if purchase_date > np.datetime64(position.invested_on, 'D'):
+                results[i] = _valuation(position, None, {'source': None, 'reason': 'bought before NAV history'})
+                continue
+            units = position.amount / float(purchase_nav)
+            results[i] = _valuation(position, units * float(current_navs[0]), {
+                'source': 'nav',
+                'units': round(units, 4),
+                'purchase_nav': float(purchase_nav),
+                'purchase_nav_date': str(purchase_date),
+                'current_nav': float(current_navs[0]),
+                'nav_date': str(current_dates[0])
+            })
+    return results
+
+
+def _valuation(position, value, details):
+    """Valuation dict of a holding; ``value`` None for a holding that cannot be valued"""
+    gain = value - position.amount if value is not None else None
+    result = {
+        'fund_name': position.fund_name,
+        'invested': round(position.amount, 2),
+        'invested_on': position.invested_on.isoformat(),
+        'current_value': round(value, 2) if value is not None else None,
+        'gain': round(gain, 2) if gain is not None else None,
+        'gain_percentage': round(gain / position.amount * 100, 2) if gain is not None and position.amount else None
+    }
+    result.update(details)
+    return result
+
+
+def _valued_invested(valuation):
+    """Amount of a fund valuation or group total that is valued from NAVs"""
+    if 'valued_invested' in valuation:
+        return valuation['valued_invested']
+    return valuation['invested'] if valuation['current_value'] is not None else 0.0
+
+
+def summarize(valuations):
+    """Totals of a group of fund valuations or group totals, without XIRR.
+
+    Value and gain cover the valued holdings only; ``coverage`` is the percent
+    of the invested amount they account for.
+    """
+    invested = sum(v['invested'] for v in valuations)
+    valued = sum(_valued_invested(v) for v in valuations)
+    values = [v['current_value'] for v in valuations if v['current_value'] is not None]
+    value = sum(values)
+    return {
+        'invested': round(invested, 2),
+        'valued_invested': round(valued, 2),
+        'current_value': round(value, 2) if values else None,
+        'gain': round(value - valued, 2) if values else None,
+        'gain_percentage': round((value - valued) / valued * 100, 2) if values and valued else None,
+        'coverage': round(valued / invested * 100, 2) if invested else None
+    }
+
+
+def cash_flows(positions, valuations, as_of):
+    """XIRR flows of the valued holdings of a group: each investment out, today's total value in.
+
+    Empty when none of the holdings is valued.
+    """
+    valued = [(position, v) for position, v in zip(positions, valuations) if v['current_value'] is not None]
+    if not valued:
+        return []
+    flows = [(position.invested_on, -position.amount) for position, _ in valued]
+    flows.append((as_of, sum(v['current_value'] for _, v in valued)))
+    return flows